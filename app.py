@@ -1,14 +1,82 @@
 import os
+import time
+from functools import wraps
+from io import BytesIO
+from typing import Optional
 
-import cv2
-import torch
-from flask import Flask, render_template, request
+from flask import Flask, Request, Response, g, make_response, render_template, request, jsonify, \
+    send_from_directory, url_for
 from werkzeug.utils import secure_filename
 
+from src.hard_hat_detection.components.admission_control import Admission, AdmissionController
+from src.hard_hat_detection.components.request_profiler import RequestProfiler
+from src.hard_hat_detection.config.configuration import ConfigurationManager
 from src.hard_hat_detection.logger.logger_config import logger
-from src.hard_hat_detection.pipeline.prediction import PredictionPipeline
+from src.hard_hat_detection.pipeline.pipeline_loader import PipelineLoader, ModelNotReadyError
+from src.hard_hat_detection.utils.metrics import REGISTRY, REQUESTS, IN_FLIGHT, stage_timer
+
+
+class InMemoryRequest(Request):
+    # werkzeug spools uploads over 500KB to a temp file, keep them in memory instead,
+    # MAX_CONTENT_LENGTH bounds how large they can get
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return BytesIO()
+
 
 app = Flask(__name__)
+app.request_class = InMemoryRequest
+
+config_manager = ConfigurationManager()
+serving_config = config_manager.get_serving_config()
+# sampled requests and requests with the debug header are traced stage by stage
+request_profiler = RequestProfiler(config_manager.get_profiling_config())
+model_reload_config = config_manager.get_model_reload_config()
+# requests that would miss the latency slo are rejected before any work is done on them
+admission_controller = AdmissionController(config_manager.get_admission_config())
+
+# the model is loaded once and reused for every request, torch, cv2 and the weights are only
+# loaded by the pipeline loader so the server is up before the model is warm
+pipeline_loader = PipelineLoader()
+
+
+def get_prediction_pipeline():
+    pipeline = pipeline_loader.get(timeout=serving_config.ready_timeout_s)
+    # marks the version this process serves, and starts the weights watcher without gunicorn,
+    # under gunicorn it runs in the master
+    pipeline.model_reloader.start()
+    return pipeline
+
+
+def not_ready_response():
+    response = jsonify({'error': 'Model is loading, retry later', 'status': pipeline_loader.get_status()})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(serving_config.ready_timeout_s)))
+    return response
+
+
+def queued_seconds() -> float:
+    # time since the proxy received the request, t=<unix time> in seconds, milliseconds or microseconds,
+    # read only when the header is configured, a client could set it itself without a proxy
+    header = admission_controller.config.request_start_header
+    value = request.headers.get(header, '') if header else ''
+    try:
+        started_at = float(value[2:] if value.startswith('t=') else value)
+    except ValueError:
+        return 0.0
+    started_at /= 1e6 if started_at > 1e14 else 1e3 if started_at > 1e11 else 1
+    queued_s = time.time() - started_at
+    # clock skew between the proxy and this host, or a bogus header
+    return queued_s if 0 < queued_s < 3600 else 0.0
+
+
+def admit_request() -> Admission:
+    # only the torch model takes a smaller input size, the exported engines have a fixed one
+    admission = admission_controller.admit(degradable=get_prediction_pipeline().detector.dynamic_size,
+                                           queued_s=queued_seconds())
+    if not admission.admitted:
+        # counted by the admission metric, not logged, shedding happens when the server is overloaded
+        g.outcome = 'shed'
+    return admission
 
 
 def allowed_images(filename):
@@ -18,21 +86,12 @@ def allowed_images(filename):
     return filename.rsplit('.')[-1].lower() in allowed_extensions
 
 
-app.config['UPLOAD_FOLDER'] = os.path.join(os.getcwd(), 'detections')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Maximum file size: 16MB
 
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
-
-
-@app.route('/')
-def upload():
-    return render_template('upload.html')
-
 
-@app.route('/upload', methods=['POST'])
-def upload_image():
-    try:
+def read_upload():
+    # parses the multipart form, the image bytes stay in memory
+    with stage_timer('upload_parsing'):
         if 'image' not in request.files:
             raise ValueError('Image input is required in the form')
 
@@ -44,32 +103,288 @@ def upload_image():
         if not allowed_images(file.filename):
             raise ValueError('Invalid image format, allowed formats are - png, jpg, jpeg, gif only')
 
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        return file.read(), secure_filename(file.filename)
+
+
+def upload_source() -> Optional[str]:
+    # camera or site id of the upload (form field or ?source=), the compliance windows and the
+    # detection log are kept per source, uploads without one are counted as 'upload'
+    value = request.values.get('source', '').strip()
+    if len(value) > 128 or not value.isprintable():
+        raise ValueError('Invalid source, use up to 128 printable characters')
+    return value or None
+
+
+def render_requested() -> Optional[bool]:
+    # ?render=0 skips the annotated image, ?render=1 asks for it, None keeps the endpoint default
+    value = request.values.get('render')
+    if value is None:
+        return None
+    return value.lower() not in ('0', 'false', 'no')
+
+
+def result_url(prediction) -> Optional[str]:
+    if prediction.output_path is None:
+        return None
+    return url_for('result_image', name=os.path.basename(prediction.output_path))
+
 
-        if os.path.exists(file_path):
-            raise ValueError('Image with the same name already exists')
+def profiled(view, *args, **kwargs):
+    # runs the view under the request profiler when the request is sampled or asks for it
+    reason = request_profiler.should_profile(request.headers)
+    if reason is None:
+        return view(*args, **kwargs)
+    with request_profiler.profile(reason) as trace:
+        response = make_response(view(*args, **kwargs))
+    response.headers['Server-Timing'] = trace.server_timing()
+    response.headers['X-Profile-Id'] = trace.request_id
+    return response
 
-        file.save(file_path)
-        logger.info('Image successfully uploaded')
 
-        image_path = file_path
+def instrumented(endpoint: str):
+    # counts the requests of a view by outcome and tracks the requests in flight
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            IN_FLIGHT.inc()
+            outcome = 'error'
+            try:
+                response = profiled(view, *args, **kwargs)
+                status = response[1] if isinstance(response, tuple) else response.status_code
+                outcome = g.get('outcome') or ('ok' if status < 400 else 'not_ready' if status == 503 else 'error')
+                return response
+            finally:
+                IN_FLIGHT.dec()
+                REQUESTS.inc(endpoint, outcome)
+        return wrapper
+    return decorator
 
-        pipeline = PredictionPipeline()
-        input_device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        prediction = pipeline.detect_image(image_path)
-        message = f"Image detected successfully. Detected image saved at {prediction}"
+
+@app.route('/')
+def upload():
+    return render_template('upload.html')
+
+
+@app.route('/upload', methods=['POST'])
+@instrumented('upload')
+def upload_image():
+    admission = None
+    succeeded = False
+    ran_model = True
+    try:
+        admission = admit_request()
+        if not admission.admitted:
+            return render_template('upload.html', message='The server is busy, please retry shortly'), \
+                admission.status, {'Retry-After': str(admission.retry_after_s)}
+        data, filename = read_upload()
+        # the upload is decoded from memory, it is only written to disk when persist_uploads is set
+        # the annotated image is rendered in the background, the page links to it
+        prediction = get_prediction_pipeline().detect_upload(data, filename, save=render_requested(),
+                                                             img_size=admission.img_size, source=upload_source())
+        succeeded = True
+        # a cached result says nothing about the service time of the model
+        ran_model = not prediction.detections_reused
+        message = f"Image detected successfully. {len(prediction.detections)} objects detected."
         logger.info(message)
-        return render_template('upload.html', message=message)
+        with stage_timer('response'):
+            return render_template('upload.html', message=message, image_url=result_url(prediction))
 
     except ValueError as e:
         logger.error(e)
+        g.outcome = 'invalid'
         return render_template('upload.html', message=str(e))
 
+    except ModelNotReadyError as e:
+        logger.warning(e)
+        return render_template('upload.html', message='The model is still loading, please retry shortly'), 503
+
     except Exception as e:
         logger.error(f'Unexpected error: {e}')
         return render_template('error.html'), 500
 
+    finally:
+        if admission is not None:
+            admission_controller.release(admission, succeeded, ran_model)
+
+
+@app.route('/api/v1/detect', methods=['POST'])
+@instrumented('detect_api')
+def detect_api():
+    # machine clients get the boxes as json, nothing is rendered unless they ask with ?render=1,
+    # then image_url points at the annotated image once it is written,
+    # degraded is true when the image ran at the smaller input size because the server is loaded
+    admission = None
+    succeeded = False
+    ran_model = True
+    try:
+        admission = admit_request()
+        if not admission.admitted:
+            response = jsonify({'error': 'The server is busy, retry later', 'reason': admission.decision,
+                                'predicted_latency_ms': admission.predicted_ms})
+            response.status_code = admission.status
+            response.headers['Retry-After'] = str(admission.retry_after_s)
+            return response
+        data, filename = read_upload()
+        prediction = get_prediction_pipeline().detect_upload(data, filename, save=render_requested() or False,
+                                                             img_size=admission.img_size, source=upload_source())
+        succeeded = True
+        ran_model = not prediction.detections_reused
+        with stage_timer('response'):
+            return jsonify({
+                'source': filename,
+                'image_shape': list(prediction.image_shape),
+                'detections': [detection.to_dict() for detection in prediction.detections],
+                'image_url': result_url(prediction),
+                'degraded': admission.img_size is not None
+            })
+
+    except ValueError as e:
+        logger.error(e)
+        g.outcome = 'invalid'
+        return jsonify({'error': str(e)}), 400
+
+    except ModelNotReadyError as e:
+        logger.warning(e)
+        return not_ready_response()
+
+    except Exception as e:
+        logger.error(f'Unexpected error: {e}')
+        return jsonify({'error': 'Error occurred while processing the image'}), 500
+
+    finally:
+        if admission is not None:
+            admission_controller.release(admission, succeeded, ran_model)
+
+
+@app.route('/results/<name>', methods=['GET'])
+def result_image(name):
+    # annotated images are written in the background, 202 until the image is complete
+    if not pipeline_loader.is_ready():
+        return not_ready_response()
+    pipeline = pipeline_loader.get()
+    name = secure_filename(name)
+    if not name.endswith('.pending') and os.path.isfile(os.path.join(pipeline.results_folder, name)):
+        return send_from_directory(pipeline.results_folder, name)
+    # the pending marker is shared by the workers, any of them may be rendering the image
+    if pipeline.renderer.is_pending(name):
+        response = jsonify({'status': 'rendering'})
+        response.status_code = 202
+        response.headers['Retry-After'] = '1'
+        return response
+    return jsonify({'error': 'Result not found'}), 404
+
+
+@app.route('/api/v1/compliance', methods=['GET'])
+def compliance():
+    # helmet compliance per source over the rolling windows, ?source= narrows it to one source,
+    # the counts and alerts cover every gunicorn worker when shared_dir is set, else this worker only
+    if not pipeline_loader.is_ready():
+        return not_ready_response()
+    aggregator = pipeline_loader.get().compliance
+    return jsonify({'sources': aggregator.snapshot(request.args.get('source')),
+                    'alerts': aggregator.get_alerts(),
+                    'scope': 'all_workers' if aggregator.shared_dir else f"worker {os.getpid()}"})
+
+
+def admin_allowed() -> bool:
+    return not model_reload_config.admin_token or \
+        request.headers.get('X-Admin-Token') == model_reload_config.admin_token
+
+
+@app.route('/admin/model', methods=['GET'])
+def model_status():
+    # the version served by this process (active) and by the master (shared), when it was loaded
+    # and how long the last reload took
+    if not pipeline_loader.is_ready():
+        return not_ready_response()
+    return jsonify(get_prediction_pipeline().model_reloader.get_status())
+
+
+@app.route('/admin/model/reload', methods=['POST'])
+def model_reload():
+    # looks for new weights now, a new version is loaded in the background and swapped in when warm,
+    # under gunicorn the request is left for the master, which forks new workers after the swap
+    if not admin_allowed():
+        return jsonify({'error': 'Invalid admin token'}), 403
+    if not pipeline_loader.is_ready():
+        return not_ready_response()
+    reloader = get_prediction_pipeline().model_reloader
+    if not reloader.trigger():
+        return jsonify({'error': 'A model swap is already running', **reloader.get_status()}), 409
+    return jsonify(reloader.get_status()), 202
+
+
+@app.route('/admin/model/rollback', methods=['POST'])
+def model_rollback():
+    if not admin_allowed():
+        return jsonify({'error': 'Invalid admin token'}), 403
+    if not pipeline_loader.is_ready():
+        return not_ready_response()
+    reloader = get_prediction_pipeline().model_reloader
+    try:
+        if reloader.is_worker():
+            if not reloader.request('rollback'):
+                return jsonify({'error': 'A model swap is already running', **reloader.get_status()}), 409
+            return jsonify(reloader.get_status()), 202
+        reloader.rollback()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f'Rollback failed: {e}')
+        return jsonify({'error': 'Rollback failed', **reloader.get_status()}), 500
+    return jsonify(reloader.get_status())
+
+
+@app.route('/admin/shadow', methods=['GET'])
+def shadow_status():
+    # agreement and latency of the candidate model against the served one, per process
+    if not pipeline_loader.is_ready():
+        return not_ready_response()
+    shadow = get_prediction_pipeline().shadow
+    if shadow is None:
+        return jsonify({'error': 'Shadow mode is disabled'}), 404
+    return jsonify(shadow.get_stats())
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    if not pipeline_loader.is_ready():
+        return jsonify({'model': pipeline_loader.get_status()})
+    return jsonify({'model': pipeline_loader.get_status(), 'admission': admission_controller.get_stats(),
+                    **pipeline_loader.get().get_stats()})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # prometheus text format, under gunicorn the counters and histograms of every worker are summed
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/debug/traces', methods=['GET'])
+def debug_traces():
+    # stage timings of the most recent profiled requests of this process, they include the
+    # sources of the uploads, so the endpoint is off by default and behind the admin token
+    if not request_profiler.config.traces_endpoint:
+        return jsonify({'error': 'Not found'}), 404
+    if not admin_allowed():
+        return jsonify({'error': 'Invalid admin token'}), 403
+    return jsonify(request_profiler.get_recent_traces())
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # liveness: the process is up and serving http, the model may still be loading
+    return jsonify({'status': 'up'})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # readiness: the model is loaded and warm, route traffic here only after this returns 200
+    status = pipeline_loader.get_status()
+    if not pipeline_loader.is_ready():
+        return jsonify(status), 503
+    return jsonify(status)
+
 
 @app.errorhandler(404)
 def not_found_error(error):
@@ -78,5 +393,7 @@ def not_found_error(error):
 
 
 if __name__ == '__main__':
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    app.run(host='0.0.0.0', port=8080, debug=True)
+    # the server accepts connections right away while the model warms up in the background,
+    # the reloader is off because it would load the model in a second process
+    pipeline_loader.start()
+    app.run(host='0.0.0.0', port=8080, debug=True, use_reloader=False)
@@ -0,0 +1,77 @@
+# Pre-fork production server for app.py
+# gunicorn -c gunicorn.conf.py app:app
+#
+# The app (and with it best.pt) is loaded once in the master process, then the workers are
+# forked from it, so the weight pages are shared copy-on-write instead of loaded N times.
+# Importing app.py is cheap, the model is loaded in when_ready, before the first fork, so a
+# worker restarted later starts warm.
+#
+# The worker and thread layout comes from the serving section of config.yaml, or from
+# artifacts/serving/tuning.yaml once research/tune_topology.py was run on this machine.
+import gc
+import os
+import signal
+
+from src.hard_hat_detection.config.configuration import ConfigurationManager
+from src.hard_hat_detection.utils.topology import resolve_topology
+
+config_manager = ConfigurationManager()
+serving_config = config_manager.get_serving_config()
+topology = resolve_topology(serving_config, config_manager.get_prediction_config())
+
+bind = serving_config.bind
+workers = topology['workers']
+worker_class = 'gthread'
+threads = serving_config.threads
+timeout = serving_config.timeout
+preload_app = True
+torch_threads = topology['torch_threads']
+metrics_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), serving_config.metrics_dir) \
+    if serving_config.metrics_dir else None
+
+# keep torch single threaded in the master, an OpenMP pool started before fork is not
+# usable in the children, each worker sets its own thread count in post_fork
+os.environ['OMP_NUM_THREADS'] = '1'
+os.environ['MKL_NUM_THREADS'] = '1'
+
+
+def when_ready(server):
+    # runs in the master after the app is imported and before any worker is forked,
+    # the model is loaded on this thread, a thread started here would not survive the fork
+    from app import pipeline_loader
+    from src.hard_hat_detection.utils.metrics import REGISTRY
+
+    # the metrics of a previous run are not summed with this one
+    if metrics_dir:
+        REGISTRY.clear_shared(metrics_dir)
+    server.log.info(f"Serving topology from {topology['source']}: {topology}")
+    pipeline_loader.load()
+    server.log.info(f"Model loaded in the master: {pipeline_loader.get_status()}")
+    # new weights are loaded in the master only, then a HUP forks fresh workers that share them
+    # copy-on-write and lets the old workers finish their requests, preload_app keeps the app
+    # (and the swapped model) of the master across the HUP; the watcher thread stays in the master
+    pipeline_loader.get().model_reloader.start_in_master(on_swapped=lambda: os.kill(os.getpid(), signal.SIGHUP))
+
+
+def pre_fork(server, worker):
+    # move everything loaded so far (the model included) to the permanent generation,
+    # so garbage collections in the workers do not write to the shared pages
+    gc.freeze()
+    # the least used slot: a restarted worker takes the cores of the one it replaces, and after a
+    # HUP the old workers still hold every slot until they exit, so the new ones spread over them again
+    used = [getattr(other, 'cpu_slot', None) for other in server.WORKERS.values()]
+    worker.cpu_slot = min(range(workers), key=lambda slot: (used.count(slot), slot))
+
+
+def post_fork(server, worker):
+    from src.hard_hat_detection.utils.metrics import REGISTRY
+    from src.hard_hat_detection.utils.topology import apply_topology, worker_cpus
+
+    # a scrape reaches any worker, each one publishes its metrics for the others
+    if metrics_dir:
+        REGISTRY.share(metrics_dir, serving_config.metrics_interval_s)
+
+    cpus = worker_cpus(worker.cpu_slot, torch_threads) if topology['cpu_affinity'] else None
+    apply_topology(torch_threads, topology['interop_threads'], cpus)
+    server.log.info(f"Worker {worker.pid} started with {torch_threads} torch threads"
+                    + (f" pinned to cores {cpus}" if cpus else ""))
@@ -1,25 +1,63 @@
+import argparse
 import sys
+from functools import cached_property
 
 from src.hard_hat_detection.exception.exception import CustomException
 from src.hard_hat_detection.logger.logger_config import logger
-from src.hard_hat_detection.pipeline.data_ingestion import DataIngestionTrainingPipeline
-from src.hard_hat_detection.pipeline.data_validation import DataValidationTrainingPipeline
-from src.hard_hat_detection.pipeline.data_transformation import DataTransformationTrainingPipeline
-from src.hard_hat_detection.pipeline.model_pusher import ModelPusherTrainingPipeline
-from src.hard_hat_detection.pipeline.model_trainer import ModelTrainerTrainingPipeline
-from src.hard_hat_detection.pipeline.model_evaluation import ModelEvaluationTrainingPipeline
-
 
 
 class RunPipeline:
+    """
+    Runs the training pipeline stages in order.
+
+    Every stage is imported when it is first used, so running a single stage does not pay for
+    the imports of the others (roboflow for ingestion, torch for export, boto3 for the pusher).
+    """
+    STAGES = ('data_ingestion', 'data_validation', 'data_transformation', 'model_trainer',
+              'model_evaluation', 'model_export', 'model_quantization', 'model_pusher')
+
     def __init__(self):
         self.class_name = self.__class__.__name__
-        self.data_ingestion_pipeline: DataIngestionTrainingPipeline = DataIngestionTrainingPipeline()
-        self.data_validation_pipeline: DataValidationTrainingPipeline = DataValidationTrainingPipeline()
-        self.data_transformation_pipeline: DataTransformationTrainingPipeline = DataTransformationTrainingPipeline()
-        self.model_trainer_pipeline: ModelTrainerTrainingPipeline = ModelTrainerTrainingPipeline()
-        self.model_evaluation_pipeline: ModelEvaluationTrainingPipeline = ModelEvaluationTrainingPipeline()
-        self.model_pusher_pipeline: ModelPusherTrainingPipeline = ModelPusherTrainingPipeline()
+
+    @cached_property
+    def data_ingestion_pipeline(self):
+        from src.hard_hat_detection.pipeline.data_ingestion import DataIngestionTrainingPipeline
+        return DataIngestionTrainingPipeline()
+
+    @cached_property
+    def data_validation_pipeline(self):
+        from src.hard_hat_detection.pipeline.data_validation import DataValidationTrainingPipeline
+        return DataValidationTrainingPipeline()
+
+    @cached_property
+    def data_transformation_pipeline(self):
+        from src.hard_hat_detection.pipeline.data_transformation import DataTransformationTrainingPipeline
+        return DataTransformationTrainingPipeline()
+
+    @cached_property
+    def model_trainer_pipeline(self):
+        from src.hard_hat_detection.pipeline.model_trainer import ModelTrainerTrainingPipeline
+        return ModelTrainerTrainingPipeline()
+
+    @cached_property
+    def model_evaluation_pipeline(self):
+        from src.hard_hat_detection.pipeline.model_evaluation import ModelEvaluationTrainingPipeline
+        return ModelEvaluationTrainingPipeline()
+
+    @cached_property
+    def model_export_pipeline(self):
+        from src.hard_hat_detection.pipeline.model_export import ModelExportTrainingPipeline
+        return ModelExportTrainingPipeline()
+
+    @cached_property
+    def model_quantization_pipeline(self):
+        from src.hard_hat_detection.pipeline.model_quantization import ModelQuantizationTrainingPipeline
+        return ModelQuantizationTrainingPipeline()
+
+    @cached_property
+    def model_pusher_pipeline(self):
+        from src.hard_hat_detection.pipeline.model_pusher import ModelPusherTrainingPipeline
+        return ModelPusherTrainingPipeline()
 
     def run_data_ingestion_pipeline(self) -> None:
         tag: str = f"{self.class_name}::run_data_ingestion_pipeline::"
@@ -90,6 +128,34 @@ class RunPipeline:
             logger.error(f"{tag}::Error running the model evaluation pipeline: {e}")
             raise CustomException(e, sys)
 
+    def run_model_export_pipeline(self) -> None:
+        tag: str = f"{self.class_name}::run_model_export_pipeline::"
+        try:
+            logger.info(
+                f"[STARTED]>>>>>>>>>>>>>>>>>>>> {self.model_export_pipeline.stage_name} <<<<<<<<<<<<<<<<<<<<")
+            logger.info(f"{tag}::Running the model export pipeline")
+            self.model_export_pipeline.model_export()
+            logger.info(f"{tag}::Model export pipeline completed")
+            logger.info(
+                f"[COMPLETE]>>>>>>>>>>>>>>>>>>>> {self.model_export_pipeline.stage_name} <<<<<<<<<<<<<<<<<<<<\n\n\n")
+        except Exception as e:
+            logger.error(f"{tag}::Error running the model export pipeline: {e}")
+            raise CustomException(e, sys)
+
+    def run_model_quantization_pipeline(self) -> None:
+        tag: str = f"{self.class_name}::run_model_quantization_pipeline::"
+        try:
+            logger.info(
+                f"[STARTED]>>>>>>>>>>>>>>>>>>>> {self.model_quantization_pipeline.stage_name} <<<<<<<<<<<<<<<<<<<<")
+            logger.info(f"{tag}::Running the model quantization pipeline")
+            self.model_quantization_pipeline.model_quantization()
+            logger.info(f"{tag}::Model quantization pipeline completed")
+            logger.info(
+                f"[COMPLETE]>>>>>>>>>>>>>>>>>>>> {self.model_quantization_pipeline.stage_name} <<<<<<<<<<<<<<<<<<<<\n\n\n")
+        except Exception as e:
+            logger.error(f"{tag}::Error running the model quantization pipeline: {e}")
+            raise CustomException(e, sys)
+
 
     def run_model_pusher_pipeline(self) -> None:
         tag: str = f"{self.class_name}::run_model_pusher_pipeline::"
@@ -106,19 +172,21 @@ class RunPipeline:
             raise CustomException(e, sys)
 
 
-    def run(self) -> None:
-        self.run_data_ingestion_pipeline()
-        self.run_data_validation_pipeline()
-        self.run_data_transformation_pipeline()
-        self.run_model_trainer_pipeline()
-        self.run_model_evaluation_pipeline()
-        self.run_model_pusher_pipeline()
+    def run(self, stages=STAGES) -> None:
+        for stage in self.STAGES:
+            if stage in stages:
+                getattr(self, f"run_{stage}_pipeline")()
 
 if __name__ == "__main__":
     try:
+        parser = argparse.ArgumentParser(description='Run the training pipeline')
+        parser.add_argument('stages', nargs='*', choices=RunPipeline.STAGES,
+                            help='stages to run, in pipeline order, all stages when none are given')
+        args = parser.parse_args()
+
         # Run the pipelines
         run_pipeline = RunPipeline()
-        run_pipeline.run()
+        run_pipeline.run(args.stages or RunPipeline.STAGES)
     except Exception as ex:
         logger.error(f"Error running the pipeline: {ex}")
-        raise CustomException(ex, sys)
\ No newline at end of file
+        raise CustomException(ex, sys)
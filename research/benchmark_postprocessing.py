@@ -0,0 +1,120 @@
+"""
+Micro-benchmark of the detector post-processing
+
+Compares the per-image yolov5 path used by detect.py (non_max_suppression, then scale_boxes and
+round for every image) with the BatchedPostprocessor used by the Detector, and checks that both
+return the same detections.
+
+    # synthetic raw outputs, the number of confident boxes per image is set with --boxes
+    python research/benchmark_postprocessing.py --boxes 100 1000 5000
+    # real raw outputs of the trained model on the test split
+    python research/benchmark_postprocessing.py --test-split
+
+Run from the project root.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import torch
+
+project_root_path = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root_path))
+sys.path.insert(0, os.path.join(project_root_path, 'yolov5'))
+
+from utils.general import non_max_suppression, scale_boxes  # noqa: E402 (yolov5)
+from src.hard_hat_detection.config.configuration import ConfigurationManager  # noqa: E402
+from src.hard_hat_detection.utils.postprocessing import BatchedPostprocessor  # noqa: E402
+from src.hard_hat_detection.utils.preprocessing import LetterboxMeta  # noqa: E402
+
+
+def reference_postprocess(prediction, metas, img_size, conf_thres, iou_thres, max_det):
+    output = non_max_suppression(prediction.clone(), conf_thres=conf_thres, iou_thres=iou_thres, max_det=max_det)
+    for meta, det in zip(metas, output):
+        det[:, :4] = scale_boxes((img_size, img_size), det[:, :4], meta.shape).round()
+    return output
+
+
+def synthetic_batch(batch_size, anchors, num_classes, confident, img_size, generator):
+    prediction = torch.zeros((batch_size, anchors, 5 + num_classes))
+    prediction[..., :2] = torch.rand((batch_size, anchors, 2), generator=generator) * img_size
+    prediction[..., 2:4] = 8 + torch.rand((batch_size, anchors, 2), generator=generator) * 120
+    prediction[..., 4] = torch.rand((batch_size, anchors), generator=generator) * 0.3
+    prediction[..., 5:] = torch.rand((batch_size, anchors, num_classes), generator=generator)
+    # the first `confident` anchors of every image pass the confidence threshold
+    prediction[:, :confident, 4] = 0.6 + 0.4 * torch.rand((batch_size, confident), generator=generator)
+    prediction[:, :confident, 5:] += 0.6
+    metas = [LetterboxMeta(ratio=img_size / 1920, pad_w=0.0, pad_h=(img_size - 1080 * img_size / 1920) / 2,
+                           shape=(1080, 1920)) for _ in range(batch_size)]
+    return prediction, metas
+
+
+def test_split_batches(batch_size):
+    # raw outputs of the trained model, computed once so only the post-processing is timed
+    from src.hard_hat_detection.components.detector import Detector
+
+    detector = Detector(ConfigurationManager().get_prediction_config())
+    detector.load()
+    images_dir = os.path.join(project_root_path, 'artifacts/data_transformation/images/test')
+    paths = [os.path.join(images_dir, name) for name in sorted(os.listdir(images_dir))]
+    batches = []
+    with torch.inference_mode():
+        for start in range(0, len(paths), batch_size):
+            images = [cv2.imread(path) for path in paths[start:start + batch_size]]
+            tensor, metas = detector.preprocess(images)
+            batches.append((detector.forward(tensor).float().cpu(), metas))
+    return detector.img_size, batches
+
+
+def compare(expected, actual) -> bool:
+    return len(expected) == len(actual) and all(
+        e.shape == a.shape and torch.allclose(e, a, atol=1e-4) for e, a in zip(expected, actual))
+
+
+def time_ms(fn, runs: int) -> float:
+    fn()
+    started_at = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return 1000 * (time.perf_counter() - started_at) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the detector post-processing')
+    parser.add_argument('--test-split', action='store_true', help='use the raw outputs of the trained model')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--boxes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    config = ConfigurationManager().get_prediction_config()
+    postprocessor = BatchedPostprocessor(config.conf_thres, config.iou_thres, config.max_det)
+
+    if args.test_split:
+        img_size, batches = test_split_batches(args.batch_size)
+        cases = [('test split', batches)]
+    else:
+        img_size, generator = config.img_size, torch.Generator().manual_seed(0)
+        anchors = 3 * sum((img_size // stride) ** 2 for stride in (8, 16, 32))
+        cases = [(f"{boxes} boxes/image", [synthetic_batch(args.batch_size, anchors, 2, boxes, img_size, generator)])
+                 for boxes in args.boxes]
+
+    print(f"{'case':>18} {'per-image ms':>13} {'batched ms':>11} {'speedup':>8} {'identical':>9}")
+    for name, batches in cases:
+        identical = all(compare(reference_postprocess(prediction, metas, img_size, config.conf_thres,
+                                                      config.iou_thres, config.max_det),
+                                postprocessor(prediction, metas))
+                        for prediction, metas in batches)
+        reference_ms = time_ms(lambda: [reference_postprocess(prediction, metas, img_size, config.conf_thres,
+                                                              config.iou_thres, config.max_det)
+                                        for prediction, metas in batches], args.runs)
+        batched_ms = time_ms(lambda: [postprocessor(prediction, metas) for prediction, metas in batches], args.runs)
+        print(f"{name:>18} {reference_ms:>13.3f} {batched_ms:>11.3f} "
+              f"{reference_ms / batched_ms:>7.2f}x {str(identical):>9}")
+
+
+if __name__ == '__main__':
+    main()
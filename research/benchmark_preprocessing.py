@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of the detector pre-processing
+
+Compares the previous per-image path (yolov5 letterbox, transpose, ascontiguousarray, np.stack,
+then float and /255 as separate passes) with the preallocated LetterboxPreprocessor used by the
+Detector, on random 1080p frames, and checks that both produce the same tensor.
+
+Run from the project root:
+    python research/benchmark_preprocessing.py
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+project_root_path = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root_path))
+sys.path.insert(0, os.path.join(project_root_path, 'yolov5'))
+
+from utils.augmentations import letterbox  # noqa: E402 (yolov5)
+from src.hard_hat_detection.utils.preprocessing import LetterboxPreprocessor  # noqa: E402
+
+
+def naive_preprocess(images, img_size: int) -> torch.Tensor:
+    batch = []
+    for image in images:
+        padded = letterbox(image, img_size, auto=False)[0]
+        padded = padded.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
+        batch.append(np.ascontiguousarray(padded))
+    tensor = torch.from_numpy(np.stack(batch)).float()
+    tensor /= 255
+    return tensor
+
+
+def time_ms(fn, runs: int) -> float:
+    fn()  # warmup, also allocates the preprocessor buffers
+    started_at = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return 1000 * (time.perf_counter() - started_at) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the detector pre-processing')
+    parser.add_argument('--img-size', type=int, default=640)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(0)
+    preprocessor = LetterboxPreprocessor(args.img_size)
+    print(f"{'batch':>5} {'naive ms':>10} {'preallocated ms':>16} {'speedup':>8} {'max diff':>9}")
+    for batch_size in args.batch_sizes:
+        images = [rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8) for _ in range(batch_size)]
+        expected = naive_preprocess(images, args.img_size)
+        actual, _ = preprocessor(images)
+        max_diff = float((expected - actual).abs().max())
+
+        naive_ms = time_ms(lambda: naive_preprocess(images, args.img_size), args.runs)
+        preallocated_ms = time_ms(lambda: preprocessor(images), args.runs)
+        print(f"{batch_size:>5} {naive_ms:>10.3f} {preallocated_ms:>16.3f} "
+              f"{naive_ms / preallocated_ms:>7.2f}x {max_diff:>9.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Cold start time and import time breakdown of the entry points
+
+Every measurement runs in a fresh interpreter, so nothing is shared between runs:
+  * process up:  import of the entry point module (app.py serves /healthz from here)
+  * model ready: import plus the pipeline loader (torch, cv2, weights, warmup), app.py only
+  * imports:     python -X importtime, cumulative time per top level package of one run
+
+Run from the project root:
+    python research/benchmark_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+project_root_path = Path(__file__).parent.parent
+
+ENTRY_POINTS = {
+    'app': {'up': 'import app',
+            'ready': 'import app; app.pipeline_loader.load()'},
+    'main': {'up': 'import main',
+             'ready': None},
+}
+
+
+def run_seconds(code: str) -> float:
+    started_at = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=project_root_path, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started_at
+
+
+def import_breakdown(code: str, top: int) -> dict:
+    # -X importtime lines: "import time: self [us] | cumulative | imported package", nesting by indent
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=project_root_path,
+                               check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    cumulative = defaultdict(float)
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, module = line.split('|')
+        # the module column is " name" at the top level, nested imports are indented further
+        # and already counted in the cumulative time of their parent
+        if not module.startswith('  '):
+            cumulative[module.strip().split('.')[0]] += int(cumulative_us) / 1e6
+    ranked = sorted(cumulative.items(), key=lambda item: -item[1])[:top]
+    return {package: round(seconds, 3) for package, seconds in ranked}
+
+
+def summarise(timings) -> dict:
+    return {'median_s': round(statistics.median(timings), 3), 'min_s': round(min(timings), 3),
+            'max_s': round(max(timings), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cold start of app.py and main.py')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='packages listed in the import breakdown')
+    parser.add_argument('--report', default='artifacts/startup/startup_report.json')
+    args = parser.parse_args()
+
+    report = {'python': sys.version.split()[0], 'runs': args.runs}
+    for entry_point, commands in ENTRY_POINTS.items():
+        result = {'process_up': summarise([run_seconds(commands['up']) for _ in range(args.runs)]),
+                  'imports': import_breakdown(commands['up'], args.top)}
+        if commands['ready']:
+            result['model_ready'] = summarise([run_seconds(commands['ready']) for _ in range(args.runs)])
+            result['imports_until_ready'] = import_breakdown(commands['ready'], args.top)
+        report[entry_point] = result
+        print(f"{entry_point}: process up {result['process_up']['median_s']:.3f}s"
+              + (f", model ready {result['model_ready']['median_s']:.3f}s" if 'model_ready' in result else ''))
+        for package, seconds in result['imports'].items():
+            print(f"    {package:<30} {seconds:>7.3f}s")
+
+    report_path = os.path.join(project_root_path, args.report)
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w') as file:
+        json.dump(report, file, indent=4)
+    print(f"Report written to: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
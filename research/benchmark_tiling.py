@@ -0,0 +1,127 @@
+"""
+Latency and recall of tiled inference against full frame inference
+
+Runs the trained model over a folder of images with yolov5 labels, once on the full frame and
+once tiled (with the tiling section of config.yaml, the number of workers can be overridden),
+and reports the per-image latency and the recall / precision at IoU 0.5 of both modes.
+
+Run from the project root, on high resolution site images:
+    python research/benchmark_tiling.py --images-dir site/images --labels-dir site/labels --workers 1 4
+"""
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+project_root_path = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root_path))
+
+from src.hard_hat_detection.components.detector import Detector  # noqa: E402
+from src.hard_hat_detection.components.tiled_inference import TiledDetector  # noqa: E402
+from src.hard_hat_detection.config.configuration import ConfigurationManager  # noqa: E402
+from src.hard_hat_detection.utils.tiling import pairwise_overlap  # noqa: E402
+
+
+def read_labels(label_path: str, height: int, width: int):
+    # yolov5 labels: class cx cy w h, normalised to the image size
+    labels = []
+    if os.path.exists(label_path):
+        with open(label_path) as file:
+            for line in file:
+                values = line.split()
+                if len(values) >= 5:
+                    class_id, cx, cy, w, h = int(values[0]), *map(float, values[1:5])
+                    labels.append((class_id, [(cx - w / 2) * width, (cy - h / 2) * height,
+                                              (cx + w / 2) * width, (cy + h / 2) * height]))
+    return labels
+
+
+def count_matches(detections, labels, iou_thres: float = 0.5) -> int:
+    # greedy one to one matching by descending confidence, same class only
+    if not detections or not labels:
+        return 0
+    boxes = torch.tensor([detection.xyxy for detection in detections] + [box for _, box in labels])
+    iou = pairwise_overlap(boxes, 'iou')[:len(detections), len(detections):]
+    matched = set()
+    for i in sorted(range(len(detections)), key=lambda index: -detections[index].confidence):
+        for j in torch.argsort(iou[i], descending=True).tolist():
+            if iou[i, j] < iou_thres:
+                break
+            if j not in matched and labels[j][0] == detections[i].class_id:
+                matched.add(j)
+                break
+    return len(matched)
+
+
+def evaluate(predict, samples) -> dict:
+    timings, detected, matched, expected = [], 0, 0, 0
+    predict(samples[0][0])  # warmup
+    for image, labels in samples:
+        started_at = time.perf_counter()
+        detections = predict(image)
+        timings.append(1000 * (time.perf_counter() - started_at))
+        detected += len(detections)
+        expected += len(labels)
+        matched += count_matches(detections, labels)
+    return {
+        'latency_ms_mean': round(float(np.mean(timings)), 2),
+        'latency_ms_p50': round(float(np.percentile(timings, 50)), 2),
+        'latency_ms_p95': round(float(np.percentile(timings, 95)), 2),
+        'recall': round(matched / expected, 4) if expected else None,
+        'precision': round(matched / detected, 4) if detected else None,
+        'detections': detected
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare tiled and full frame inference')
+    parser.add_argument('--images-dir', default='artifacts/data_transformation/images/test')
+    parser.add_argument('--labels-dir', default='artifacts/data_transformation/labels/test')
+    parser.add_argument('--workers', type=int, nargs='+', default=None, help='tile workers to compare')
+    parser.add_argument('--report', default='artifacts/tiling/tiling_report.json')
+    args = parser.parse_args()
+
+    config_manager = ConfigurationManager()
+    tiling_config = config_manager.get_tiling_config()
+    detector = Detector(config_manager.get_prediction_config())
+    detector.load()
+
+    images_dir, labels_dir = (os.path.join(project_root_path, path) for path in (args.images_dir, args.labels_dir))
+    samples = []
+    for name in sorted(os.listdir(images_dir)):
+        image = cv2.imread(os.path.join(images_dir, name))
+        if image is not None:
+            label_path = os.path.join(labels_dir, f"{Path(name).stem}.txt")
+            samples.append((image, read_labels(label_path, *image.shape[:2])))
+    if not samples:
+        raise FileNotFoundError(f"No images in {images_dir}")
+
+    report = {'images': len(samples), 'tiling': dataclasses.asdict(tiling_config),
+              'full_frame': evaluate(lambda image: detector.predict([image])[0], samples)}
+    for workers in args.workers or [tiling_config.workers]:
+        tiled_detector = TiledDetector(detector, dataclasses.replace(tiling_config, workers=workers))
+        report[f"tiled_workers_{workers}"] = evaluate(tiled_detector.predict, samples)
+        tiled_detector.close()
+
+    report_path = os.path.join(project_root_path, args.report)
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w') as file:
+        json.dump(report, file, indent=4)
+
+    print(f"{'mode':>18} {'mean ms':>9} {'p95 ms':>9} {'recall':>7} {'precision':>9}")
+    for mode, result in report.items():
+        if isinstance(result, dict) and 'recall' in result:
+            print(f"{mode:>18} {result['latency_ms_mean']:>9.2f} {result['latency_ms_p95']:>9.2f} "
+                  f"{result['recall'] or 0:>7.4f} {result['precision'] or 0:>9.4f}")
+    print(f"Report written to: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
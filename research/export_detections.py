@@ -0,0 +1,56 @@
+"""
+Bulk export of the detection log for compliance reporting
+
+Reads the segments of every writer (one per serving process) under the detection_log log_dir,
+skips the segments outside the time range or without the requested sources using their index,
+and writes the matching detections sorted by time to csv, or to a numpy archive for .npz paths.
+
+Run from the project root:
+    python research/export_detections.py --output artifacts/exports/detections.csv --hours 24
+    python research/export_detections.py --output site.npz --sources rtsp://camera-01/stream --classes head
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+project_root_path = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root_path))
+
+from src.hard_hat_detection.components.detection_log import DetectionLogReader
+from src.hard_hat_detection.config.configuration import ConfigurationManager
+
+
+def parse_time(value: str) -> float:
+    # unix seconds or an iso date / datetime in local time
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', required=True, help='csv file, or .npz for a compressed numpy archive')
+    parser.add_argument('--start', type=parse_time, help='unix time or iso datetime, inclusive')
+    parser.add_argument('--end', type=parse_time, help='unix time or iso datetime, exclusive')
+    parser.add_argument('--hours', type=float, help='export the last this many hours, overrides --start')
+    parser.add_argument('--sources', nargs='+', help='only these sources (camera, video path or upload)')
+    parser.add_argument('--classes', nargs='+', help='only these class names')
+    parser.add_argument('--log-dir', help='defaults to log_dir in the detection_log section of config.yaml')
+    args = parser.parse_args()
+
+    log_dir = args.log_dir or os.path.join(project_root_path,
+                                           ConfigurationManager().get_detection_log_config().log_dir)
+    start = time.time() - args.hours * 3600 if args.hours else args.start
+
+    started_at = time.perf_counter()
+    rows = DetectionLogReader(log_dir).export(args.output, start=start, end=args.end,
+                                              sources=args.sources, class_names=args.classes)
+    print(f"{rows} detections exported to {args.output} in {time.perf_counter() - started_at:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
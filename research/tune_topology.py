@@ -0,0 +1,197 @@
+"""
+Thread and core topology tuner for cpu inference
+
+Sweeps the number of worker processes, intra-op (torch) threads, inter-op threads and batch
+sizes for the model of the prediction section on this machine. Every configuration starts its
+workers as fresh processes (like gunicorn workers with their own thread pools), optionally
+pinned to their own cores, lets them run batches of the test images side by side for
+--duration-s, and reports the aggregate throughput and the p50 / p99 batch latency.
+
+The fastest configuration whose p99 is within --max-p99-ms is written to the tuning_path of the
+serving section (artifacts/serving/tuning.yaml), gunicorn.conf.py and the prediction pipeline
+read it at startup. Configurations with more threads than cores are skipped unless
+--allow-oversubscription is set.
+
+Run from the project root, on the machine (or instance type) that serves the model:
+    python research/tune_topology.py
+    python research/tune_topology.py --workers 1 2 4 --torch-threads 1 2 4 --batch-sizes 1 4 8 --affinity
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root_path = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root_path))
+
+from src.hard_hat_detection.config.configuration import ConfigurationManager  # noqa: E402
+from src.hard_hat_detection.utils.topology import write_tuning  # noqa: E402
+
+
+def load_images(images_dir: str, limit: int):
+    import cv2
+
+    images = []
+    for name in sorted(os.listdir(images_dir))[:limit]:
+        image = cv2.imread(os.path.join(images_dir, name))
+        if image is not None:
+            images.append(image)
+    if not images:
+        raise FileNotFoundError(f"No images in {images_dir}")
+    return images
+
+
+def run_worker(slot: int, candidate: dict, args, barrier, results):
+    # a fresh interpreter (spawn), the thread pools are set before the model runs anything
+    from src.hard_hat_detection.components.detector import Detector
+    from src.hard_hat_detection.utils.topology import apply_topology, worker_cpus
+
+    cpus = worker_cpus(slot, candidate['torch_threads']) if candidate['cpu_affinity'] else None
+    apply_topology(candidate['torch_threads'], candidate['interop_threads'], cpus)
+    images = load_images(args.images_dir, args.max_images)
+    detector = Detector(ConfigurationManager().get_prediction_config())
+    detector.load()
+    batch_size = candidate['max_batch_size']
+    batches = [[images[(start + i) % len(images)] for i in range(batch_size)] for start in range(len(images))]
+    detector.predict(batches[0])
+
+    # a worker that failed to load breaks the barrier for the others instead of blocking them
+    barrier.wait(timeout=args.load_timeout_s)
+    latencies, count, started_at = [], 0, time.perf_counter()
+    deadline = started_at + args.duration_s
+    while time.perf_counter() < deadline:
+        batch_started_at = time.perf_counter()
+        detector.predict(batches[count % len(batches)])
+        latencies.append(1000 * (time.perf_counter() - batch_started_at))
+        count += 1
+    results.put({'slot': slot, 'latencies': latencies, 'images': count * batch_size,
+                 'seconds': time.perf_counter() - started_at})
+
+
+def measure(candidate: dict, args) -> dict:
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(candidate['workers'])
+    results = context.Queue()
+    # daemonic, a worker left behind by a failure never keeps the tuner alive
+    processes = [context.Process(target=run_worker, args=(slot, candidate, args, barrier, results), daemon=True)
+                 for slot in range(candidate['workers'])]
+    try:
+        for process in processes:
+            process.start()
+        deadline = time.monotonic() + args.duration_s + args.load_timeout_s
+        outcomes = []
+        while len(outcomes) < len(processes):
+            try:
+                outcomes.append(results.get(timeout=1.0))
+            except queue.Empty:
+                # a worker that died (import error, out of memory) never puts its result
+                if time.monotonic() > deadline or any(process.exitcode not in (None, 0) for process in processes):
+                    raise RuntimeError(f"The workers of {candidate} failed or timed out, exit codes "
+                                       f"{[process.exitcode for process in processes]}") from None
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=10)
+    latencies = np.concatenate([outcome['latencies'] for outcome in outcomes])
+    return {
+        'throughput_ips': round(sum(outcome['images'] for outcome in outcomes)
+                                / max(outcome['seconds'] for outcome in outcomes), 2),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+        'latency_ms_p99': round(float(np.percentile(latencies, 99)), 2),
+        'batches': len(latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cpu_count = os.cpu_count() or 1
+    parser.add_argument('--images-dir', default='artifacts/data_transformation/images/test')
+    parser.add_argument('--max-images', type=int, default=32)
+    parser.add_argument('--workers', type=int, nargs='+', help='defaults to 1, 2, 4 ... up to the core count')
+    parser.add_argument('--torch-threads', type=int, nargs='+',
+                        help='defaults to the cores per worker and half of them')
+    parser.add_argument('--interop-threads', type=int, nargs='+', default=[1],
+                        help='0 keeps the torch default')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--affinity', action='store_true', help='pin every worker to its own cores')
+    parser.add_argument('--allow-oversubscription', action='store_true')
+    parser.add_argument('--duration-s', type=float, default=10.0, help='measured time per configuration')
+    parser.add_argument('--load-timeout-s', type=float, default=300.0, help='time to start and warm the workers')
+    parser.add_argument('--max-p99-ms', type=float, help='latency budget of a batch, defaults to no budget')
+    parser.add_argument('--output', help='defaults to tuning_path in the serving section of config.yaml')
+    parser.add_argument('--report', default='artifacts/serving/tuning_report.json')
+    args = parser.parse_args()
+    args.images_dir = os.path.join(project_root_path, args.images_dir)
+
+    worker_counts = args.workers or sorted({min(cpu_count, 2 ** i) for i in range(cpu_count.bit_length())})
+    candidates = []
+    for workers, batch_size, interop_threads in itertools.product(worker_counts, args.batch_sizes,
+                                                                  args.interop_threads):
+        cores_per_worker = max(1, cpu_count // workers)
+        thread_counts = args.torch_threads or sorted({cores_per_worker, max(1, cores_per_worker // 2)})
+        for torch_threads in thread_counts:
+            if workers * torch_threads > cpu_count and not args.allow_oversubscription:
+                continue
+            candidates.append({'workers': workers, 'torch_threads': torch_threads,
+                               'interop_threads': interop_threads, 'max_batch_size': batch_size,
+                               'cpu_affinity': args.affinity})
+    if not candidates:
+        raise ValueError(f"Every configuration uses more than the {cpu_count} cores, "
+                         f"lower the counts or set --allow-oversubscription")
+
+    print(f"{len(candidates)} configurations on {cpu_count} cores, {args.duration_s}s each")
+    print(f"{'workers':>7} {'threads':>7} {'interop':>7} {'batch':>5} {'img/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    runs = []
+    for candidate in candidates:
+        try:
+            result = measure(candidate, args)
+        except RuntimeError as e:
+            print(f"Skipped: {e}")
+            continue
+        runs.append({**candidate, **result})
+        print(f"{candidate['workers']:>7} {candidate['torch_threads']:>7} {candidate['interop_threads']:>7} "
+              f"{candidate['max_batch_size']:>5} {result['throughput_ips']:>9} {result['latency_ms_p50']:>9} "
+              f"{result['latency_ms_p99']:>9}")
+
+    if not runs:
+        raise RuntimeError("No configuration could be measured, see the errors of the workers above")
+
+    # the highest throughput within the latency budget, the lowest p99 when nothing fits it
+    within = [run for run in runs if args.max_p99_ms is None or run['latency_ms_p99'] <= args.max_p99_ms]
+    if within:
+        best = max(within, key=lambda run: (run['throughput_ips'], -run['latency_ms_p99']))
+    else:
+        best = min(runs, key=lambda run: run['latency_ms_p99'])
+        print(f"No configuration has a p99 within {args.max_p99_ms} ms, the lowest p99 is kept")
+
+    config_manager = ConfigurationManager()
+    prediction_config = config_manager.get_prediction_config()
+    output = args.output or config_manager.get_serving_config().tuning_path
+    write_tuning(output, {
+        **{key: best[key] for key in ('workers', 'torch_threads', 'interop_threads', 'max_batch_size',
+                                      'cpu_affinity')},
+        # the tuning is only applied on a machine with the same core count
+        'cpu_count': cpu_count,
+        'engine': prediction_config.engine,
+        'img_size': prediction_config.img_size,
+        'measured': {key: best[key] for key in ('throughput_ips', 'latency_ms_p50', 'latency_ms_p99')},
+        'tuned_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    })
+
+    report_path = os.path.join(project_root_path, args.report)
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w') as file:
+        json.dump({'cpu_count': cpu_count, 'best': best, 'runs': runs}, file, indent=4)
+    print(f"Best: {best}, written to {output}, all runs in {report_path}")
+
+
+if __name__ == '__main__':
+    main()
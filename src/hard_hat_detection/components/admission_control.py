@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.hard_hat_detection.entity.config_entity import AdmissionConfig
+from src.hard_hat_detection.utils.metrics import ADMISSIONS
+
+
+@dataclass
+class Admission:
+    # decision taken for one request, img_size is set when the request runs at the degraded size
+    admitted: bool
+    decision: str
+    img_size: Optional[int] = None
+    status: int = 200
+    retry_after_s: int = 0
+    predicted_ms: Optional[float] = None
+    started_at: float = 0.0
+    ahead: int = 0
+
+
+class AdmissionController:
+    """
+    Rejects requests early when the server cannot answer them within the latency SLO.
+
+    A request is predicted to take the time it already waited before the app saw it, plus the
+    time to drain the requests in flight ahead of it, plus its own service time. The wait before
+    the app comes from the request_start_header set by a trusted proxy (X-Request-Start): gunicorn
+    queues connections until one of its threads is free, and the app cannot see that queue
+    otherwise. The header can be forged without a proxy, so it is read only when configured and
+    the wait counted is capped at the SLO. The drain
+    rate is the number of completions per second of busy time (time with at least one request
+    in flight) over the last window_s, so a lightly loaded server is not mistaken for a slow
+    one. The service time is an EWMA of the durations of the requests that ran the model and
+    found nothing in flight, kept per input size.
+
+    A request over the in-flight cap gets a 429, one that would miss the SLO gets a 503, both
+    with a Retry-After of the predicted drain time. The cap must stay below the request threads
+    of the process, gthread never hands the app more requests than it has threads, so a cap at
+    or above them could never be reached. When degrade_enabled is set, a request that would
+    miss the SLO at full size but meet it at degraded_img_size runs at that size instead.
+    """
+    def __init__(self, config: AdmissionConfig):
+        self.class_name = self.__class__.__name__
+        if config.enabled and not 1 <= config.max_in_flight < config.threads:
+            raise ValueError(f"max_in_flight must be between 1 and the request threads - 1 ({config.threads - 1}), "
+                             f"got {config.max_in_flight}")
+        self.config = config
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.service_s: Dict[Optional[int], float] = {}
+        # busy time and completions so far, sampled at every completion for the drain rate
+        self.busy_s = 0.0
+        self.completed = 0
+        self.changed_at = time.monotonic()
+        self.samples = deque(maxlen=4096)
+        self.queued_s: Optional[float] = None
+        self.counts = {'admitted': 0, 'degraded': 0, 'shed_in_flight': 0, 'shed_slo': 0}
+
+    def update_busy(self, now: float):
+        # called with the lock held, before in_flight changes
+        if self.in_flight:
+            self.busy_s += now - self.changed_at
+        self.changed_at = now
+
+    def drain_rate(self, now: float) -> Optional[float]:
+        # completions per busy second over the window, None until two completions were seen
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.config.window_s:
+            self.samples.popleft()
+        if len(self.samples) < 2:
+            return None
+        _, busy_s, completed = self.samples[0]
+        busy_s = self.busy_s + (now - self.changed_at if self.in_flight else 0.0) - busy_s
+        return (self.completed - completed) / busy_s if busy_s > 0 else None
+
+    def service_time(self, img_size: Optional[int]) -> Optional[float]:
+        if img_size in self.service_s:
+            return self.service_s[img_size]
+        full_s = self.service_s.get(None)
+        if full_s is None or img_size is None:
+            return None
+        # no measurement at this size yet, the compute grows with the number of pixels
+        return full_s * (img_size / self.config.img_size) ** 2
+
+    def admit(self, degradable: bool = True, queued_s: float = 0.0) -> Admission:
+        """
+        Decide whether a new request runs, runs at the degraded size, or is rejected
+
+        :param degradable: The model accepts a smaller input size (torch engine)
+        :param queued_s: Time the request waited before it reached the app (proxy and gunicorn queues)
+        :return: Admission, an admitted one must be passed to release once the request is done
+        """
+        now = time.monotonic()
+        queued_s = min(max(queued_s, 0.0), self.config.latency_slo_ms / 1000)
+        with self.lock:
+            alpha = self.config.ewma_alpha
+            self.queued_s = queued_s if self.queued_s is None else (1 - alpha) * self.queued_s + alpha * queued_s
+            admission = self.decide(now, degradable, queued_s)
+            if admission.admitted:
+                self.update_busy(now)
+                admission.started_at, admission.ahead = now, self.in_flight
+                self.in_flight += 1
+            self.counts[admission.decision] += 1
+        ADMISSIONS.inc(admission.decision)
+        return admission
+
+    def decide(self, now: float, degradable: bool, queued_s: float) -> Admission:
+        # called with the lock held
+        if not self.config.enabled:
+            return Admission(admitted=True, decision='admitted')
+        rate = self.drain_rate(now)
+        if rate is None:
+            drain_s = self.in_flight * (self.service_s.get(None) or 0.0)
+        else:
+            drain_s = self.in_flight / rate
+        # the time already spent in the queues counts against the slo, the retry only waits for the drain
+        wait_s = queued_s + drain_s
+        retry_after_s = max(1, math.ceil(drain_s))
+        if self.in_flight >= self.config.max_in_flight:
+            return Admission(admitted=False, decision='shed_in_flight', status=429, retry_after_s=retry_after_s)
+
+        slo_s = self.config.latency_slo_ms / 1000
+        service_s = self.service_time(None)
+        if service_s is None or wait_s + service_s <= slo_s:
+            predicted_ms = 1000 * (wait_s + service_s) if service_s is not None else None
+            return Admission(admitted=True, decision='admitted', predicted_ms=predicted_ms)
+
+        if degradable and self.config.degrade_enabled:
+            degraded_s = self.service_time(self.config.degraded_img_size)
+            if wait_s + degraded_s <= slo_s:
+                return Admission(admitted=True, decision='degraded', img_size=self.config.degraded_img_size,
+                                 predicted_ms=1000 * (wait_s + degraded_s))
+        return Admission(admitted=False, decision='shed_slo', status=503, retry_after_s=retry_after_s,
+                         predicted_ms=1000 * (wait_s + service_s))
+
+    def release(self, admission: Admission, succeeded: bool = True, ran_model: bool = True):
+        """
+        Mark an admitted request as done
+
+        :param admission: Admission returned by admit
+        :param succeeded: False for requests that failed, they are not counted as completions
+        :param ran_model: False for results served from the cache, they complete a request
+                          but their duration is not a service time
+        """
+        if not admission.admitted:
+            return
+        now = time.monotonic()
+        duration_s = now - admission.started_at
+        with self.lock:
+            self.update_busy(now)
+            self.in_flight -= 1
+            if not succeeded:
+                return
+            self.completed += 1
+            self.samples.append((now, self.busy_s, self.completed))
+            if not ran_model:
+                return
+            # only the requests that found nothing in flight measure the service time,
+            # the first one of each size seeds the estimate
+            if admission.ahead == 0 or admission.img_size not in self.service_s:
+                previous_s = self.service_s.get(admission.img_size, duration_s)
+                alpha = self.config.ewma_alpha
+                self.service_s[admission.img_size] = (1 - alpha) * previous_s + alpha * duration_s
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            rate = self.drain_rate(now)
+            return {
+                'enabled': self.config.enabled,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.config.max_in_flight,
+                'latency_slo_ms': self.config.latency_slo_ms,
+                'drain_rate_per_s': round(rate, 3) if rate is not None else None,
+                'queued_ms': round(1000 * self.queued_s, 3) if self.queued_s is not None else None,
+                'service_ms': {str(size or self.config.img_size): round(1000 * service_s, 3)
+                               for size, service_s in self.service_s.items()},
+                **self.counts
+            }
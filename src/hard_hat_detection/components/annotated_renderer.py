@@ -0,0 +1,161 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from src.hard_hat_detection.entity.config_entity import RenderingConfig
+from src.hard_hat_detection.entity.prediction_entity import Detection
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.annotation import draw_detections
+from src.hard_hat_detection.utils.metrics import stage_timer
+
+
+class AnnotatedImageRenderer:
+    """
+    Draws the detections on an image, downsizes it and encodes it as a JPEG in the results folder.
+
+    In the asynchronous mode the work runs on a thread pool and submit() only returns the name
+    the image will have, so the caller can answer with the detections right away. The image is
+    written to a temporary file and renamed, so a file in the results folder is always complete.
+    The same image submitted again while it is still pending shares the pending render.
+
+    A queued image is marked by an empty <name>.pending file next to it until it is written, so
+    every gunicorn worker can tell a pending image from a missing one, not only the one rendering it.
+    """
+    # a marker this old is left over from a process that died while rendering
+    PENDING_TIMEOUT_S = 60
+
+    def __init__(self, config: RenderingConfig, results_folder: str):
+        self.class_name = self.__class__.__name__
+        self.config = config
+        self.results_folder = results_folder
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending: Dict[str, Future] = {}
+        # report
+        self.rendered = 0
+        self.failed = 0
+        self.inline = 0
+
+    @staticmethod
+    def output_name(source: str) -> str:
+        # the stem keeps the name readable, the hash of the full source keeps a.jpg, a.png and
+        # other/a.jpg apart
+        source_hash = hashlib.sha1(source.encode()).hexdigest()[:8]
+        return f"{Path(source).stem or 'image'}_{source_hash}.jpg"
+
+    def marker_path(self, name: str) -> str:
+        return os.path.join(self.results_folder, f"{name}.pending")
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        # created on first use, threads do not survive the fork of the gunicorn workers
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.config.workers,
+                                               thread_name_prefix=self.class_name)
+        return self.executor
+
+    def resize(self, image: np.ndarray) -> np.ndarray:
+        height, width = image.shape[:2]
+        if not self.config.max_dimension or max(height, width) <= self.config.max_dimension:
+            return image
+        scale = self.config.max_dimension / max(height, width)
+        return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    def render(self, image: np.ndarray, detections: List[Detection], name: str) -> str:
+        """
+        Draw, encode and write the annotated image
+
+        :param image: BGR image the detections were produced for
+        :param detections: Detections in image pixel coordinates
+        :param name: File name in the results folder
+        :return: Path of the annotated image
+        """
+        output_path = os.path.join(self.results_folder, name)
+        with stage_timer('render'):
+            # boxes are drawn at full resolution so thin lines survive the downsizing
+            annotated = self.resize(draw_detections(image, detections))
+        with stage_timer('encode'):
+            ok, encoded = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, self.config.jpeg_quality])
+            if not ok:
+                raise ValueError(f"Annotated image could not be encoded: {name}")
+        with stage_timer('save'):
+            temporary_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary_path, 'wb') as file:
+                file.write(encoded.tobytes())
+            os.replace(temporary_path, output_path)
+        return output_path
+
+    def render_pending(self, image: np.ndarray, detections: List[Detection], name: str) -> str:
+        # background render, the marker goes once the image is in place or the render failed
+        try:
+            return self.render(image, detections, name)
+        finally:
+            try:
+                os.remove(self.marker_path(name))
+            except FileNotFoundError:
+                pass
+
+    def submit(self, image: np.ndarray, detections: List[Detection], source: str) -> str:
+        """
+        Render the annotated image in the background, or right away when asynchronous is off
+        or too many images are already pending
+
+        :param image: BGR image, it must not be modified by the caller afterwards
+        :param detections: Detections in image pixel coordinates
+        :param source: Name of the image, the annotated image is named after its stem and its hash
+        :return: Path the annotated image is (or will be) written to
+        """
+        name = self.output_name(source)
+        with self.lock:
+            if name in self.pending:
+                return os.path.join(self.results_folder, name)
+            queued = self.config.asynchronous and len(self.pending) < self.config.max_pending
+            if queued:
+                open(self.marker_path(name), 'wb').close()
+                future = self.get_executor().submit(self.render_pending, image, detections, name)
+                self.pending[name] = future
+        if not queued:
+            output_path = self.render(image, detections, name)
+            with self.lock:
+                self.inline += int(self.config.asynchronous)
+                self.rendered += 1
+            return output_path
+        future.add_done_callback(lambda done: self.finished(name, done))
+        return os.path.join(self.results_folder, name)
+
+    def finished(self, name: str, future: Future):
+        error = future.exception()
+        with self.lock:
+            self.pending.pop(name, None)
+            if error is not None:
+                self.failed += 1
+            else:
+                self.rendered += 1
+        if error is not None:
+            logger.error(f"{self.class_name}::finished::Error rendering {name}: {error}")
+
+    def is_pending(self, name: str) -> bool:
+        # checked on the results folder, the image may be rendering in another worker
+        try:
+            return time.time() - os.path.getmtime(self.marker_path(name)) < self.PENDING_TIMEOUT_S
+        except FileNotFoundError:
+            return False
+
+    def queue_depth(self) -> int:
+        return len(self.pending)
+
+    def get_stats(self) -> dict:
+        return {
+            'asynchronous': self.config.asynchronous,
+            'pending': len(self.pending),
+            'rendered': self.rendered,
+            'rendered_inline': self.inline,
+            'failed': self.failed
+        }
@@ -0,0 +1,122 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.hard_hat_detection.entity.config_entity import BatchingConfig
+from src.hard_hat_detection.logger.logger_config import logger
+
+
+class BatchRequest:
+    def __init__(self, image: np.ndarray, img_size: Optional[int] = None):
+        self.image = image
+        self.img_size = img_size
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collects concurrent inference requests into batches that run as one forward pass.
+
+    A batch is closed as soon as it holds max_batch_size images or the oldest request has
+    waited max_wait_ms, which bounds the extra latency a request can pick up in the queue.
+    Requests for a smaller input size (degraded by the admission control) run as their own
+    forward pass within the batch. The worker thread is started lazily on the first submit.
+    """
+    def __init__(self, predict_fn: Callable[[List[np.ndarray], Optional[int]], List[Any]], config: BatchingConfig):
+        self.class_name = self.__class__.__name__
+        self.predict_fn = predict_fn
+        self.config = config
+        self.max_wait_s = config.max_wait_ms / 1000
+        self.queue: "queue.Queue[BatchRequest]" = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+        # stats
+        self.batch_size_histogram = Counter()
+        self.requests_processed = 0
+        self.total_wait_s = 0.0
+        self.max_wait_observed_s = 0.0
+
+    def start(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name=self.class_name, daemon=True)
+                self.worker.start()
+                logger.info(f"{self.class_name}::start::Batching worker started with max batch size "
+                            f"{self.config.max_batch_size} and max wait {self.config.max_wait_ms} ms")
+
+    def submit(self, image: np.ndarray, img_size: Optional[int] = None) -> Future:
+        """
+        Queue an image for the next batch
+
+        :param image: BGR image
+        :param img_size: Input size of the image, None for the configured size
+        :return: Future resolved with the predict_fn result for this image
+        """
+        if self.worker is None or not self.worker.is_alive():
+            self.start()
+        request = BatchRequest(image, img_size)
+        self.queue.put(request)
+        return request.future
+
+    def collect_batch(self) -> List[BatchRequest]:
+        batch = [self.queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait_s
+        while len(batch) < self.config.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # take whatever is already queued without waiting, then wait out the deadline
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        tag: str = f"{self.class_name}::run::"
+        while True:
+            batch = self.collect_batch()
+            started_at = time.perf_counter()
+            groups: Dict[Optional[int], List[BatchRequest]] = {}
+            for request in batch:
+                groups.setdefault(request.img_size, []).append(request)
+            for img_size, group in groups.items():
+                try:
+                    results = self.predict_fn([request.image for request in group], img_size)
+                    for request, result in zip(group, results):
+                        request.future.set_result(result)
+                except Exception as e:
+                    logger.error(f"{tag}::Error running the batch of {len(group)} images: {e}")
+                    for request in group:
+                        request.future.set_exception(e)
+            self.record_batch(batch, started_at)
+
+    def record_batch(self, batch: List[BatchRequest], started_at: float):
+        with self.lock:
+            self.batch_size_histogram[len(batch)] += 1
+            self.requests_processed += len(batch)
+            for request in batch:
+                wait_s = started_at - request.enqueued_at
+                self.total_wait_s += wait_s
+                self.max_wait_observed_s = max(self.max_wait_observed_s, wait_s)
+
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            batches = sum(self.batch_size_histogram.values())
+            return {
+                'queue_depth': self.queue_depth(),
+                'batches': batches,
+                'requests': self.requests_processed,
+                'batch_size_histogram': dict(sorted(self.batch_size_histogram.items())),
+                'mean_batch_size': round(self.requests_processed / batches, 2) if batches else 0.0,
+                'mean_wait_ms': round(1000 * self.total_wait_s / self.requests_processed, 3)
+                if self.requests_processed else 0.0,
+                'max_wait_ms': round(1000 * self.max_wait_observed_s, 3)
+            }
@@ -0,0 +1,301 @@
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.hard_hat_detection.entity.config_entity import ComplianceConfig
+from src.hard_hat_detection.entity.prediction_entity import Detection
+from src.hard_hat_detection.logger.logger_config import logger
+
+# counters kept per time bucket
+FIELDS = ('frames', 'compliant', 'violations', 'violation_frames')
+
+
+def add_totals(totals: List[List[int]], windows: List[List[int]]):
+    # adds the counts of every window to the running sums in place
+    for summed, values in zip(totals, windows):
+        for i, value in enumerate(values):
+            summed[i] += value
+
+
+class RollingCounts:
+    """
+    Counts of one source over several sliding windows, backed by a ring of time buckets.
+
+    Every window keeps a running total. A new observation is added to the current bucket and to
+    every total; when time moves to a new bucket, the bucket that falls out of each window is
+    subtracted from that window's total before its slot is reused. Recording and reading are
+    O(1) per window, advancing is O(1) per elapsed bucket and capped at the ring size.
+    """
+    def __init__(self, window_buckets: List[int]):
+        self.window_buckets = window_buckets
+        self.size = max(window_buckets)
+        self.buckets = [[0] * len(FIELDS) for _ in range(self.size)]
+        self.totals = [[0] * len(FIELDS) for _ in window_buckets]
+        self.current: Optional[int] = None
+
+    def advance(self, bucket: int):
+        if self.current is None or bucket - self.current >= self.size:
+            # first observation, or the source was silent for longer than the largest window
+            for counts in self.buckets + self.totals:
+                counts[:] = [0] * len(FIELDS)
+            self.current = bucket
+            return
+        while self.current < bucket:
+            self.current += 1
+            for totals, length in zip(self.totals, self.window_buckets):
+                leaving = self.buckets[(self.current - length) % self.size]
+                for i, value in enumerate(leaving):
+                    totals[i] -= value
+            # the slot of the new bucket held the bucket that just left the largest window
+            self.buckets[self.current % self.size][:] = [0] * len(FIELDS)
+
+    def add(self, bucket: int, values: List[int]):
+        # observations older than the current bucket are counted in the current one
+        if self.current is None or bucket > self.current:
+            self.advance(bucket)
+        counts = self.buckets[self.current % self.size]
+        for i, value in enumerate(values):
+            counts[i] += value
+            for totals in self.totals:
+                totals[i] += value
+
+    def window(self, index: int, bucket: int) -> List[int]:
+        if self.current is None:
+            return [0] * len(FIELDS)
+        if bucket > self.current:
+            self.advance(bucket)
+        return list(self.totals[index])
+
+
+# publish intervals after which the totals of a silent worker are left out of the sum
+STALE_INTERVALS = 3
+
+
+class ComplianceAggregator:
+    """
+    Live helmet compliance per source over the last 1, 5 and 60 minutes (windows_s).
+
+    Fed with the detections of every image or frame served by the prediction pipeline. The
+    violation rate of a window is the share of violation boxes (a head without a helmet) among
+    the compliant and violation boxes. An alert is raised when the rate of the alert window
+    goes above max_violation_rate with at least min_samples boxes, and cleared once it falls
+    back below, so a dashboard of many cameras reads precomputed totals instead of the log.
+
+    Every gunicorn worker only counts the requests it served. With shared_dir set, a background
+    thread of every worker writes the window totals of its sources to <shared_dir>/<host>-<pid>.json
+    every publish_interval_s and reads back the totals of the other workers. The snapshot and the
+    alerts add the live totals of this worker to those, so the other workers are up to
+    publish_interval_s behind; a worker that stopped publishing for STALE_INTERVALS intervals
+    (exited or restarted) no longer counts. Without shared_dir they cover this process only.
+    """
+    def __init__(self, config: ComplianceConfig):
+        self.class_name = self.__class__.__name__
+        self.config = config
+        self.window_buckets = [max(1, int(round(window_s / config.bucket_s))) for window_s in config.windows_s]
+        self.alert_index = config.windows_s.index(config.alert_window_s)
+        self.lock = threading.Lock()
+        self.sources: Dict[str, RollingCounts] = {}
+        self.alerting = set()
+        self.alerts = deque(maxlen=config.recent_alerts)
+        self.project_root_path = Path(__file__).parent.parent.parent.parent
+        self.shared_dir = os.path.join(self.project_root_path, config.shared_dir) if config.shared_dir else None
+        self.start_lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+        self.published_at: Optional[float] = None
+        # window totals of the other workers summed, refreshed by the publisher
+        self.others: Dict[str, List[List[int]]] = {}
+
+    def start(self):
+        # the publisher belongs to the process, gunicorn workers start their own on their first record
+        if self.shared_dir is None or self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            os.makedirs(self.shared_dir, exist_ok=True)
+            self.thread = threading.Thread(target=self.run, name=self.class_name, daemon=True)
+            self.thread.start()
+            self.pid = os.getpid()
+
+    def run(self):
+        while True:
+            time.sleep(self.config.publish_interval_s)
+            try:
+                bucket = self.bucket(time.time())
+                self.publish(bucket)
+                self.read_others(bucket)
+                self.check_shared_alerts(bucket)
+            except Exception as e:
+                logger.error(f"{self.class_name}::run::Error sharing the compliance counts: {e}")
+
+    def window_totals(self, bucket: int) -> Dict[str, List[List[int]]]:
+        # called with the lock held, the totals of every window of the sources that still hold counts
+        totals = {}
+        for name, counts in self.sources.items():
+            windows = [counts.window(i, bucket) for i in range(len(self.window_buckets))]
+            if any(windows[-1]):
+                totals[name] = windows
+        return totals
+
+    def publish(self, bucket: int):
+        # only the totals are copied under the lock, the inference threads record meanwhile;
+        # written to a temp file and renamed, the other workers never read half a file
+        with self.lock:
+            totals = self.window_totals(bucket)
+        file_path = os.path.join(self.shared_dir, f"{socket.gethostname()}-{os.getpid()}.json")
+        temp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({'bucket': bucket, 'bucket_s': self.config.bucket_s, 'windows_s': self.config.windows_s,
+                       'sources': totals}, file)
+        os.replace(temp_path, file_path)
+        self.published_at = time.time()
+
+    def read_others(self, bucket: int):
+        # the totals of the other workers summed; files of workers silent for longer than the
+        # largest window hold nothing left to count and are removed
+        own_name = f"{socket.gethostname()}-{os.getpid()}.json"
+        stale = bucket - max(1, int(STALE_INTERVALS * self.config.publish_interval_s / self.config.bucket_s))
+        others: Dict[str, List[List[int]]] = {}
+        for name in os.listdir(self.shared_dir):
+            if not name.endswith('.json') or name == own_name:
+                continue
+            file_path = os.path.join(self.shared_dir, name)
+            try:
+                with open(file_path) as file:
+                    published = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if published.get('bucket_s') != self.config.bucket_s or published.get('windows_s') != self.config.windows_s:
+                continue
+            if published['bucket'] < bucket - max(self.window_buckets):
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            if published['bucket'] < stale:
+                continue
+            for source, windows in published['sources'].items():
+                add_totals(others.setdefault(source, [[0] * len(FIELDS) for _ in windows]), windows)
+        with self.lock:
+            self.others = others
+
+    def merged_totals(self, bucket: int) -> Dict[str, List[List[int]]]:
+        # called with the lock held, the live totals of this worker plus the published ones of the others
+        totals = self.window_totals(bucket)
+        for source, windows in self.others.items():
+            add_totals(totals.setdefault(source, [[0] * len(FIELDS) for _ in windows]), windows)
+        return totals
+
+    def check_shared_alerts(self, bucket: int):
+        # alerts follow the counts of all the workers, every worker raises (and logs) the same ones
+        changed = []
+        with self.lock:
+            merged = self.merged_totals(bucket)
+            for source in set(merged) | self.alerting:
+                totals = merged[source][self.alert_index] if source in merged else [0] * len(FIELDS)
+                alert = self.check_alert(source, totals)
+                if alert is not None:
+                    changed.append(alert)
+        for alert in changed:
+            self.log_alert(alert)
+
+    def bucket(self, timestamp: float) -> int:
+        return int(timestamp // self.config.bucket_s)
+
+    def record(self, source: str, detections: List[Detection], timestamp: Optional[float] = None):
+        """
+        Add the detections of one image or frame
+
+        :param source: Camera, video or endpoint the image came from
+        :param detections: Detections of the image
+        :param timestamp: Unix time of the image, defaults to now
+        """
+        compliant = sum(detection.class_name in self.config.compliant_classes for detection in detections)
+        violations = sum(detection.class_name in self.config.violation_classes for detection in detections)
+        bucket = self.bucket(timestamp or time.time())
+        with self.lock:
+            counts = self.sources.get(source)
+            if counts is None:
+                if len(self.sources) >= self.config.max_sources:
+                    return
+                counts = self.sources[source] = RollingCounts(self.window_buckets)
+            counts.add(bucket, [1, compliant, violations, int(violations > 0)])
+            # with shared counts the alerts are checked on all the workers by the publisher
+            alert = None if self.shared_dir else self.check_alert(source, counts.window(self.alert_index, bucket))
+        self.start()
+        if alert is not None:
+            self.log_alert(alert)
+
+    def log_alert(self, alert: dict):
+        logger.warning(f"{self.class_name}::record::{alert['state']} on {alert['source']}: violation rate "
+                       f"{alert['violation_rate']} over {self.config.alert_window_s}s")
+
+    def is_above(self, summary: dict) -> bool:
+        samples = summary['compliant'] + summary['violations']
+        return samples >= self.config.min_samples and summary['violation_rate'] > self.config.max_violation_rate
+
+    def check_alert(self, source: str, totals: List[int]) -> Optional[dict]:
+        # called with the lock held, returns the alert when the state of the source changed
+        summary = self.summarise(totals)
+        above = self.is_above(summary)
+        if above == (source in self.alerting):
+            return None
+        if above:
+            self.alerting.add(source)
+        else:
+            self.alerting.discard(source)
+        alert = {'source': source, 'state': 'raised' if above else 'cleared', 'time': time.time(),
+                 'window_s': self.config.alert_window_s, **summary}
+        self.alerts.append(alert)
+        return alert
+
+    @staticmethod
+    def summarise(totals: List[int]) -> dict:
+        summary = dict(zip(FIELDS, totals))
+        samples = summary['compliant'] + summary['violations']
+        summary['violation_rate'] = round(summary['violations'] / samples, 4) if samples else 0.0
+        summary['compliance_rate'] = round(summary['compliant'] / samples, 4) if samples else None
+        return summary
+
+    def snapshot(self, source: Optional[str] = None) -> dict:
+        """
+        Counts and rates of every window, of all the workers when the counts are shared
+
+        :param source: One source, None for all of them
+        :return: {source: {window: counts}}, plus the alerting state of every source
+        """
+        bucket = self.bucket(time.time())
+        with self.lock:
+            if self.shared_dir is not None:
+                totals = self.merged_totals(bucket)
+            else:
+                totals = {name: [counts.window(i, bucket) for i in range(len(self.window_buckets))]
+                          for name, counts in self.sources.items()}
+        return {name: self.describe(totals[name])
+                for name in ([source] if source is not None else totals) if name in totals}
+
+    def describe(self, windows: List[List[int]]) -> dict:
+        summaries = [self.summarise(totals) for totals in windows]
+        return {'alerting': self.is_above(summaries[self.alert_index]),
+                **{f"{window_s}s": summary for window_s, summary in zip(self.config.windows_s, summaries)}}
+
+    def get_alerts(self) -> List[dict]:
+        with self.lock:
+            return list(self.alerts)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'shared': self.shared_dir is not None,
+                'published_at': self.published_at,
+                'sources': len(self.sources),
+                'alerting': sorted(self.alerting),
+                'alerts': len(self.alerts)
+            }
@@ -0,0 +1,332 @@
+import atexit
+import csv
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from src.hard_hat_detection.entity.config_entity import DetectionLogConfig
+from src.hard_hat_detection.entity.prediction_entity import Detection
+from src.hard_hat_detection.logger.logger_config import logger
+
+# one file per column in every segment, every record has the same width in each column
+COLUMNS = {
+    'timestamp': np.dtype('<f8'),  # unix time the result was logged
+    'source_id': np.dtype('<u4'),  # index into the sources of the writer
+    'frame_index': np.dtype('<i8'),  # -1 for single images
+    'class_id': np.dtype('<u2'),
+    'confidence': np.dtype('<f4'),
+    'xyxy': np.dtype(('<f4', (4,))),
+    'track_id': np.dtype('<i4')  # -1 when the result was not tracked
+}
+RECORD_BYTES = sum(dtype.itemsize for dtype in COLUMNS.values())
+# sources past max_sources of a writer are logged under this name
+OVERFLOW_SOURCE = '(other)'
+
+
+def write_json(file_path: str, data: dict):
+    # the index is replaced atomically, readers never see a partial file
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(data, file)
+    os.replace(temp_path, file_path)
+
+
+def read_segment(segment_dir: str, columns: Iterable[str] = COLUMNS) -> Dict[str, np.ndarray]:
+    # the rows of a segment are the complete rows of all its columns, a write cut short by a
+    # crash leaves at most a partial last row that is ignored
+    arrays = {}
+    for name in set(columns) | {'timestamp'}:
+        file_path = os.path.join(segment_dir, f"{name}.bin")
+        if os.path.getsize(file_path) < COLUMNS[name].itemsize:
+            arrays[name] = np.empty((0, *COLUMNS[name].shape), dtype=COLUMNS[name].base)
+        else:
+            arrays[name] = np.memmap(file_path, dtype=COLUMNS[name], mode='r',
+                                     shape=(os.path.getsize(file_path) // COLUMNS[name].itemsize,))
+    rows = min(len(array) for array in arrays.values())
+    return {name: array[:rows] for name, array in arrays.items()}
+
+
+class DetectionLog:
+    """
+    Append-only columnar log of every detection served by the prediction pipeline.
+
+    Results are put on a bounded queue and written by a background thread in batches, so the
+    inference path never waits for the disk; when the queue is full the result is dropped and
+    counted. Each record is a fixed width row (timestamp, source, frame, class, confidence, box,
+    track) stored column by column in segment directories, a segment is sealed after
+    segment_max_rows rows or segment_max_s seconds. Every writer (one per process) has its own
+    directory with a small index of the time range and the sources of each segment, and the
+    source and class names in names.json, rewritten only when a new name is seen. The source
+    comes from the client, so past max_sources sources are logged as OVERFLOW_SOURCE.
+    """
+    def __init__(self, config: DetectionLogConfig):
+        self.class_name = self.__class__.__name__
+        self.config = config
+        self.project_root_path = Path(__file__).parent.parent.parent.parent
+        self.log_dir = os.path.join(self.project_root_path, self.config.log_dir)
+        self.queue = queue.Queue(maxsize=self.config.max_queue)
+        self.start_lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.writer_dir = None
+        self.sources: Dict[str, int] = {}
+        self.classes: Dict[int, str] = {}
+        self.names_changed = False
+        self.index: Dict[str, dict] = {}
+        self.segment = None
+        self.segment_started_at = 0.0
+        # report
+        self.logged_results = 0
+        self.dropped_results = 0
+        self.written_rows = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        # the writer thread and directory belong to the process, gunicorn workers are forked
+        # after the model is loaded, so they are created on the first append of every process,
+        # the lock keeps concurrent first requests from starting two writers
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            writer_dir = os.path.join(self.log_dir, f"{socket.gethostname()}-{os.getpid()}-{int(time.time())}")
+            os.makedirs(writer_dir, exist_ok=True)
+            self.writer_dir = writer_dir
+            self.sources, self.classes, self.index, self.segment = {}, {}, {}, None
+            self.names_changed = False
+            self.thread = threading.Thread(target=self.run, name=self.class_name, daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+            # set last, a thread that sees the pid finds the writer ready
+            self.pid = os.getpid()
+
+    def append(self, source: str, detections: List[Detection], frame_index: Optional[int] = None,
+               timestamp: Optional[float] = None):
+        """
+        Queue the detections of one image or frame, never blocks
+
+        :param source: Camera, video or endpoint the image came from
+        :param detections: Detections of the image
+        :param frame_index: Position of the frame in its video or stream
+        :param timestamp: Unix time of the result, defaults to now
+        """
+        if not detections:
+            return
+        self.start()
+        try:
+            self.queue.put_nowait((timestamp or time.time(), source, -1 if frame_index is None else frame_index,
+                                   list(detections)))
+            self.logged_results += 1
+        except queue.Full:
+            self.dropped_results += 1
+
+    def run(self):
+        pending, rows, last_flush = [], 0, time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.config.flush_interval_s)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                pending.append(item)
+                rows += len(item[3])
+            if pending and (rows >= self.config.batch_size
+                            or time.monotonic() - last_flush >= self.config.flush_interval_s):
+                self.flush(pending)
+                pending, rows, last_flush = [], 0, time.monotonic()
+        if pending:
+            self.flush(pending)
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            self.queue.put(None)
+            self.thread.join(timeout=10)
+
+    def roll(self, now: float, rows: int):
+        # called on the writer thread only
+        active = self.index.get(self.segment)
+        if active is None or active['rows'] + rows > self.config.segment_max_rows \
+                or now - self.segment_started_at > self.config.segment_max_s:
+            self.segment = f"{len(self.index):06d}"
+            self.segment_started_at = now
+            os.makedirs(os.path.join(self.writer_dir, self.segment), exist_ok=True)
+            self.index[self.segment] = {'rows': 0, 'min_timestamp': None, 'max_timestamp': None, 'sources': {}}
+
+    def source_id(self, source: str) -> int:
+        # called on the writer thread only
+        if source not in self.sources and len(self.sources) >= self.config.max_sources:
+            source = OVERFLOW_SOURCE
+        if source not in self.sources:
+            self.sources[source] = len(self.sources)
+            self.names_changed = True
+        return self.sources[source]
+
+    def flush(self, pending: list):
+        started_at = time.perf_counter()
+        try:
+            columns = {name: [] for name in COLUMNS}
+            for timestamp, source, frame_index, detections in pending:
+                source_id = self.source_id(source)
+                for detection in detections:
+                    if self.classes.get(detection.class_id) != detection.class_name:
+                        self.classes[detection.class_id] = detection.class_name
+                        self.names_changed = True
+                    columns['timestamp'].append(timestamp)
+                    columns['source_id'].append(source_id)
+                    columns['frame_index'].append(frame_index)
+                    columns['class_id'].append(detection.class_id)
+                    columns['confidence'].append(detection.confidence)
+                    columns['xyxy'].append(detection.xyxy)
+                    columns['track_id'].append(-1 if detection.track_id is None else detection.track_id)
+            columns = {name: np.asarray(values, dtype=COLUMNS[name]) for name, values in columns.items()}
+            rows = len(columns['timestamp'])
+            self.roll(time.time(), rows)
+            segment_dir = os.path.join(self.writer_dir, self.segment)
+            for name, values in columns.items():
+                with open(os.path.join(segment_dir, f"{name}.bin"), 'ab') as file:
+                    file.write(values.tobytes())
+
+            # the names are written before the index that refers to them
+            if self.names_changed:
+                write_json(os.path.join(self.writer_dir, 'names.json'),
+                           {'sources': list(self.sources), 'classes': {str(k): v for k, v in self.classes.items()}})
+                self.names_changed = False
+            entry = self.index[self.segment]
+            first = entry['rows'] == 0
+            entry['rows'] += rows
+            min_timestamp, max_timestamp = float(columns['timestamp'].min()), float(columns['timestamp'].max())
+            entry['min_timestamp'] = min_timestamp if first else min(entry['min_timestamp'], min_timestamp)
+            entry['max_timestamp'] = max_timestamp if first else max(entry['max_timestamp'], max_timestamp)
+            for source_id, count in Counter(columns['source_id'].tolist()).items():
+                entry['sources'][str(source_id)] = entry['sources'].get(str(source_id), 0) + count
+            write_json(os.path.join(self.writer_dir, 'index.json'), {'segments': self.index})
+            self.written_rows += rows
+            self.flushes += 1
+        except Exception as e:
+            # the columns of the segment may now differ in length, later rows go to a new segment
+            self.segment = None
+            logger.error(f"{self.class_name}::flush::Error writing {len(pending)} results to the detection log: {e}")
+        self.last_flush_ms = 1000 * (time.perf_counter() - started_at)
+
+    def get_stats(self) -> dict:
+        return {
+            'queued': self.queue.qsize(),
+            'logged_results': self.logged_results,
+            'dropped_results': self.dropped_results,
+            'written_rows': self.written_rows,
+            'written_bytes': self.written_rows * RECORD_BYTES,
+            'flushes': self.flushes,
+            'segments': len(self.index),
+            'last_flush_ms': round(self.last_flush_ms, 3)
+        }
+
+
+class DetectionLogReader:
+    """
+    Time range and per-source queries over the segments of all the writers of a detection log.
+
+    Segments whose time range or sources do not match are skipped from the index alone, the
+    matching segments are memory mapped and only the requested columns are read. Results are
+    up to flush_interval_s behind the writers.
+    """
+    def __init__(self, log_dir: str):
+        self.log_dir = log_dir
+
+    def writers(self) -> List[dict]:
+        writers = []
+        if not os.path.isdir(self.log_dir):
+            return writers
+        for name in sorted(os.listdir(self.log_dir)):
+            index_path = os.path.join(self.log_dir, name, 'index.json')
+            names_path = os.path.join(self.log_dir, name, 'names.json')
+            if os.path.exists(index_path) and os.path.exists(names_path):
+                with open(names_path, 'r') as file:
+                    names = json.load(file)
+                with open(index_path, 'r') as file:
+                    writers.append({'dir': os.path.join(self.log_dir, name), **names, **json.load(file)})
+        return writers
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              sources: Optional[List[str]] = None, class_names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Read the detections logged in a time range
+
+        :param start: Unix time, inclusive, None for the beginning of the log
+        :param end: Unix time, exclusive, None for the end of the log
+        :param sources: Only these sources, None for all
+        :param class_names: Only these classes, None for all
+        :return: Column arrays sorted by timestamp, with the source and class names resolved
+        """
+        parts = []
+        for writer in self.writers():
+            source_ids = None if sources is None else \
+                {str(i) for i, name in enumerate(writer['sources']) if name in sources}
+            for segment, entry in writer['segments'].items():
+                if not entry['rows'] or (start is not None and entry['max_timestamp'] < start) \
+                        or (end is not None and entry['min_timestamp'] >= end) \
+                        or (source_ids is not None and not source_ids & set(entry['sources'])):
+                    continue
+                # rows past the indexed count belong to a flush that has not finished
+                columns = {name: array[:entry['rows']]
+                           for name, array in read_segment(os.path.join(writer['dir'], segment)).items()}
+                mask = np.ones(len(columns['timestamp']), dtype=bool)
+                if start is not None:
+                    mask &= columns['timestamp'] >= start
+                if end is not None:
+                    mask &= columns['timestamp'] < end
+                if source_ids is not None:
+                    mask &= np.isin(columns['source_id'], [int(i) for i in source_ids])
+                if class_names is not None:
+                    class_ids = [int(i) for i, name in writer['classes'].items() if name in class_names]
+                    mask &= np.isin(columns['class_id'], class_ids)
+                part = {name: np.asarray(array[mask]) for name, array in columns.items()}
+                part['source'] = np.asarray(writer['sources'], dtype=object)[part['source_id']] \
+                    if len(part['source_id']) else np.empty(0, dtype=object)
+                part['class_name'] = np.asarray([writer['classes'][str(i)] for i in part['class_id']], dtype=object)
+                parts.append(part)
+
+        names = [name for name in COLUMNS if name != 'source_id'] + ['source', 'class_name']
+        if not parts:
+            return {name: np.empty((0, *COLUMNS[name].shape), dtype=COLUMNS[name].base) if name in COLUMNS
+                    else np.empty(0, dtype=object) for name in names}
+        merged = {name: np.concatenate([part[name] for part in parts]) for name in names}
+        order = np.argsort(merged['timestamp'], kind='stable')
+        return {name: array[order] for name, array in merged.items()}
+
+    def export(self, output_path: str, start: Optional[float] = None, end: Optional[float] = None,
+               sources: Optional[List[str]] = None, class_names: Optional[List[str]] = None) -> int:
+        """
+        Bulk export of a query to csv, or to a compressed numpy archive when the path ends with .npz
+
+        :param output_path: File to write
+        :return: Number of exported detections
+        """
+        columns = self.query(start, end, sources, class_names)
+        rows = len(columns['timestamp'])
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        if output_path.endswith('.npz'):
+            np.savez_compressed(output_path, **{name: array.astype(str) if array.dtype == object else array
+                                                for name, array in columns.items()})
+            return rows
+        with open(output_path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['timestamp', 'source', 'frame_index', 'class_id', 'class_name', 'confidence',
+                             'x1', 'y1', 'x2', 'y2', 'track_id'])
+            for i in range(rows):
+                writer.writerow([f"{columns['timestamp'][i]:.3f}", columns['source'][i], columns['frame_index'][i],
+                                 columns['class_id'][i], columns['class_name'][i],
+                                 f"{columns['confidence'][i]:.4f}",
+                                 *(f"{value:.1f}" for value in columns['xyxy'][i]), columns['track_id'][i]])
+        return rows
@@ -0,0 +1,202 @@
+import hashlib
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+import yaml
+
+from src.hard_hat_detection.constants.constants import ENGINE_WEIGHTS_SUFFIX
+from src.hard_hat_detection.entity.config_entity import PredictionConfig
+from src.hard_hat_detection.entity.prediction_entity import Detection
+from src.hard_hat_detection.exception.exception import CustomException
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.common import get_file_hash
+from src.hard_hat_detection.utils.metrics import stage_timer
+from src.hard_hat_detection.utils.postprocessing import BatchedPostprocessor
+from src.hard_hat_detection.utils.preprocessing import LetterboxMeta, LetterboxPreprocessor
+
+
+class Detector:
+    """
+    Keeps the trained YOLOv5 model resident in memory and runs inference in-process.
+
+    The weights are loaded once by load(); every predict() call after that only pays for
+    the pre-processing, the forward pass and NMS.
+    """
+    def __init__(self, config: PredictionConfig):
+        self.class_name = self.__class__.__name__
+        self.config = config
+        self.project_root_path = Path(__file__).parent.parent.parent.parent
+        self.model = None
+        self.device = None
+        self.names = {}
+        self.stride = 32
+        self.img_size = config.img_size
+        self.weights_hash = None
+        # traced torchscript models are exported for a batch size of 1
+        self.dynamic_batch = config.engine != 'torchscript'
+        # only the pytorch model can consume an NHWC input without an extra copy
+        self.channels_last = config.channels_last and config.engine == 'torch'
+        # exported models may have a fixed input shape, only the pytorch model runs at other sizes
+        self.dynamic_size = config.engine == 'torch'
+        # the preprocessors reuse their buffers, every thread calling predict gets its own
+        self.local = threading.local()
+        self.postprocessor = BatchedPostprocessor(conf_thres=config.conf_thres,
+                                                  iou_thres=config.iou_thres,
+                                                  max_det=config.max_det,
+                                                  max_det_per_class=config.max_det_per_class)
+
+    def resolve_path(self, path: str) -> str:
+        if os.path.isabs(path):
+            return path
+        return os.path.join(self.project_root_path, path)
+
+    def add_yolo_v5_to_path(self):
+        tag: str = f"{self.class_name}::add_yolo_v5_to_path::"
+        yolo_path = self.resolve_path(self.config.model_root_path)
+        if not os.path.exists(yolo_path):
+            logger.error(f"{tag}::The yolov5 repository does not exist at: {yolo_path}")
+            raise FileNotFoundError(f"YOLO repository does not exist at: {yolo_path}")
+        if yolo_path not in sys.path:
+            sys.path.insert(0, yolo_path)
+
+    def get_engine_weights_path(self) -> str:
+        # torchscript and onnx files are written next to best.pt by the model export stage
+        if self.config.engine not in ENGINE_WEIGHTS_SUFFIX:
+            raise ValueError(f"Unknown engine: {self.config.engine}, "
+                             f"available engines are: {list(ENGINE_WEIGHTS_SUFFIX)}")
+        weights_path = Path(self.resolve_path(self.config.weights_path))
+        return str(weights_path.with_suffix(ENGINE_WEIGHTS_SUFFIX[self.config.engine]))
+
+    def is_loaded(self) -> bool:
+        return self.model is not None
+
+    def load(self):
+        tag: str = f"{self.class_name}::load::"
+        try:
+            weights_path = self.get_engine_weights_path()
+            if not os.path.exists(weights_path):
+                logger.error(f"{tag}::Weights file does not exist at {weights_path}")
+                raise FileNotFoundError(f"File {weights_path} does not exist")
+
+            self.add_yolo_v5_to_path()
+            from models.common import DetectMultiBackend
+            from utils.general import check_img_size
+            from utils.torch_utils import select_device
+
+            logger.info(f"{tag}::Loading the {self.config.engine} model from: {weights_path}")
+            self.device = select_device(self.config.device)
+            self.model = DetectMultiBackend(weights_path,
+                                            device=self.device,
+                                            data=self.resolve_path(self.config.dataset_yaml_path),
+                                            fuse=True)
+            self.model.eval()
+            if self.channels_last:
+                self.model.model.to(memory_format=torch.channels_last)
+            self.stride = int(self.model.stride)
+            self.names = self.load_class_names()
+            self.img_size = check_img_size(self.config.img_size, s=self.stride)
+            self.weights_hash = get_file_hash(weights_path)
+            self.warmup()
+            logger.info(f"{tag}::Model loaded on {self.device} with classes: {self.names}")
+        except Exception as e:
+            logger.error(f"{tag}::Error loading the model: {e}")
+            raise CustomException(e, sys)
+
+    def fingerprint(self, img_size: Optional[int] = None) -> str:
+        """
+        Identify the loaded weights and the inference parameters, results are only
+        reusable between predictions with the same fingerprint
+
+        :param img_size: Input size of the prediction, defaults to the configured size
+        :return: sha256 hex digest
+        """
+        params = (f"{self.weights_hash}|{self.resolve_img_size(img_size)}|{self.config.conf_thres}|"
+                  f"{self.config.iou_thres}|{self.config.max_det}|{self.config.max_det_per_class}")
+        return hashlib.sha256(params.encode()).hexdigest()
+
+    def load_class_names(self) -> dict:
+        # dataset.yaml is the source of truth for the class names served to clients,
+        # the names embedded in the checkpoint are only used when it is missing
+        tag: str = f"{self.class_name}::load_class_names::"
+        dataset_yaml_path = self.resolve_path(self.config.dataset_yaml_path)
+        if os.path.exists(dataset_yaml_path):
+            with open(dataset_yaml_path, 'r') as file:
+                names = yaml.safe_load(file).get('names', {})
+            logger.info(f"{tag}::Class names read from: {dataset_yaml_path}")
+        else:
+            logger.warning(f"{tag}::{dataset_yaml_path} does not exist, using the class names from the weights")
+            names = self.model.names
+        names = names if isinstance(names, dict) else dict(enumerate(names))
+        return {int(class_id): str(name) for class_id, name in names.items()}
+
+    def warmup(self):
+        # DetectMultiBackend.warmup is a no-op on cpu, run one dummy image through the full path instead
+        self.predict([np.full((self.img_size, self.img_size, 3), 114, dtype=np.uint8)])
+
+    def resolve_img_size(self, img_size: Optional[int] = None) -> int:
+        # a smaller input size is rounded up to a multiple of the stride, like check_img_size
+        if img_size is None or not self.dynamic_size:
+            return self.img_size
+        return min(self.img_size, max(self.stride, -(-int(img_size) // self.stride) * self.stride))
+
+    def get_preprocessor(self, img_size: int) -> LetterboxPreprocessor:
+        preprocessors = getattr(self.local, 'preprocessors', None)
+        if preprocessors is None:
+            preprocessors = self.local.preprocessors = {}
+        preprocessor = preprocessors.get(img_size)
+        if preprocessor is None:
+            preprocessor = LetterboxPreprocessor(img_size,
+                                                 device=self.device,
+                                                 fp16=self.model.fp16,
+                                                 channels_last=self.channels_last)
+            preprocessors[img_size] = preprocessor
+        return preprocessor
+
+    def preprocess(self, images: List[np.ndarray],
+                   img_size: Optional[int] = None) -> Tuple[torch.Tensor, List[LetterboxMeta]]:
+        return self.get_preprocessor(self.resolve_img_size(img_size))(images)
+
+    def postprocess(self, prediction, metas: List[LetterboxMeta]) -> List[List[Detection]]:
+        results = []
+        for det in self.postprocessor(prediction, metas):
+            detections = []
+            for *xyxy, conf, cls in det.tolist():
+                detections.append(Detection(class_id=int(cls),
+                                            class_name=self.names.get(int(cls), str(int(cls))),
+                                            confidence=round(conf, 4),
+                                            xyxy=xyxy))
+            results.append(detections)
+        return results
+
+    def forward(self, tensor: torch.Tensor) -> torch.Tensor:
+        if self.dynamic_batch or tensor.shape[0] == 1:
+            output = self.model(tensor)
+            return output[0] if isinstance(output, (list, tuple)) else output
+        outputs = []
+        for i in range(tensor.shape[0]):
+            output = self.model(tensor[i:i + 1])
+            outputs.append(output[0] if isinstance(output, (list, tuple)) else output)
+        return torch.cat(outputs)
+
+    def predict(self, images: List[np.ndarray], img_size: Optional[int] = None) -> List[List[Detection]]:
+        """
+        Run the model on a list of BGR images as a single batch
+
+        :param images: List of images as returned by cv2.imread
+        :param img_size: Smaller input size for a faster, less accurate pass, defaults to the configured size
+        :return: List of detections for every image, in the same order
+        """
+        if not self.is_loaded():
+            raise ValueError('Model not loaded')
+        with torch.inference_mode():
+            with stage_timer('preprocess'):
+                tensor, metas = self.preprocess(images, img_size)
+            with stage_timer('inference'):
+                prediction = self.forward(tensor)
+            with stage_timer('nms'):
+                return self.postprocess(prediction, metas)
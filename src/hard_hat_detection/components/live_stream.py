@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from src.hard_hat_detection.logger.logger_config import logger
+
+
+class LatestFrameGrabber:
+    """
+    Reads a live capture (webcam or RTSP) on a background thread and keeps only the newest frame.
+
+    Reading as fast as the camera delivers keeps the driver buffer empty, so the consumer
+    always gets the freshest frame; every frame it did not pick up counts as dropped.
+    """
+    def __init__(self, capture: cv2.VideoCapture, source: str):
+        self.class_name = self.__class__.__name__
+        self.capture = capture
+        self.source = source
+        self.condition = threading.Condition()
+        self.frame: Optional[np.ndarray] = None
+        self.sequence = 0
+        self.captured_at = 0.0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if not self.capture.isOpened():
+            self.capture.release()
+            raise ValueError(f'Video source could not be opened: {self.source}')
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f"{self.class_name}-{self.source}", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            ok, frame = self.capture.read()
+            captured_at = time.perf_counter()
+            with self.condition:
+                if not ok:
+                    logger.warning(f"{self.class_name}::run::No more frames from {self.source}")
+                    self.running = False
+                else:
+                    self.frame = frame
+                    self.sequence += 1
+                    self.captured_at = captured_at
+                self.condition.notify_all()
+
+    def read_latest(self, last_sequence: int, timeout: float = 1.0) -> Tuple[Optional[np.ndarray], int, float]:
+        """
+        Wait for a frame newer than last_sequence
+
+        :param last_sequence: Sequence number of the last frame the caller processed
+        :param timeout: Seconds to wait for a new frame
+        :return: (frame, sequence, captured_at), frame is None when no new frame arrived
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > last_sequence or not self.running, timeout)
+            if self.sequence > last_sequence:
+                return self.frame, self.sequence, self.captured_at
+            return None, last_sequence, 0.0
+
+    def is_running(self) -> bool:
+        return self.running
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        self.capture.release()
+
+
+class LiveStreamStats:
+    # processed fps, dropped frames and end-to-end lag (capture to detections ready) of one stream
+    def __init__(self, source: str):
+        self.source = source
+        self.started_at = time.perf_counter()
+        self.processed_frames = 0
+        self.dropped_frames = 0
+        self.stale_frames = 0
+        self.last_lag_s = 0.0
+        self.total_lag_s = 0.0
+        self.max_lag_s = 0.0
+
+    def record_processed(self, lag_s: float):
+        self.processed_frames += 1
+        self.last_lag_s = lag_s
+        self.total_lag_s += lag_s
+        self.max_lag_s = max(self.max_lag_s, lag_s)
+
+    def record_dropped(self, count: int = 1, stale: bool = False):
+        self.dropped_frames += count
+        if stale:
+            self.stale_frames += count
+
+    def as_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            'source': self.source,
+            'processed_frames': self.processed_frames,
+            'processed_fps': round(self.processed_frames / elapsed, 2) if elapsed > 0 else 0.0,
+            'dropped_frames': self.dropped_frames,
+            'stale_frames': self.stale_frames,
+            'lag_ms_last': round(1000 * self.last_lag_s, 2),
+            'lag_ms_mean': round(1000 * self.total_lag_s / self.processed_frames, 2) if self.processed_frames else 0.0,
+            'lag_ms_max': round(1000 * self.max_lag_s, 2)
+        }
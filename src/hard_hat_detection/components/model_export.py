@@ -0,0 +1,182 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+from src.hard_hat_detection.constants.constants import ENGINE_WEIGHTS_SUFFIX, EXPORT_FORMAT_ENGINE
+from src.hard_hat_detection.entity.config_entity import ModelExportConfig
+from src.hard_hat_detection.exception.exception import CustomException
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.common import delete_if_exists
+
+
+class ModelExport:
+    def __init__(self, config: ModelExportConfig):
+        self.class_name = self.__class__.__name__
+        self.config = config
+        self.project_root_path = Path(__file__).parent.parent.parent.parent
+        self.weights_path = os.path.join(self.project_root_path, self.config.weights_path)
+
+    def check_yolo_v5(self):
+        tag: str = f"{self.class_name}::check_yolo_v5::"
+        try:
+            logger.info(f"{tag}::Checking the yolov5 repository")
+
+            yolo_path = os.path.join(self.project_root_path, self.config.model_root_path)
+            logger.info(f"{tag}::Checking the yolov5 repository at: {yolo_path}")
+
+            if os.path.exists(yolo_path):
+                logger.info(f"{tag}::yolov5 repository already exists at: {yolo_path}")
+                if yolo_path not in sys.path:
+                    sys.path.insert(0, yolo_path)
+                return True
+            else:
+                logger.error(f"{tag}::The yolov5 repository does not exist at: {yolo_path}")
+                return False
+        except Exception as e:
+            logger.error(f"{tag}::Error checking the yolov5 repository: {e}")
+            raise CustomException(e, sys)
+
+    def get_export_script_path(self):
+        export_script_path = os.path.join(self.config.model_root_path, "export.py")
+        if not os.path.exists(export_script_path):
+            logger.error(f"File {export_script_path} does not exist")
+            raise FileNotFoundError(f"File {export_script_path} does not exist")
+        return export_script_path
+
+    def get_engine_weights_path(self, engine: str) -> str:
+        return str(Path(self.weights_path).with_suffix(ENGINE_WEIGHTS_SUFFIX[engine]))
+
+    def construct_command(self, export_script_path):
+        # --dynamic gives the onnx model a dynamic batch axis so batched requests run in one call
+        additional_args = (f"--weights {self.weights_path} "
+                           f"--data {self.config.dataset_yaml_path} "
+                           f"--imgsz {self.config.img_size} "
+                           f"--include {' '.join(self.config.formats)} "
+                           f"--device cpu "
+                           f"--dynamic")
+        return f'python {export_script_path} {additional_args}'
+
+    def run_export(self, command):
+        tag: str = f"{self.class_name}::run_export::"
+        try:
+            logger.info(f"{tag}::Running the export command")
+            subprocess.run(command, shell=True, check=True)
+        except Exception as e:
+            logger.error(f"{tag}::Error running the export command: {e}")
+            raise CustomException(e, sys)
+
+    def load_sample_images(self) -> torch.Tensor:
+        from utils.augmentations import letterbox
+
+        images_dir = os.path.join(self.project_root_path, self.config.sample_images_dir)
+        images = []
+        if os.path.exists(images_dir):
+            for name in sorted(os.listdir(images_dir))[:self.config.sample_images]:
+                image = cv2.imread(os.path.join(images_dir, name))
+                if image is not None:
+                    images.append(image)
+        if not images:
+            logger.warning(f"{self.class_name}::load_sample_images::No images in {images_dir}, using random images")
+            images = [np.random.randint(0, 255, (self.config.img_size, self.config.img_size, 3), dtype=np.uint8)
+                      for _ in range(self.config.sample_images)]
+
+        batch = []
+        for image in images:
+            padded = letterbox(image, self.config.img_size, auto=False)[0]
+            batch.append(np.ascontiguousarray(padded.transpose((2, 0, 1))[::-1]))
+        return torch.from_numpy(np.stack(batch)).float() / 255
+
+    @staticmethod
+    def forward(model, tensor: torch.Tensor) -> torch.Tensor:
+        output = model(tensor)
+        output = output[0] if isinstance(output, (list, tuple)) else output
+        return output.float().cpu()
+
+    def benchmark(self, model, tensor: torch.Tensor) -> dict:
+        timings = []
+        for run in range(self.config.benchmark_runs):
+            sample = tensor[run % len(tensor)].unsqueeze(0)
+            started_at = time.perf_counter()
+            self.forward(model, sample)
+            timings.append(1000 * (time.perf_counter() - started_at))
+        return {
+            'mean_ms': round(float(np.mean(timings)), 3),
+            'p50_ms': round(float(np.percentile(timings, 50)), 3),
+            'p95_ms': round(float(np.percentile(timings, 95)), 3)
+        }
+
+    def verify_and_benchmark(self) -> dict:
+        tag: str = f"{self.class_name}::verify_and_benchmark::"
+        from models.common import DetectMultiBackend
+
+        tensor = self.load_sample_images()
+        report = {}
+        with torch.inference_mode():
+            reference_model = DetectMultiBackend(self.weights_path, device=torch.device('cpu'), fuse=True)
+            self.forward(reference_model, tensor[:1])  # warmup
+            reference = torch.cat([self.forward(reference_model, sample.unsqueeze(0)) for sample in tensor])
+            report['torch'] = {'weights_path': self.weights_path, 'passed': True,
+                               'latency': self.benchmark(reference_model, tensor)}
+
+            for export_format in self.config.formats:
+                engine = EXPORT_FORMAT_ENGINE[export_format]
+                engine_weights_path = self.get_engine_weights_path(engine)
+                if not os.path.exists(engine_weights_path):
+                    raise FileNotFoundError(f"Exported file {engine_weights_path} does not exist")
+                model = DetectMultiBackend(engine_weights_path, device=torch.device('cpu'))
+                self.forward(model, tensor[:1])  # warmup
+                output = torch.cat([self.forward(model, sample.unsqueeze(0)) for sample in tensor])
+                box_diff = float((output[..., :4] - reference[..., :4]).abs().max())
+                score_diff = float((output[..., 4:] - reference[..., 4:]).abs().max())
+                passed = box_diff <= self.config.max_box_diff and score_diff <= self.config.max_score_diff
+                report[engine] = {'weights_path': engine_weights_path,
+                                  'max_box_diff': round(box_diff, 6),
+                                  'max_score_diff': round(score_diff, 6),
+                                  'passed': passed,
+                                  'latency': self.benchmark(model, tensor)}
+                logger.info(f"{tag}::{engine}: {report[engine]}")
+
+        logger.info(f"{tag}::Speed report (batch 1, cpu):")
+        for engine, result in report.items():
+            logger.info(f"{tag}::    {engine:<12} mean {result['latency']['mean_ms']:>9.3f} ms  "
+                        f"p50 {result['latency']['p50_ms']:>9.3f} ms  p95 {result['latency']['p95_ms']:>9.3f} ms")
+        return report
+
+    def export(self):
+        tag: str = f"{self.class_name}::export::"
+        try:
+            if not os.path.exists(self.weights_path):
+                logger.error(f"File {self.weights_path} does not exist")
+                raise FileNotFoundError(f"File {self.weights_path} does not exist")
+
+            if not self.check_yolo_v5():
+                raise FileNotFoundError(f"YOLO repository does not exist")
+
+            export_script_path = self.get_export_script_path()
+            command = self.construct_command(export_script_path)
+            logger.info(f"{tag}::Command to export the model: {command}")
+            self.run_export(command)
+
+            report = self.verify_and_benchmark()
+            report_file = os.path.join(self.project_root_path, self.config.report_file)
+            with open(report_file, "w") as file:
+                json.dump(report, file, indent=4)
+            logger.info(f"{tag}::Export report written to: {report_file}")
+
+            failed = [engine for engine, result in report.items() if not result['passed']]
+            if failed:
+                # do not leave an artifact behind that the prediction pipeline could serve
+                for engine in failed:
+                    delete_if_exists(report[engine]['weights_path'])
+                raise ValueError(f"Exported models do not match the PyTorch outputs: {failed}")
+            logger.info(f"{tag}::Model export completed")
+        except Exception as e:
+            logger.error(f"{tag}::Error exporting the model: {e}")
+            raise CustomException(e, sys)
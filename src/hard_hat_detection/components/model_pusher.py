@@ -1,7 +1,6 @@
 import sys
 from pathlib import Path
 
-from cloud.deploy import bucket_name
 from src.hard_hat_detection.entity.config_entity import ModelPusherConfig
 from src.hard_hat_detection.exception.exception import CustomException
 from src.hard_hat_detection.logger.logger_config import logger
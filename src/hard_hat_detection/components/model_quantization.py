@@ -0,0 +1,170 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from src.hard_hat_detection.entity.config_entity import ModelQuantizationConfig
+from src.hard_hat_detection.exception.exception import CustomException
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.common import delete_if_exists
+
+
+class CalibrationImageReader:
+    """
+    Feeds letterboxed validation images to the onnxruntime static quantization calibrator.
+
+    Implements the onnxruntime.quantization.CalibrationDataReader interface (get_next), the
+    images are read one at a time so calibration memory does not grow with the image count.
+    """
+    def __init__(self, image_paths, input_name: str, img_size: int):
+        self.image_paths = iter(image_paths)
+        self.input_name = input_name
+        self.img_size = img_size
+
+    def get_next(self):
+        from utils.augmentations import letterbox
+
+        for image_path in self.image_paths:
+            image = cv2.imread(image_path)
+            if image is None:
+                continue
+            padded = letterbox(image, self.img_size, auto=False)[0]
+            tensor = np.ascontiguousarray(padded.transpose((2, 0, 1))[::-1], dtype=np.float32) / 255
+            return {self.input_name: tensor[None]}
+        return None
+
+
+class ModelQuantization:
+    def __init__(self, config: ModelQuantizationConfig):
+        self.class_name = self.__class__.__name__
+        self.config = config
+        self.project_root_path = Path(__file__).parent.parent.parent.parent
+        self.onnx_weights_path = os.path.join(self.project_root_path, self.config.onnx_weights_path)
+        self.quantized_weights_path = os.path.join(self.project_root_path, self.config.quantized_weights_path)
+
+    def check_yolo_v5(self):
+        tag: str = f"{self.class_name}::check_yolo_v5::"
+        try:
+            logger.info(f"{tag}::Checking the yolov5 repository")
+
+            yolo_path = os.path.join(self.project_root_path, self.config.model_root_path)
+            logger.info(f"{tag}::Checking the yolov5 repository at: {yolo_path}")
+
+            if os.path.exists(yolo_path):
+                logger.info(f"{tag}::yolov5 repository already exists at: {yolo_path}")
+                if yolo_path not in sys.path:
+                    sys.path.insert(0, yolo_path)
+                return True
+            else:
+                logger.error(f"{tag}::The yolov5 repository does not exist at: {yolo_path}")
+                return False
+        except Exception as e:
+            logger.error(f"{tag}::Error checking the yolov5 repository: {e}")
+            raise CustomException(e, sys)
+
+    def get_calibration_image_paths(self):
+        images_dir = os.path.join(self.project_root_path, self.config.calibration_images_dir)
+        if not os.path.exists(images_dir):
+            logger.error(f"Directory {images_dir} does not exist")
+            raise FileNotFoundError(f"Directory {images_dir} does not exist")
+        image_paths = [os.path.join(images_dir, name) for name in sorted(os.listdir(images_dir))]
+        return image_paths[:self.config.calibration_images]
+
+    def get_excluded_nodes(self):
+        import onnx
+
+        model = onnx.load(self.onnx_weights_path)
+        return [node.name for node in model.graph.node
+                if any(pattern in node.name for pattern in self.config.exclude_node_patterns)]
+
+    def quantize(self):
+        tag: str = f"{self.class_name}::quantize::"
+        import onnxruntime
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+        excluded_nodes = self.get_excluded_nodes()
+        logger.info(f"{tag}::{len(excluded_nodes)} nodes are kept in fp32")
+        if self.config.method == 'dynamic':
+            quantize_dynamic(self.onnx_weights_path, self.quantized_weights_path,
+                             weight_type=QuantType.QUInt8,
+                             nodes_to_exclude=excluded_nodes)
+        elif self.config.method == 'static':
+            input_name = onnxruntime.InferenceSession(
+                self.onnx_weights_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+            image_paths = self.get_calibration_image_paths()
+            logger.info(f"{tag}::Calibrating on {len(image_paths)} images from {self.config.calibration_images_dir}")
+            quantize_static(self.onnx_weights_path, self.quantized_weights_path,
+                            CalibrationImageReader(image_paths, input_name, self.config.img_size),
+                            quant_format=QuantFormat.QDQ,
+                            per_channel=True,
+                            activation_type=QuantType.QUInt8,
+                            weight_type=QuantType.QInt8,
+                            nodes_to_exclude=excluded_nodes)
+        else:
+            raise ValueError(f"Unknown quantization method: {self.config.method}, use static or dynamic")
+        logger.info(f"{tag}::Quantized model written to: {self.quantized_weights_path}")
+
+    def evaluate_map(self, weights_path: str, name: str) -> dict:
+        # val.py runs onnx models with a batch size of 1
+        import val
+
+        results, _, _ = val.run(data=os.path.join(self.project_root_path, self.config.dataset_yaml_path),
+                                weights=weights_path,
+                                batch_size=1,
+                                imgsz=self.config.img_size,
+                                task=self.config.evaluation_task,
+                                device='cpu',
+                                plots=False,
+                                project=os.path.join(self.project_root_path, self.config.data_root_dir),
+                                name=name,
+                                exist_ok=True)
+        precision, recall, map50, map50_95 = (float(value) for value in results[:4])
+        return {'precision': round(precision, 4), 'recall': round(recall, 4),
+                'map50': round(map50, 4), 'map50_95': round(map50_95, 4)}
+
+    def run(self):
+        tag: str = f"{self.class_name}::run::"
+        try:
+            if not os.path.exists(self.onnx_weights_path):
+                logger.error(f"File {self.onnx_weights_path} does not exist, run the model export stage first")
+                raise FileNotFoundError(f"File {self.onnx_weights_path} does not exist")
+
+            if not self.check_yolo_v5():
+                raise FileNotFoundError(f"YOLO repository does not exist")
+
+            self.quantize()
+
+            fp32_metrics = self.evaluate_map(self.onnx_weights_path, 'fp32')
+            int8_metrics = self.evaluate_map(self.quantized_weights_path, 'int8')
+            map_drop = fp32_metrics['map50'] - int8_metrics['map50']
+            accepted = map_drop <= self.config.max_map_drop
+            report = {
+                'method': self.config.method,
+                'fp32': fp32_metrics,
+                'int8': int8_metrics,
+                'map50_drop': round(map_drop, 4),
+                'max_map_drop': self.config.max_map_drop,
+                'fp32_size_mb': round(os.path.getsize(self.onnx_weights_path) / 1024 / 1024, 2),
+                'int8_size_mb': round(os.path.getsize(self.quantized_weights_path) / 1024 / 1024, 2),
+                'status': 'accepted' if accepted else 'rejected'
+            }
+            report_file = os.path.join(self.project_root_path, self.config.report_file)
+            with open(report_file, "w") as file:
+                json.dump(report, file, indent=4)
+            logger.info(f"{tag}::Quantization report written to: {report_file}")
+
+            if accepted:
+                logger.info(f"{tag}::INT8 model accepted, mAP@0.5 drop {map_drop:.4f} "
+                            f"is within {self.config.max_map_drop}")
+            else:
+                # the rejected model is removed, so the prediction pipeline can not serve it
+                delete_if_exists(self.quantized_weights_path)
+                logger.warning(f"{tag}::INT8 model rejected, mAP@0.5 dropped by {map_drop:.4f} "
+                               f"(fp32 {fp32_metrics['map50']}, int8 {int8_metrics['map50']}), "
+                               f"the tolerance is {self.config.max_map_drop}")
+        except Exception as e:
+            logger.error(f"{tag}::Error quantizing the model: {e}")
+            raise CustomException(e, sys)
@@ -0,0 +1,432 @@
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import replace
+from pathlib import Path
+from typing import Optional, Tuple
+
+from src.hard_hat_detection.components.detector import Detector
+from src.hard_hat_detection.entity.config_entity import ModelReloadConfig
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.common import get_file_hash
+from src.hard_hat_detection.utils.metrics import MODEL_RELOADS, MODEL_RELOAD_SECONDS, MODEL_VERSION
+
+
+class ModelReloader:
+    """
+    Hot reload of the served weights without restarting the server.
+
+    The watcher polls the weights file of the prediction section (local) or the newest key the
+    model pusher wrote under s3_key_prefix (s3). A new version is copied to versions_dir, named by
+    its hash, then loaded and warmed in a new Detector on the watcher thread while the current
+    model keeps serving. The pipeline then swaps the detector reference: requests that already
+    started finish on the old model, the next ones run on the new one, nothing is dropped.
+    The previous version stays available for a rollback, warm in memory when keep_previous_warm
+    is set, otherwise it is reloaded from its copy. The startup weights are copied on the watcher
+    thread, or before the first swap when polling is off, never on the startup path.
+
+    Under gunicorn the watcher runs in the master only (start_in_master). A swap there is followed
+    by a HUP, so gunicorn forks fresh workers that share the new weights copy-on-write, and the
+    old workers finish their requests and exit. The admin endpoints of a worker only leave a
+    request in versions_dir for the master. The served version is written to versions_dir, so
+    every process reports the same one, and each process marks the version it serves, so it is
+    not pruned while still in use.
+    """
+    IDLE, LOADING = 'idle', 'loading'
+    # files in versions_dir, the leading dot keeps them out of prune
+    STATE_FILE, REQUEST_FILE, SERVING_DIR = '.active.json', '.request.json', '.serving'
+    # how often the master looks for a request of the admin endpoints
+    REQUEST_POLL_S = 1.0
+
+    def __init__(self, pipeline, config: ModelReloadConfig):
+        self.class_name = self.__class__.__name__
+        if config.source not in ('local', 's3'):
+            raise ValueError(f"Unknown model reload source: {config.source}, use local or s3")
+        if config.source == 's3' and pipeline.config.engine != 'torch':
+            raise ValueError(f"The s3 source serves .pt weights, set the engine to torch instead of "
+                             f"{pipeline.config.engine}")
+        self.pipeline = pipeline
+        self.config = config
+        self.versions_dir = pipeline.detector.resolve_path(config.versions_dir)
+        self.swap_lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.state = self.IDLE
+        self.pid = None
+        self.thread = None
+        # set under gunicorn, the watcher and the swaps belong to the master
+        self.master_pid: Optional[int] = None
+        self.on_swapped = None
+        self.marked_pid: Optional[int] = None
+        self.last_check_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.history = deque(maxlen=20)
+        # local source: (mtime, size) of the watched file, a change is picked up once it is stable
+        self.watched_path = pipeline.detector.get_engine_weights_path()
+        self.seen_signature = self.signature()
+        self.pending_signature = None
+        # s3 source: the newest key already looked at
+        self.seen_key: Optional[str] = None
+
+        version = pipeline.detector.weights_hash[:12]
+        # the startup weights are served from the watched file until snapshot_startup copies them
+        self.active = {'version': version, 'origin': 'startup', 'weights_path': self.watched_path,
+                       'loaded_at': time.time(), 'reload_s': None, 'kind': 'startup'}
+        self.startup_copied = False
+        self.previous: Optional[dict] = None
+        self.previous_detector: Optional[Detector] = None
+        MODEL_VERSION.set(1, version)
+
+    def signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.watched_path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def snapshot(self, file_path: str, expected_hash: Optional[str] = None, suffix: Optional[str] = None) -> str:
+        """
+        Copy a weights file to versions_dir under its hash, so it survives the next training run
+
+        :param file_path: Weights file
+        :param expected_hash: Hash of the loaded weights, the original path is kept when the file changed since
+        :param suffix: Suffix of the copy, defaults to the suffixes of the file (.pt, .onnx, .int8.onnx ...)
+        :return: Path of the copy, usable as weights_path of the prediction config
+        """
+        os.makedirs(self.versions_dir, exist_ok=True)
+        suffix = suffix or ''.join(Path(file_path).suffixes) or '.pt'
+        temp_path = os.path.join(self.versions_dir, f".{os.getpid()}.{threading.get_ident()}{suffix}")
+        shutil.copy2(file_path, temp_path)
+        file_hash = get_file_hash(temp_path)
+        if expected_hash is not None and file_hash != expected_hash:
+            os.remove(temp_path)
+            return file_path
+        version_path = os.path.join(self.versions_dir, f"{file_hash[:12]}{suffix}")
+        os.replace(temp_path, version_path)
+        # the detector derives the engine file from weights_path, the copy is named after best.pt
+        return str(Path(version_path).with_name(f"{file_hash[:12]}.pt"))
+
+    def snapshot_startup(self):
+        # called with the swap lock held, the copy keeps the startup version available for a
+        # rollback once the next training run overwrote the watched file
+        if self.startup_copied:
+            return
+        self.startup_copied = True
+        weights_path = self.snapshot(self.watched_path, self.pipeline.detector.weights_hash)
+        if weights_path == self.watched_path:
+            logger.warning(f"{self.class_name}::snapshot_startup::{self.watched_path} changed since it was loaded, "
+                           f"a rollback to the startup version needs keep_previous_warm")
+            return
+        self.active = {**self.active, 'weights_path': weights_path}
+        self.write_state()
+
+    def start_in_master(self, on_swapped):
+        """
+        Watch from the gunicorn master, the workers are forked again after every swap
+
+        :param on_swapped: Called after a swap in the master, sends the HUP that replaces the workers
+        """
+        self.master_pid = os.getpid()
+        self.on_swapped = on_swapped
+        self.start()
+
+    def is_worker(self) -> bool:
+        # a process forked from the master, it serves the model the master had at the fork
+        return self.master_pid is not None and os.getpid() != self.master_pid
+
+    def start(self):
+        # called on every request, the workers only mark the version they serve,
+        # the watcher runs in the master, or in the only process without gunicorn
+        self.mark_serving()
+        if self.is_worker() or self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.write_state()
+            # the master always runs the thread, it picks up the requests of the workers
+            if self.config.enabled or self.master_pid is not None:
+                self.thread = threading.Thread(target=self.run, name=self.class_name, daemon=True)
+                self.thread.start()
+                logger.info(f"{self.class_name}::start::Watching the {self.config.source} weights "
+                            f"every {self.config.poll_interval_s}s" if self.config.enabled else
+                            f"{self.class_name}::start::Waiting for the admin endpoints, weights polling is off")
+            self.pid = os.getpid()
+
+    def run(self):
+        if self.config.enabled:
+            with self.swap_lock:
+                self.snapshot_startup()
+        next_check_at = time.monotonic() + self.config.poll_interval_s
+        while True:
+            time.sleep(self.REQUEST_POLL_S if self.master_pid is not None else self.config.poll_interval_s)
+            if self.master_pid is not None:
+                self.handle_request()
+            if self.config.enabled and time.monotonic() >= next_check_at:
+                next_check_at = time.monotonic() + self.config.poll_interval_s
+                self.check()
+
+    def trigger(self) -> bool:
+        # check for a new version now, on a background thread, False when a swap is running
+        if self.is_worker():
+            return self.request('reload')
+        if self.state == self.LOADING:
+            return False
+        threading.Thread(target=self.check, kwargs={'force': True}, name=f"{self.class_name}-trigger",
+                         daemon=True).start()
+        return True
+
+    def request(self, action: str) -> bool:
+        """
+        Leave a reload or rollback for the master, from a worker
+
+        :param action: reload or rollback
+        :return: False when the master is already swapping
+        """
+        state = self.read_state()
+        if state.get('state') == self.LOADING:
+            return False
+        if action == 'rollback' and not state.get('previous'):
+            raise ValueError('There is no previous model version to roll back to')
+        self.write_json(self.REQUEST_FILE, {'action': action, 'requested_at': time.time(), 'pid': os.getpid()})
+        return True
+
+    def handle_request(self):
+        # in the master, runs the reload or rollback left by a worker
+        request_path = os.path.join(self.versions_dir, self.REQUEST_FILE)
+        try:
+            with open(request_path) as file:
+                request = json.load(file)
+            os.remove(request_path)
+        except (FileNotFoundError, ValueError):
+            return
+        logger.info(f"{self.class_name}::handle_request::{request.get('action')} requested by worker "
+                    f"{request.get('pid')}")
+        if request.get('action') == 'reload':
+            self.check(force=True)
+        elif request.get('action') == 'rollback':
+            try:
+                self.rollback()
+            except Exception as e:
+                self.last_error = str(e)
+
+    def write_json(self, name: str, data: dict):
+        # written to a temp file and renamed, the other processes never read half a file
+        os.makedirs(self.versions_dir, exist_ok=True)
+        file_path = os.path.join(self.versions_dir, name)
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(data, file)
+        os.replace(temp_path, file_path)
+
+    def read_state(self) -> dict:
+        # the version the master (or the only process) serves, the same for every worker
+        try:
+            with open(os.path.join(self.versions_dir, self.STATE_FILE)) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def write_state(self):
+        self.write_json(self.STATE_FILE, {'state': self.state, 'active': self.active, 'previous': self.previous,
+                                          'updated_at': time.time(), 'pid': os.getpid()})
+
+    def mark_serving(self):
+        # one marker per process with the version it serves, read by prune
+        if self.marked_pid == os.getpid():
+            return
+        self.marked_pid = os.getpid()
+        serving_dir = os.path.join(self.versions_dir, self.SERVING_DIR)
+        os.makedirs(serving_dir, exist_ok=True)
+        with open(os.path.join(serving_dir, f"{socket.gethostname()}-{os.getpid()}"), 'w') as file:
+            file.write(self.active['version'])
+
+    def serving_versions(self) -> set:
+        # versions marked by processes that are still alive, markers of this host's dead processes are removed
+        serving_dir = os.path.join(self.versions_dir, self.SERVING_DIR)
+        versions = set()
+        for name in os.listdir(serving_dir) if os.path.isdir(serving_dir) else []:
+            host, _, pid = name.rpartition('-')
+            if host == socket.gethostname():
+                try:
+                    os.kill(int(pid), 0)
+                except ProcessLookupError:
+                    os.remove(os.path.join(serving_dir, name))
+                    continue
+                except (PermissionError, ValueError):
+                    pass
+            with open(os.path.join(serving_dir, name)) as file:
+                versions.add(file.read().strip())
+        return versions
+
+    def find_local(self, force: bool = False) -> Optional[Tuple[str, str]]:
+        signature = self.signature()
+        if signature is None or signature == self.seen_signature:
+            return None
+        if not force and signature != self.pending_signature:
+            # the file may still be written, it is loaded when it is unchanged on the next poll
+            self.pending_signature = signature
+            return None
+        self.seen_signature = signature
+        weights_path = self.snapshot(self.watched_path)
+        return Path(weights_path).stem, weights_path
+
+    def find_s3(self) -> Optional[Tuple[str, str]]:
+        from src.hard_hat_detection.utils.s3_operations import S3Operations
+
+        s3 = S3Operations(bucket_name=self.config.s3_bucket_name, region_name=self.config.region_name)
+        keys = [item['Key'] for item in s3.list_objects(self.config.s3_key_prefix) if item['Key'].endswith('.pt')]
+        if not keys or keys[-1] == self.seen_key:
+            return None
+        self.seen_key = keys[-1]
+        os.makedirs(self.versions_dir, exist_ok=True)
+        download_path = os.path.join(self.versions_dir, f".{os.getpid()}.download.pt")
+        s3.download_file(self.seen_key, download_path)
+        weights_path = self.snapshot(download_path, suffix='.pt')
+        os.remove(download_path)
+        return Path(weights_path).stem, weights_path
+
+    def check(self, force: bool = False):
+        tag: str = f"{self.class_name}::check::"
+        self.last_check_at = time.time()
+        try:
+            found = self.find_s3() if self.config.source == 's3' else self.find_local(force)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"{tag}::Error looking for new weights: {e}")
+            return
+        if found is None:
+            return
+        version, weights_path = found
+        origin = self.seen_key if self.config.source == 's3' else self.watched_path
+        if version == self.active['version']:
+            logger.info(f"{tag}::{origin} is the version already served: {version}")
+            return
+        self.reload(version, weights_path, origin)
+
+    def load(self, weights_path: str) -> Tuple[Detector, float]:
+        # Detector.load also runs the warmup pass, the first request on the new model is not slow
+        started_at = time.perf_counter()
+        detector = Detector(config=replace(self.pipeline.config, weights_path=weights_path))
+        detector.load()
+        if detector.names != self.pipeline.detector.names:
+            logger.warning(f"{self.class_name}::load::The class names changed from "
+                           f"{self.pipeline.detector.names} to {detector.names}")
+        return detector, time.perf_counter() - started_at
+
+    def reload(self, version: str, weights_path: str, origin: str) -> bool:
+        """
+        Load and warm a new version in the background of the serving model, then swap it in
+
+        :param version: Short hash of the weights
+        :param weights_path: Path of the copy in versions_dir
+        :param origin: Watched file or s3 key the version came from
+        :return: True when the new version is served
+        """
+        tag: str = f"{self.class_name}::reload::"
+        if not self.swap_lock.acquire(blocking=False):
+            logger.warning(f"{tag}::A swap is already running, {version} is skipped")
+            return False
+        try:
+            self.state = self.LOADING
+            self.snapshot_startup()
+            self.write_state()
+            logger.info(f"{tag}::Loading version {version} from {origin}")
+            detector, reload_s = self.load(weights_path)
+            self.swap(detector, {'version': version, 'origin': origin, 'weights_path': weights_path,
+                                 'loaded_at': time.time(), 'reload_s': round(reload_s, 3), 'kind': 'reload'})
+            self.prune()
+            return True
+        except Exception as e:
+            # the current model keeps serving
+            self.last_error = str(e)
+            MODEL_RELOADS.inc('reload', 'failed')
+            logger.error(f"{tag}::Version {version} could not be loaded, {self.active['version']} is kept: {e}")
+            return False
+        finally:
+            self.state = self.IDLE
+            self.write_state()
+            self.swap_lock.release()
+
+    def rollback(self) -> dict:
+        """
+        Serve the previous version again
+
+        :return: The version now served
+        """
+        tag: str = f"{self.class_name}::rollback::"
+        if self.previous is None:
+            raise ValueError('There is no previous model version to roll back to')
+        with self.swap_lock:
+            self.state = self.LOADING
+            try:
+                if self.previous_detector is not None:
+                    detector, reload_s = self.previous_detector, 0.0
+                else:
+                    detector, reload_s = self.load(self.previous['weights_path'])
+                self.swap(detector, {**self.previous, 'loaded_at': time.time(), 'reload_s': round(reload_s, 3),
+                                     'kind': 'rollback'})
+            except Exception as e:
+                self.last_error = str(e)
+                MODEL_RELOADS.inc('rollback', 'failed')
+                logger.error(f"{tag}::Rollback to {self.previous['version']} failed: {e}")
+                raise
+            finally:
+                self.state = self.IDLE
+                self.write_state()
+        logger.info(f"{tag}::Rolled back to version {self.active['version']}")
+        return self.active
+
+    def swap(self, detector: Detector, entry: dict):
+        # called with the swap lock held
+        old_detector = self.pipeline.swap_detector(detector)
+        self.previous, self.active = self.active, entry
+        self.previous_detector = old_detector if self.config.keep_previous_warm else None
+        self.history.append(entry)
+        self.last_error = None
+        MODEL_RELOADS.inc(entry['kind'], 'ok')
+        MODEL_RELOAD_SECONDS.set(entry['reload_s'])
+        MODEL_VERSION.clear()
+        MODEL_VERSION.set(1, entry['version'])
+        logger.info(f"{self.class_name}::swap::Serving version {entry['version']} from {entry['origin']} "
+                    f"(loaded in {entry['reload_s']}s), previous version {self.previous['version']}")
+        self.marked_pid = None
+        self.mark_serving()
+        if self.on_swapped is not None:
+            # the master forks new workers with the new model, the old ones drain and exit
+            self.on_swapped()
+
+    def prune(self):
+        # keeps the newest keep_versions copies, never the active or the previous one,
+        # nor one a process may still serve (a worker draining after a swap)
+        keep = {entry['version'] for entry in (self.active, self.previous) if entry}
+        keep |= self.serving_versions()
+        files = sorted((os.path.join(self.versions_dir, name) for name in os.listdir(self.versions_dir)
+                        if not name.startswith('.')), key=os.path.getmtime, reverse=True)
+        versions = []
+        for file_path in files:
+            version = Path(file_path).name.split('.', 1)[0]
+            if version not in versions:
+                versions.append(version)
+            if len(versions) > self.config.keep_versions and version not in keep:
+                os.remove(file_path)
+
+    def get_status(self) -> dict:
+        # active is the version this process serves, shared the one served by the master
+        return {
+            'process': 'worker' if self.is_worker() else 'master' if self.master_pid is not None else 'single',
+            'pid': os.getpid(),
+            'state': self.state,
+            'source': self.config.source,
+            'watching': self.thread is not None and self.thread.is_alive(),
+            'shared': self.read_state(),
+            'active': self.active,
+            'previous': self.previous,
+            'previous_warm': self.previous_detector is not None,
+            'last_check_at': self.last_check_at,
+            'last_error': self.last_error,
+            'history': list(self.history)
+        }
@@ -0,0 +1,98 @@
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from src.hard_hat_detection.entity.config_entity import MotionGateConfig
+
+
+class MotionGate:
+    """
+    Decides per frame whether the detector has to run on a video or a stream.
+
+    Every frame is downscaled to a small blurred grayscale image (well under a millisecond) and
+    compared with the frame the detector last ran on (frame_diff), or fed to a MOG2 background
+    subtractor (mog2). When less than changed_fraction of the pixels changed, the scene is
+    considered static and the previous detections are reused. The detector still runs at least
+    every max_skip_frames frames, so slow changes are never missed for long.
+    """
+    def __init__(self, config: MotionGateConfig, source: str = ''):
+        self.config = config
+        self.source = source
+        self.reference: Optional[np.ndarray] = None
+        self.frames_since_detection = 0
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=config.mog2_history, detectShadows=True) \
+            if config.method == 'mog2' else None
+        if config.method not in ('frame_diff', 'mog2'):
+            raise ValueError(f"Unknown motion gate method: {config.method}, use frame_diff or mog2")
+        # report
+        self.frames = 0
+        self.skipped_frames = 0
+        self.gate_s = 0.0
+        self.detect_s = 0.0
+        self.detected_frames = 0
+        self.last_changed_fraction = 0.0
+
+    def downscale(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        scale = self.config.downscale_width / width
+        small = cv2.resize(frame, (self.config.downscale_width, max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (self.config.blur_kernel, self.config.blur_kernel), 0)
+
+    def changed_fraction(self, small: np.ndarray) -> float:
+        if self.subtractor is not None:
+            # 255 is foreground, 127 a shadow, shadows are not motion of interest
+            mask = self.subtractor.apply(small)
+            return np.count_nonzero(mask == 255) / mask.size
+        if self.reference is None or self.reference.shape != small.shape:
+            return 1.0
+        diff = cv2.absdiff(small, self.reference)
+        return np.count_nonzero(diff > self.config.pixel_threshold) / diff.size
+
+    def should_detect(self, frame: np.ndarray) -> bool:
+        """
+        Check a frame for motion
+
+        :param frame: BGR frame
+        :return: True when the detector has to run, False when the previous detections can be reused
+        """
+        started_at = time.perf_counter()
+        small = self.downscale(frame)
+        self.last_changed_fraction = self.changed_fraction(small)
+        detect = (self.reference is None
+                  or self.frames_since_detection >= self.config.max_skip_frames
+                  or self.last_changed_fraction >= self.config.changed_fraction)
+        if detect:
+            self.reference = small
+            self.frames_since_detection = 0
+        else:
+            self.frames_since_detection += 1
+            self.skipped_frames += 1
+        self.frames += 1
+        self.gate_s += time.perf_counter() - started_at
+        return detect
+
+    def record_detection(self, seconds: float):
+        self.detected_frames += 1
+        self.detect_s += seconds
+
+    def as_dict(self) -> dict:
+        # the saved compute is estimated from the mean detector time of the frames that did run
+        mean_detect_s = self.detect_s / self.detected_frames if self.detected_frames else 0.0
+        saved_s = self.skipped_frames * mean_detect_s - self.gate_s
+        ungated_s = self.frames * mean_detect_s
+        return {
+            'source': self.source,
+            'method': self.config.method,
+            'frames': self.frames,
+            'skipped_frames': self.skipped_frames,
+            'skipped_fraction': round(self.skipped_frames / self.frames, 4) if self.frames else 0.0,
+            'gate_ms_mean': round(1000 * self.gate_s / self.frames, 3) if self.frames else 0.0,
+            'detect_ms_mean': round(1000 * mean_detect_s, 3),
+            'compute_saved_s': round(saved_s, 3),
+            'compute_saved_fraction': round(saved_s / ungated_s, 4) if ungated_s else 0.0,
+            'last_changed_fraction': round(self.last_changed_fraction, 5)
+        }
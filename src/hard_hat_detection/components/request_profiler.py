@@ -0,0 +1,119 @@
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Mapping, Optional
+
+from src.hard_hat_detection.entity.config_entity import ProfilingConfig
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.profiling import CURRENT_TRACE, RequestTrace
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of single requests in production.
+
+    A request is profiled when it is sampled (sample_rate) or carries the debug header with the
+    debug token, the header is ignored while no token is set. Its stage
+    timings are collected in a RequestTrace, and a cProfile or torch profiler dump is written to a
+    rotating directory that keeps the last max_dumps requests. Only one request is dumped at a
+    time, concurrent profiled requests still get their trace.
+    """
+    def __init__(self, config: ProfilingConfig):
+        self.class_name = self.__class__.__name__
+        if config.max_dumps < 1:
+            raise ValueError(f"max_dumps must be at least 1, got {config.max_dumps}")
+        self.config = config
+        self.project_root_path = Path(__file__).parent.parent.parent.parent
+        self.dump_dir = os.path.join(self.project_root_path, self.config.dump_dir)
+        self.dump_lock = threading.Lock()
+        self.recent = deque(maxlen=self.config.recent_traces)
+
+    def should_profile(self, headers: Mapping[str, str]) -> Optional[str]:
+        """
+        Decide whether a request is profiled
+
+        :param headers: Request headers
+        :return: The reason (header or sampled), None when the request is not profiled
+        """
+        # without a token any client could force dumps, the header is then disabled
+        if self.config.debug_token and headers.get(self.config.debug_header) == self.config.debug_token:
+            return 'header'
+        if self.config.sample_rate > 0 and random.random() < self.config.sample_rate:
+            return 'sampled'
+        return None
+
+    @contextmanager
+    def profile(self, reason: str):
+        request_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        trace = RequestTrace(request_id, reason)
+        token = CURRENT_TRACE.set(trace)
+        dumping = self.config.profiler != 'none' and self.dump_lock.acquire(blocking=False)
+        profiler = self.start_profiler() if dumping else None
+        try:
+            yield trace
+        finally:
+            trace.finish()
+            CURRENT_TRACE.reset(token)
+            try:
+                if profiler is not None:
+                    self.write_dump(profiler, request_id)
+                self.recent.append(trace.to_dict())
+                if dumping:
+                    self.write_trace(trace)
+            except Exception as e:
+                logger.error(f"{self.class_name}::profile::Error writing the profile of {request_id}: {e}")
+            finally:
+                if dumping:
+                    self.dump_lock.release()
+
+    def start_profiler(self):
+        if self.config.profiler == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if self.config.profiler == 'torch':
+            import torch
+
+            profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True)
+            profiler.__enter__()
+            return profiler
+        raise ValueError(f"Unknown profiler: {self.config.profiler}, use none, cprofile or torch")
+
+    def write_dump(self, profiler, request_id: str):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            # open with: python -m pstats <file> or snakeviz <file>
+            profiler.dump_stats(os.path.join(self.dump_dir, f"{request_id}.prof"))
+        else:
+            profiler.__exit__(None, None, None)
+            # open with chrome://tracing or https://ui.perfetto.dev
+            profiler.export_chrome_trace(os.path.join(self.dump_dir, f"{request_id}.torch.json"))
+
+    def write_trace(self, trace: RequestTrace):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        with open(os.path.join(self.dump_dir, f"{trace.request_id}.trace.json"), 'w') as file:
+            json.dump(trace.to_dict(), file, indent=4)
+        self.rotate()
+
+    def rotate(self):
+        # the files of a request share the request id prefix, the oldest requests are removed first
+        requests = {}
+        for name in os.listdir(self.dump_dir):
+            requests.setdefault(name.split('.', 1)[0], []).append(name)
+        for request_id in sorted(requests)[:-self.config.max_dumps]:
+            for name in requests[request_id]:
+                try:
+                    os.remove(os.path.join(self.dump_dir, name))
+                except FileNotFoundError:
+                    pass
+
+    def get_recent_traces(self) -> list:
+        return list(self.recent)
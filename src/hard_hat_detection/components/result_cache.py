@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from src.hard_hat_detection.entity.config_entity import ResultCacheConfig
+from src.hard_hat_detection.entity.prediction_entity import Detection
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.common import delete_if_exists
+
+CachedResult = Tuple[Tuple[int, int], List[Detection]]
+
+
+class ResultCache:
+    """
+    Two tier cache of detection results for repeated images.
+
+    Entries are keyed by the content hash of the image and scoped to the model fingerprint
+    (weights hash plus inference parameters). The in-memory tier is an LRU bounded by entry
+    count, the optional disk tier keeps one json file per image and is bounded by size,
+    evicting the least recently used files first. When the fingerprint changes, e.g. a new
+    best.pt is loaded, both tiers are dropped.
+    """
+    def __init__(self, config: ResultCacheConfig):
+        self.class_name = self.__class__.__name__
+        self.config = config
+        self.project_root_path = Path(__file__).parent.parent.parent.parent
+        self.lock = threading.Lock()
+        self.fingerprint = None
+        self.memory: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self.disk_root = os.path.join(self.project_root_path, config.disk_dir)
+        self.disk_dir = None
+        self.disk_max_bytes = int(config.disk_max_mb * 1024 * 1024)
+        self.disk_index: "OrderedDict[str, int]" = OrderedDict()  # file path -> size, least recently used first
+        self.disk_bytes = 0
+        # stats
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def bind(self, fingerprint: str):
+        # called with the lock held
+        if fingerprint == self.fingerprint:
+            return
+        tag: str = f"{self.class_name}::bind::"
+        logger.info(f"{tag}::Model fingerprint changed to {fingerprint[:16]}, invalidating the cached results")
+        self.fingerprint = fingerprint
+        self.memory.clear()
+        if self.config.disk_enabled:
+            self.disk_dir = os.path.join(self.disk_root, fingerprint[:16])
+            if os.path.exists(self.disk_root):
+                for name in os.listdir(self.disk_root):
+                    if os.path.join(self.disk_root, name) != self.disk_dir:
+                        delete_if_exists(os.path.join(self.disk_root, name))
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self.load_disk_index()
+
+    def load_disk_index(self):
+        files = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith('.json')]
+        files.sort(key=os.path.getmtime)
+        self.disk_index = OrderedDict((file_path, os.path.getsize(file_path)) for file_path in files)
+        self.disk_bytes = sum(self.disk_index.values())
+
+    def get(self, digest: str, fingerprint: str) -> Optional[CachedResult]:
+        """
+        Look up the result for an image
+
+        :param digest: Content hash of the encoded image
+        :param fingerprint: Fingerprint of the model that would run the prediction
+        :return: (image_shape, detections) or None on a miss
+        """
+        with self.lock:
+            self.bind(fingerprint)
+            entry = self.memory.get(digest)
+            if entry is not None:
+                self.memory.move_to_end(digest)
+                self.memory_hits += 1
+                return entry
+            file_path = os.path.join(self.disk_dir, f"{digest}.json") if self.config.disk_enabled else None
+            if file_path is None or file_path not in self.disk_index:
+                self.misses += 1
+                return None
+            self.disk_index.move_to_end(file_path)
+
+        entry = self.read_disk(file_path)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.store_memory(digest, entry)
+        return entry
+
+    def put(self, digest: str, fingerprint: str, image_shape: Tuple[int, int], detections: List[Detection]):
+        with self.lock:
+            self.bind(fingerprint)
+            self.store_memory(digest, (tuple(image_shape), detections))
+        if self.config.disk_enabled:
+            self.write_disk(digest, image_shape, detections)
+
+    def store_memory(self, digest: str, entry: CachedResult):
+        # called with the lock held
+        self.memory[digest] = entry
+        self.memory.move_to_end(digest)
+        while len(self.memory) > self.config.memory_max_entries:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+
+    def read_disk(self, file_path: str) -> Optional[CachedResult]:
+        try:
+            with open(file_path, 'r') as file:
+                data = json.load(file)
+            os.utime(file_path)
+            return tuple(data['image_shape']), [Detection(**detection) for detection in data['detections']]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"{self.class_name}::read_disk::Dropping unreadable cache file {file_path}: {e}")
+            with self.lock:
+                self.disk_bytes -= self.disk_index.pop(file_path, 0)
+            delete_if_exists(file_path)
+            return None
+
+    def write_disk(self, digest: str, image_shape: Tuple[int, int], detections: List[Detection]):
+        disk_dir = self.disk_dir
+        file_path = os.path.join(disk_dir, f"{digest}.json")
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump({'image_shape': list(image_shape),
+                           'detections': [detection.to_dict() for detection in detections]}, file)
+            os.replace(temp_path, file_path)
+        except OSError as e:
+            logger.warning(f"{self.class_name}::write_disk::Could not write the cache file {file_path}: {e}")
+            return
+
+        size = os.path.getsize(file_path)
+        evicted = []
+        with self.lock:
+            if disk_dir != self.disk_dir:
+                # the model changed while writing, the directory has been purged
+                return
+            self.disk_bytes += size - self.disk_index.pop(file_path, 0)
+            self.disk_index[file_path] = size
+            while self.disk_bytes > self.disk_max_bytes and len(self.disk_index) > 1:
+                old_path, old_size = self.disk_index.popitem(last=False)
+                self.disk_bytes -= old_size
+                self.evictions += 1
+                evicted.append(old_path)
+        for old_path in evicted:
+            if os.path.exists(old_path):
+                os.remove(old_path)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'memory_entries': len(self.memory),
+                'disk_entries': len(self.disk_index),
+                'disk_bytes': self.disk_bytes
+            }
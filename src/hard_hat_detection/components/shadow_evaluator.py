@@ -0,0 +1,225 @@
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import replace
+from typing import List, Optional
+
+import numpy as np
+import psutil
+
+from src.hard_hat_detection.components.detector import Detector
+from src.hard_hat_detection.components.tracker import iou_matrix
+from src.hard_hat_detection.entity.config_entity import ShadowConfig
+from src.hard_hat_detection.entity.prediction_entity import Detection
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.image_io import decode_image
+from src.hard_hat_detection.utils.metrics import SHADOW_LATENCY, SHADOW_RATE, SHADOW_SAMPLES, STAGES_MUTED
+
+
+def match_detections(production: List[Detection], candidate: List[Detection], iou_threshold: float) -> dict:
+    """
+    Greedily match the boxes of two models on the same image, highest IoU first, regardless of the class
+
+    :return: Counts of matched boxes, matches with a different class, unmatched boxes of each model
+             and the summed IoU of the matches
+    """
+    counts = {'production_boxes': len(production), 'candidate_boxes': len(candidate), 'matched': 0,
+              'class_disagreements': 0, 'production_only': len(production), 'candidate_only': len(candidate),
+              'iou_sum': 0.0}
+    if not production or not candidate:
+        return counts
+    iou = iou_matrix(np.array([detection.xyxy for detection in production], dtype=np.float64),
+                     np.array([detection.xyxy for detection in candidate], dtype=np.float64))
+    used_production, used_candidate = set(), set()
+    for flat in np.argsort(-iou, axis=None):
+        p, c = divmod(int(flat), iou.shape[1])
+        if iou[p, c] < iou_threshold:
+            break
+        if p in used_production or c in used_candidate:
+            continue
+        used_production.add(p)
+        used_candidate.add(c)
+        counts['matched'] += 1
+        counts['iou_sum'] += float(iou[p, c])
+        counts['class_disagreements'] += int(production[p].class_id != candidate[c].class_id)
+    counts['production_only'] -= counts['matched']
+    counts['candidate_only'] -= counts['matched']
+    return counts
+
+
+class ShadowEvaluator:
+    """
+    Runs a candidate model next to the served one on a sample of the uploads.
+
+    The request thread only draws the sample and queues the encoded image, a background worker
+    decodes it and runs the served and the candidate model on it unbatched, back to back in
+    alternating order, so both see the same input and their latencies are measured under the
+    same conditions. The boxes are matched by IoU to count agreements and class disagreements.
+    The worker's stages are muted, so the serving metrics only show client traffic.
+
+    The candidate is loaded and warmed by the PipelineLoader right after the served model, so
+    under gunicorn it is loaded once in the master and shared copy-on-write by the workers,
+    and no serving process pays for the load.
+
+    The sample rate adapts to the spare CPU: every adapt_interval_s it grows by a tenth of
+    max_rate while the machine is below target_cpu_utilization and is halved above it, or when
+    the worker falls behind and samples are dropped.
+    """
+    def __init__(self, pipeline, config: ShadowConfig):
+        self.class_name = self.__class__.__name__
+        self.pipeline = pipeline
+        self.config = config
+        self.queue = queue.Queue(maxsize=config.max_pending)
+        self.candidate: Optional[Detector] = None
+        self.start_lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+        self.error: Optional[str] = None
+        self.rate = config.max_rate
+        self.cpu_utilization: Optional[float] = None
+        self.adapted_at = time.monotonic()
+        self.dropped_since_adapt = 0
+        self.lock = threading.Lock()
+        self.totals = {'compared': 0, 'dropped': 0, 'failed': 0, 'production_boxes': 0, 'candidate_boxes': 0,
+                       'matched': 0, 'class_disagreements': 0, 'production_only': 0, 'candidate_only': 0,
+                       'iou_sum': 0.0, 'identical_images': 0}
+        self.production_ms = deque(maxlen=config.latency_window)
+        self.candidate_ms = deque(maxlen=config.latency_window)
+        SHADOW_RATE.set_function(lambda: self.rate)
+
+    def start(self):
+        # the worker belongs to the process, gunicorn workers start their own on their first sample
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.thread = threading.Thread(target=self.run, name=self.class_name, daemon=True)
+            self.thread.start()
+            self.pid = os.getpid()
+
+    def should_sample(self) -> bool:
+        if self.candidate is None:
+            return False
+        self.adapt()
+        return random.random() < self.rate
+
+    def adapt(self):
+        now = time.monotonic()
+        if now - self.adapted_at < self.config.adapt_interval_s:
+            return
+        with self.lock:
+            if now - self.adapted_at < self.config.adapt_interval_s:
+                return
+            # system wide utilization since the previous call, other workers included
+            self.cpu_utilization = psutil.cpu_percent(interval=None) / 100
+            if self.dropped_since_adapt or self.cpu_utilization > self.config.target_cpu_utilization:
+                self.rate = max(self.config.min_rate, self.rate / 2)
+            else:
+                self.rate = min(self.config.max_rate, self.rate + self.config.max_rate / 10)
+            self.dropped_since_adapt = 0
+            self.adapted_at = now
+
+    def submit(self, data: bytes):
+        """
+        Queue a served upload for the shadow model, never blocks
+
+        :param data: Encoded image bytes of the upload
+        """
+        self.start()
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            with self.lock:
+                self.dropped_since_adapt += 1
+                self.totals['dropped'] += 1
+            SHADOW_SAMPLES.inc('dropped')
+
+    def load_candidate(self):
+        """
+        Load and warm the candidate model, called by the PipelineLoader after the served model,
+        a candidate that fails to load only turns shadowing off
+        """
+        tag: str = f"{self.class_name}::load_candidate::"
+        weights_path = self.pipeline.detector.resolve_path(self.config.weights_path)
+        logger.info(f"{tag}::Loading the shadow model from: {weights_path}")
+        try:
+            candidate = Detector(config=replace(self.pipeline.config, weights_path=weights_path))
+            candidate.load()
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"{tag}::The shadow model could not be loaded, shadowing is off: {e}")
+            return
+        self.candidate = candidate
+
+    def run(self):
+        STAGES_MUTED.set(True)
+        while True:
+            data = self.queue.get()
+            try:
+                self.compare(decode_image(data))
+            except Exception as e:
+                with self.lock:
+                    self.totals['failed'] += 1
+                SHADOW_SAMPLES.inc('failed')
+                logger.warning(f"{self.class_name}::run::Shadow comparison failed: {e}")
+
+    def timed_predict(self, detector: Detector, image: np.ndarray):
+        started_at = time.perf_counter()
+        detections = detector.predict([image])[0]
+        return detections, time.perf_counter() - started_at
+
+    def compare(self, image: np.ndarray):
+        # the detector served right now, a hot reload is compared from its next sample on
+        detector = self.pipeline.detector
+        if self.totals['compared'] % 2:
+            candidate, candidate_s = self.timed_predict(self.candidate, image)
+            production, production_s = self.timed_predict(detector, image)
+        else:
+            production, production_s = self.timed_predict(detector, image)
+            candidate, candidate_s = self.timed_predict(self.candidate, image)
+
+        counts = match_detections(production, candidate, self.config.iou_threshold)
+        identical = counts['production_only'] == counts['candidate_only'] == counts['class_disagreements'] == 0
+        with self.lock:
+            for key, value in counts.items():
+                self.totals[key] += value
+            self.totals['identical_images'] += int(identical)
+            self.totals['compared'] += 1
+            self.production_ms.append(1000 * production_s)
+            self.candidate_ms.append(1000 * candidate_s)
+        SHADOW_SAMPLES.inc('compared')
+        SHADOW_LATENCY.observe(production_s, 'production')
+        SHADOW_LATENCY.observe(candidate_s, 'candidate')
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            totals = dict(self.totals)
+            production_ms, candidate_ms = np.array(self.production_ms), np.array(self.candidate_ms)
+        boxes = totals['production_boxes'] + totals['candidate_boxes']
+        delta_ms = candidate_ms - production_ms
+        return {
+            'weights_path': self.config.weights_path,
+            'error': self.error,
+            'sample_rate': round(self.rate, 4),
+            'cpu_utilization': self.cpu_utilization,
+            'pending': self.queue.qsize(),
+            **{key: totals[key] for key in ('compared', 'dropped', 'failed', 'production_boxes', 'candidate_boxes',
+                                            'matched', 'class_disagreements', 'production_only', 'candidate_only')},
+            # share of the boxes of both models that found a match of the same class
+            'agreement': round(2 * (totals['matched'] - totals['class_disagreements']) / boxes, 4) if boxes else None,
+            'class_disagreement_rate': round(totals['class_disagreements'] / totals['matched'], 4)
+            if totals['matched'] else None,
+            'mean_iou': round(totals['iou_sum'] / totals['matched'], 4) if totals['matched'] else None,
+            'identical_image_rate': round(totals['identical_images'] / totals['compared'], 4)
+            if totals['compared'] else None,
+            'latency_ms': {
+                'production_p50': round(float(np.percentile(production_ms, 50)), 3) if len(production_ms) else None,
+                'candidate_p50': round(float(np.percentile(candidate_ms, 50)), 3) if len(candidate_ms) else None,
+                'delta_mean': round(float(delta_ms.mean()), 3) if len(delta_ms) else None,
+                'delta_p95': round(float(np.percentile(delta_ms, 95)), 3) if len(delta_ms) else None
+            }
+        }
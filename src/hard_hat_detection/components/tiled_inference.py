@@ -0,0 +1,102 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+import torch
+
+from src.hard_hat_detection.components.detector import Detector
+from src.hard_hat_detection.entity.config_entity import TilingConfig
+from src.hard_hat_detection.entity.prediction_entity import Detection
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.tiling import tile_grid, merge_tile_detections
+
+
+class TiledDetector:
+    """
+    Sliced inference for high resolution images.
+
+    The image is cut into overlapping tiles that are run through the detector at their native
+    resolution (plus, optionally, the downsized full frame for objects larger than a tile), then
+    the detections are shifted back to image pixels and merged across the tile borders.
+    Tile batches run one after the other, or in parallel threads when workers is above 1.
+    """
+    def __init__(self, detector: Detector, config: TilingConfig):
+        self.class_name = self.__class__.__name__
+        self.detector = detector
+        self.config = config
+        self.executor = None
+
+    def should_tile(self, image: np.ndarray) -> bool:
+        return max(image.shape[:2]) >= self.config.min_image_size
+
+    def fingerprint(self) -> str:
+        # tiled results differ from full frame results, so they are cached under their own key
+        params = (f"{self.detector.fingerprint()}|{self.config.min_image_size}|{self.config.tile_size}|"
+                  f"{self.config.overlap}|{self.config.include_full_frame}|{self.config.merge_thres}|"
+                  f"{self.config.merge_metric}")
+        return hashlib.sha256(params.encode()).hexdigest()
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.config.workers,
+                                               thread_name_prefix=self.class_name)
+        return self.executor
+
+    def run_batches(self, crops: List[np.ndarray], detector: Detector) -> List[List[Detection]]:
+        batch_size = max(1, self.config.batch_size)
+        batches = [crops[i:i + batch_size] for i in range(0, len(crops), batch_size)]
+        if self.config.workers > 1 and len(batches) > 1:
+            results = self.get_executor().map(detector.predict, batches)
+        else:
+            results = map(detector.predict, batches)
+        return [detections for batch in results for detections in batch]
+
+    def predict(self, image: np.ndarray) -> List[Detection]:
+        """
+        Detect objects in a large image tile by tile
+
+        :param image: BGR image
+        :return: Detections in original image pixels, merged across the tiles
+        """
+        # all the tiles of an image run on the same model, even when it is swapped meanwhile
+        detector = self.detector
+        height, width = image.shape[:2]
+        tiles = tile_grid(height, width, self.config.tile_size, self.config.overlap)
+        # the crops are views into the image, nothing is copied before the letterbox
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        if self.config.include_full_frame:
+            tiles.append((0, 0, width, height))
+            crops.append(image)
+
+        boxes, scores, classes = [], [], []
+        for (x1, y1, _, _), detections in zip(tiles, self.run_batches(crops, detector)):
+            # the best boxes of each tile, a crowded tile does not blow up the merge
+            detections = sorted(detections, key=lambda detection: detection.confidence,
+                                reverse=True)[:self.config.max_det_per_tile]
+            for detection in detections:
+                bx1, by1, bx2, by2 = detection.xyxy
+                boxes.append([bx1 + x1, by1 + y1, bx2 + x1, by2 + y1])
+                scores.append(detection.confidence)
+                classes.append(detection.class_id)
+        if not boxes:
+            return []
+
+        boxes = torch.tensor(boxes)
+        keep = merge_tile_detections(boxes, torch.tensor(scores), torch.tensor(classes),
+                                     thres=self.config.merge_thres,
+                                     metric=self.config.merge_metric,
+                                     max_det=detector.config.max_det)
+        merged = []
+        for i in keep.tolist():
+            merged.append(Detection(class_id=classes[i],
+                                    class_name=detector.names.get(classes[i], str(classes[i])),
+                                    confidence=scores[i],
+                                    xyxy=boxes[i].tolist()))
+        logger.debug(f"{self.class_name}::predict::{len(tiles)} tiles, {len(boxes)} boxes merged into {len(merged)}")
+        return merged
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
@@ -0,0 +1,209 @@
+import itertools
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from src.hard_hat_detection.entity.config_entity import TrackingConfig
+from src.hard_hat_detection.entity.prediction_entity import Detection
+from src.hard_hat_detection.logger.logger_config import logger
+
+
+def xyxy_to_state(xyxy) -> np.ndarray:
+    # centre x, centre y, area, aspect ratio
+    x1, y1, x2, y2 = xyxy
+    width, height = max(x2 - x1, 1e-3), max(y2 - y1, 1e-3)
+    return np.array([x1 + width / 2, y1 + height / 2, width * height, width / height], dtype=np.float64)
+
+
+def state_to_xyxy(state: np.ndarray) -> List[float]:
+    cx, cy, area, ratio = state[:4]
+    width = np.sqrt(max(area, 1e-3) * max(ratio, 1e-3))
+    height = max(area, 1e-3) / width
+    return [float(cx - width / 2), float(cy - height / 2), float(cx + width / 2), float(cy + height / 2)]
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(2)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+class Track:
+    """
+    One tracked object, its box follows a constant velocity Kalman filter (as in SORT) over
+    centre, area and aspect ratio, so it keeps moving on the frames the detector does not run on.
+    """
+    # state transition and measurement matrices shared by all tracks
+    F = np.eye(7)
+    F[0, 4] = F[1, 5] = F[2, 6] = 1
+    H = np.eye(4, 7)
+
+    def __init__(self, track_id: int, detection: Detection, timestamp: float):
+        self.track_id = track_id
+        self.class_id = detection.class_id
+        self.class_name = detection.class_name
+        self.confidence = detection.confidence
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.misses = 0
+        self.alerted = False
+        self.x = np.zeros(7)
+        self.x[:4] = xyxy_to_state(detection.xyxy)
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+        self.Q = np.diag([1.0, 1.0, 1.0, 1e-2, 1e-2, 1e-2, 1e-4])
+        self.R = np.diag([1.0, 1.0, 10.0, 10.0])
+
+    def predict(self):
+        if self.x[2] + self.x[6] <= 0:
+            self.x[6] = 0
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def update(self, detection: Detection, timestamp: float):
+        residual = xyxy_to_state(detection.xyxy) - self.H @ self.x
+        gain = self.P @ self.H.T @ np.linalg.inv(self.H @ self.P @ self.H.T + self.R)
+        self.x = self.x + gain @ residual
+        self.P = (np.eye(7) - gain @ self.H) @ self.P
+        self.confidence = detection.confidence
+        self.last_seen = timestamp
+        self.misses = 0
+
+    def xyxy(self) -> List[float]:
+        return state_to_xyxy(self.x)
+
+    def to_detection(self) -> Detection:
+        return Detection(class_id=self.class_id, class_name=self.class_name,
+                         confidence=round(self.confidence, 4),
+                         xyxy=[round(value, 1) for value in self.xyxy()],
+                         track_id=self.track_id)
+
+
+class IouTracker:
+    """
+    Lightweight tracker for the detect-every-N-frames mode of the video and stream paths.
+
+    The detector runs every detect_interval frames, or earlier when the confidence of a track
+    decayed below min_confidence while it was only predicted. On those frames the detections
+    are matched to the predicted tracks by IoU (Hungarian assignment, same class only), in
+    between the Kalman filters carry the boxes forward. Tracks of a violation class (a head
+    without a helmet) that stay visible for alert_after_s raise one alert each.
+    """
+    # alerts kept for the report, a stream can run for days
+    RECENT_ALERTS = 100
+
+    def __init__(self, config: TrackingConfig, source: str = ''):
+        self.class_name = self.__class__.__name__
+        self.config = config
+        self.source = source
+        self.tracks: List[Track] = []
+        self.ids = itertools.count(1)
+        self.frames_since_detection = 0
+        # report
+        self.frames = 0
+        self.detector_runs = 0
+        self.total_tracks = 0
+        self.total_alerts = 0
+        self.alerts = deque(maxlen=self.RECENT_ALERTS)
+
+    def needs_detection(self) -> bool:
+        if self.detector_runs == 0 or self.frames_since_detection + 1 >= self.config.detect_interval:
+            return True
+        # a track matched on the last detector run that is only predicted since then
+        return any(track.misses == 0 and track.confidence < self.config.min_confidence for track in self.tracks)
+
+    def predict(self) -> List[Detection]:
+        """
+        Move the tracks to the current frame without running the detector
+
+        :return: The predicted boxes of the confirmed tracks
+        """
+        self.frames += 1
+        self.frames_since_detection += 1
+        for track in self.tracks:
+            track.predict()
+            track.confidence *= self.config.confidence_decay
+        return self.confirmed()
+
+    def update(self, detections: List[Detection], timestamp: float) -> List[Detection]:
+        """
+        Match the detections of the current frame to the tracks
+
+        :param detections: Detector output of the frame
+        :param timestamp: Time of the frame in seconds
+        :return: The detections of the frame with their track id
+        """
+        self.frames += 1
+        self.detector_runs += 1
+        self.frames_since_detection = 0
+        for track in self.tracks:
+            track.predict()
+
+        matched_tracks, matched_detections = set(), set()
+        if self.tracks and detections:
+            iou = iou_matrix(np.array([track.xyxy() for track in self.tracks]),
+                             np.array([detection.xyxy for detection in detections], dtype=np.float64))
+            same_class = np.array([[track.class_id == detection.class_id for detection in detections]
+                                   for track in self.tracks])
+            iou = np.where(same_class, iou, 0.0)
+            for t, d in zip(*linear_sum_assignment(-iou)):
+                if iou[t, d] >= self.config.iou_threshold:
+                    self.tracks[t].update(detections[d], timestamp)
+                    matched_tracks.add(t)
+                    matched_detections.add(d)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+                track.confidence *= self.config.confidence_decay
+        self.tracks = [track for track in self.tracks if track.misses <= self.config.max_misses]
+        for d, detection in enumerate(detections):
+            if d not in matched_detections:
+                self.tracks.append(Track(next(self.ids), detection, timestamp))
+                self.total_tracks += 1
+        return self.confirmed()
+
+    def confirmed(self) -> List[Detection]:
+        # unmatched tracks are kept for max_misses detector runs to be matched again, but not reported
+        return [track.to_detection() for track in self.tracks if track.misses == 0]
+
+    def check_alerts(self, timestamp: float, frame_index: Optional[int] = None) -> List[dict]:
+        """
+        Raise an alert for every violation track visible for longer than alert_after_s
+
+        :param timestamp: Time of the frame in seconds
+        :param frame_index: Frame the alert is raised on
+        :return: The new alerts
+        """
+        alerts = []
+        for track in self.tracks:
+            # a track missed by the detector may have left the frame, it is not counted as visible
+            if track.alerted or track.misses > 0 or track.class_name not in self.config.violation_classes:
+                continue
+            duration = timestamp - track.first_seen
+            if duration >= self.config.alert_after_s:
+                track.alerted = True
+                alert = {'source': self.source, 'track_id': track.track_id, 'class_name': track.class_name,
+                         'duration_s': round(duration, 2), 'frame_index': frame_index,
+                         'xyxy': [round(value, 1) for value in track.xyxy()]}
+                alerts.append(alert)
+                logger.warning(f"{self.class_name}::check_alerts::{track.class_name} track {track.track_id} "
+                               f"visible for {duration:.1f}s on {self.source}")
+        self.alerts.extend(alerts)
+        self.total_alerts += len(alerts)
+        return alerts
+
+    def as_dict(self) -> dict:
+        return {
+            'source': self.source,
+            'frames': self.frames,
+            'detector_runs': self.detector_runs,
+            'detector_run_fraction': round(self.detector_runs / self.frames, 4) if self.frames else 0.0,
+            'active_tracks': len(self.tracks),
+            'total_tracks': self.total_tracks,
+            'alerts': self.total_alerts
+        }
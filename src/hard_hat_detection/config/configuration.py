@@ -3,7 +3,11 @@ from pathlib import Path
 
 from src.hard_hat_detection.constants.constants import CONFIG_FILE_PATH, PARAMS_FILE_PATH
 from src.hard_hat_detection.entity.config_entity import DataIngestionConfig, DataValidationConfig, \
-    DataTransformationConfig, ModelTrainerConfig, ModelEvaluationConfig, ModelPusherConfig
+    DataTransformationConfig, ModelTrainerConfig, ModelEvaluationConfig, ModelPusherConfig, PredictionConfig, \
+    BatchingConfig, ResultCacheConfig, LiveStreamConfig, ServingConfig, ModelExportConfig, \
+    ModelQuantizationConfig, TilingConfig, ProfilingConfig, \
+    MotionGateConfig, TrackingConfig, RenderingConfig, DetectionLogConfig, ComplianceConfig, ModelReloadConfig, \
+    ShadowConfig, AdmissionConfig
 from src.hard_hat_detection.logger.logger_config import logger
 from src.hard_hat_detection.utils.common import read_yaml, create_directories
 
@@ -171,5 +175,351 @@ class ConfigurationManager:
 
         return model_pusher_config
 
+    def get_model_export_config(self) -> ModelExportConfig:
+        tag: str = f"{self.class_name}::get_model_export_config::"
+        config = self.config.model_export
+        logger.info(f"{tag}Model export configuration obtained from the config file")
 
+        # create the data directory
+        data_dir = config.data_root_dir
+        logger.info(f"{tag}Data directory: {data_dir} obtained from the config file")
+        create_directories([data_dir])
+        logger.info(f"{tag}Data directory created: {data_dir}")
+
+        model_export_config: ModelExportConfig = ModelExportConfig(
+            data_root_dir=config.data_root_dir,
+            weights_path=config.weights_path,
+            dataset_yaml_path=config.dataset_yaml_path,
+            sample_images_dir=config.sample_images_dir,
+            report_file=config.report_file,
+            model_root_path=config.model_root_path,
+            img_size=config.img_size,
+            formats=list(config.formats),
+            max_score_diff=config.max_score_diff,
+            max_box_diff=config.max_box_diff,
+            sample_images=config.sample_images,
+            benchmark_runs=config.benchmark_runs
+        )
+        logger.info(f"{tag}Model export configuration created")
+        return model_export_config
+
+    def get_model_quantization_config(self) -> ModelQuantizationConfig:
+        tag: str = f"{self.class_name}::get_model_quantization_config::"
+        config = self.config.model_quantization
+        logger.info(f"{tag}Model quantization configuration obtained from the config file")
+
+        # create the data directory
+        data_dir = config.data_root_dir
+        logger.info(f"{tag}Data directory: {data_dir} obtained from the config file")
+        create_directories([data_dir])
+        logger.info(f"{tag}Data directory created: {data_dir}")
+
+        model_quantization_config: ModelQuantizationConfig = ModelQuantizationConfig(
+            data_root_dir=config.data_root_dir,
+            onnx_weights_path=config.onnx_weights_path,
+            dataset_yaml_path=config.dataset_yaml_path,
+            calibration_images_dir=config.calibration_images_dir,
+            quantized_weights_path=config.quantized_weights_path,
+            report_file=config.report_file,
+            model_root_path=config.model_root_path,
+            img_size=config.img_size,
+            method=config.method,
+            calibration_images=config.calibration_images,
+            exclude_node_patterns=list(config.exclude_node_patterns),
+            evaluation_task=config.evaluation_task,
+            max_map_drop=config.max_map_drop
+        )
+        logger.info(f"{tag}Model quantization configuration created")
+        return model_quantization_config
+
+    def get_prediction_config(self) -> PredictionConfig:
+        tag: str = f"{self.class_name}::get_prediction_config::"
+        config = self.config.prediction
+        logger.info(f"{tag}Prediction configuration obtained from the config file")
+
+        prediction_config: PredictionConfig = PredictionConfig(
+            # model
+            model_root_path=config.model_root_path,
+            weights_path=config.weights_path,
+            dataset_yaml_path=config.dataset_yaml_path,
+            # outputs
+            output_dir=config.output_dir,
+            results_dir=config.results_dir,
+            save_results=config.save_results,
+            persist_uploads=config.persist_uploads,
+            uploads_dir=config.uploads_dir,
+            # inference
+            engine=config.engine,
+            device=config.device,
+            img_size=config.img_size,
+            conf_thres=config.conf_thres,
+            iou_thres=config.iou_thres,
+            max_det=config.max_det,
+            max_det_per_class=config.max_det_per_class,
+            channels_last=config.channels_last
+        )
+
+        return prediction_config
+
+    def get_batching_config(self) -> BatchingConfig:
+        tag: str = f"{self.class_name}::get_batching_config::"
+        config = self.config.batching
+        logger.info(f"{tag}Batching configuration obtained from the config file")
+
+        # a worker never runs more requests at once than its threads, or than the admission cap,
+        # a batch larger than that never fills and always waits max_wait_ms
+        threads = self.config.serving.threads
+        max_concurrent_requests = (self.config.admission.max_in_flight or max(1, threads - 1)) \
+            if self.config.admission.enabled else threads
+        if config.enabled and config.max_batch_size > max_concurrent_requests:
+            raise ValueError(f"batching.max_batch_size ({config.max_batch_size}) is above the {max_concurrent_requests} "
+                             f"requests a worker runs at once, raise serving.threads to at least "
+                             f"{config.max_batch_size + 1} or lower the batch size")
+
+        batching_config: BatchingConfig = BatchingConfig(
+            enabled=config.enabled,
+            max_batch_size=config.max_batch_size,
+            max_wait_ms=config.max_wait_ms,
+            max_concurrent_requests=max_concurrent_requests
+        )
+
+        return batching_config
+
+    def get_result_cache_config(self) -> ResultCacheConfig:
+        tag: str = f"{self.class_name}::get_result_cache_config::"
+        config = self.config.result_cache
+        logger.info(f"{tag}Result cache configuration obtained from the config file")
+
+        result_cache_config: ResultCacheConfig = ResultCacheConfig(
+            enabled=config.enabled,
+            memory_max_entries=config.memory_max_entries,
+            disk_enabled=config.disk_enabled,
+            disk_dir=config.disk_dir,
+            disk_max_mb=config.disk_max_mb
+        )
+
+        return result_cache_config
+
+    def get_live_stream_config(self) -> LiveStreamConfig:
+        tag: str = f"{self.class_name}::get_live_stream_config::"
+        config = self.config.live_stream
+        logger.info(f"{tag}Live stream configuration obtained from the config file")
+
+        live_stream_config: LiveStreamConfig = LiveStreamConfig(
+            latency_budget_ms=config.latency_budget_ms,
+            stats_log_interval_s=config.stats_log_interval_s
+        )
+
+        return live_stream_config
+
+    def get_motion_gate_config(self) -> MotionGateConfig:
+        tag: str = f"{self.class_name}::get_motion_gate_config::"
+        config = self.config.motion_gate
+        logger.info(f"{tag}Motion gate configuration obtained from the config file")
+
+        motion_gate_config: MotionGateConfig = MotionGateConfig(
+            enabled=config.enabled,
+            method=config.method,
+            downscale_width=config.downscale_width,
+            blur_kernel=config.blur_kernel,
+            pixel_threshold=config.pixel_threshold,
+            changed_fraction=config.changed_fraction,
+            max_skip_frames=config.max_skip_frames,
+            mog2_history=config.mog2_history
+        )
+
+        return motion_gate_config
+
+    def get_tracking_config(self) -> TrackingConfig:
+        tag: str = f"{self.class_name}::get_tracking_config::"
+        config = self.config.tracking
+        logger.info(f"{tag}Tracking configuration obtained from the config file")
+
+        tracking_config: TrackingConfig = TrackingConfig(
+            enabled=config.enabled,
+            detect_interval=config.detect_interval,
+            min_confidence=config.min_confidence,
+            confidence_decay=config.confidence_decay,
+            iou_threshold=config.iou_threshold,
+            max_misses=config.max_misses,
+            violation_classes=list(config.violation_classes),
+            alert_after_s=config.alert_after_s
+        )
+
+        return tracking_config
+
+    def get_tiling_config(self) -> TilingConfig:
+        tag: str = f"{self.class_name}::get_tiling_config::"
+        config = self.config.tiling
+        logger.info(f"{tag}Tiling configuration obtained from the config file")
+
+        tiling_config: TilingConfig = TilingConfig(
+            enabled=config.enabled,
+            min_image_size=config.min_image_size,
+            tile_size=config.tile_size,
+            overlap=config.overlap,
+            include_full_frame=config.include_full_frame,
+            batch_size=config.batch_size,
+            workers=config.workers,
+            merge_thres=config.merge_thres,
+            merge_metric=config.merge_metric,
+            max_det_per_tile=config.max_det_per_tile
+        )
+
+        return tiling_config
+
+    def get_profiling_config(self) -> ProfilingConfig:
+        tag: str = f"{self.class_name}::get_profiling_config::"
+        config = self.config.profiling
+        logger.info(f"{tag}Profiling configuration obtained from the config file")
+
+        profiling_config: ProfilingConfig = ProfilingConfig(
+            sample_rate=config.sample_rate,
+            debug_header=config.debug_header,
+            debug_token=config.debug_token,
+            profiler=config.profiler,
+            dump_dir=config.dump_dir,
+            max_dumps=config.max_dumps,
+            recent_traces=config.recent_traces,
+            traces_endpoint=config.traces_endpoint
+        )
+
+        return profiling_config
+
+    def get_detection_log_config(self) -> DetectionLogConfig:
+        tag: str = f"{self.class_name}::get_detection_log_config::"
+        config = self.config.detection_log
+        logger.info(f"{tag}Detection log configuration obtained from the config file")
+
+        detection_log_config: DetectionLogConfig = DetectionLogConfig(
+            enabled=config.enabled,
+            log_dir=config.log_dir,
+            segment_max_rows=config.segment_max_rows,
+            segment_max_s=config.segment_max_s,
+            batch_size=config.batch_size,
+            flush_interval_s=config.flush_interval_s,
+            max_queue=config.max_queue,
+            max_sources=config.max_sources
+        )
+
+        return detection_log_config
+
+    def get_compliance_config(self) -> ComplianceConfig:
+        tag: str = f"{self.class_name}::get_compliance_config::"
+        config = self.config.compliance
+        logger.info(f"{tag}Compliance configuration obtained from the config file")
+
+        compliance_config: ComplianceConfig = ComplianceConfig(
+            windows_s=list(config.windows_s),
+            bucket_s=config.bucket_s,
+            compliant_classes=list(config.compliant_classes),
+            violation_classes=list(config.violation_classes),
+            alert_window_s=config.alert_window_s,
+            max_violation_rate=config.max_violation_rate,
+            min_samples=config.min_samples,
+            max_sources=config.max_sources,
+            recent_alerts=config.recent_alerts,
+            shared_dir=config.shared_dir,
+            publish_interval_s=config.publish_interval_s
+        )
+
+        return compliance_config
+
+    def get_model_reload_config(self) -> ModelReloadConfig:
+        tag: str = f"{self.class_name}::get_model_reload_config::"
+        config = self.config.model_reload
+        logger.info(f"{tag}Model reload configuration obtained from the config file")
+
+        model_reload_config: ModelReloadConfig = ModelReloadConfig(
+            enabled=config.enabled,
+            source=config.source,
+            poll_interval_s=config.poll_interval_s,
+            s3_bucket_name=config.s3_bucket_name,
+            region_name=config.region_name,
+            s3_key_prefix=config.s3_key_prefix,
+            versions_dir=config.versions_dir,
+            keep_versions=config.keep_versions,
+            keep_previous_warm=config.keep_previous_warm,
+            admin_token=config.admin_token
+        )
+
+        return model_reload_config
+
+    def get_shadow_config(self) -> ShadowConfig:
+        tag: str = f"{self.class_name}::get_shadow_config::"
+        config = self.config.shadow
+        logger.info(f"{tag}Shadow configuration obtained from the config file")
+
+        shadow_config: ShadowConfig = ShadowConfig(
+            enabled=config.enabled,
+            weights_path=config.weights_path,
+            max_rate=config.max_rate,
+            min_rate=config.min_rate,
+            target_cpu_utilization=config.target_cpu_utilization,
+            adapt_interval_s=config.adapt_interval_s,
+            max_pending=config.max_pending,
+            iou_threshold=config.iou_threshold,
+            latency_window=config.latency_window
+        )
+
+        return shadow_config
+
+    def get_admission_config(self) -> AdmissionConfig:
+        tag: str = f"{self.class_name}::get_admission_config::"
+        config = self.config.admission
+        logger.info(f"{tag}Admission configuration obtained from the config file")
+
+        admission_config: AdmissionConfig = AdmissionConfig(
+            enabled=config.enabled,
+            # 0 keeps one request thread free to answer the 429s
+            max_in_flight=config.max_in_flight or max(1, self.config.serving.threads - 1),
+            latency_slo_ms=config.latency_slo_ms,
+            request_start_header=config.request_start_header,
+            degrade_enabled=config.degrade_enabled,
+            degraded_img_size=config.degraded_img_size,
+            # the full input size, the degraded service time is extrapolated from it
+            img_size=self.config.prediction.img_size,
+            # request threads of a process, the in-flight cap has to stay below them
+            threads=self.config.serving.threads,
+            window_s=config.window_s,
+            ewma_alpha=config.ewma_alpha
+        )
+
+        return admission_config
+
+    def get_rendering_config(self) -> RenderingConfig:
+        tag: str = f"{self.class_name}::get_rendering_config::"
+        config = self.config.rendering
+        logger.info(f"{tag}Rendering configuration obtained from the config file")
+
+        rendering_config: RenderingConfig = RenderingConfig(
+            enabled=config.enabled,
+            asynchronous=config.asynchronous,
+            workers=config.workers,
+            max_pending=config.max_pending,
+            jpeg_quality=config.jpeg_quality,
+            max_dimension=config.max_dimension
+        )
+
+        return rendering_config
+
+    def get_serving_config(self) -> ServingConfig:
+        tag: str = f"{self.class_name}::get_serving_config::"
+        config = self.config.serving
+        logger.info(f"{tag}Serving configuration obtained from the config file")
+
+        serving_config: ServingConfig = ServingConfig(
+            bind=config.bind,
+            workers=config.workers,
+            threads=config.threads,
+            torch_threads=config.torch_threads,
+            interop_threads=config.interop_threads,
+            cpu_affinity=config.cpu_affinity,
+            tuning_path=config.tuning_path,
+            timeout=config.timeout,
+            ready_timeout_s=config.ready_timeout_s,
+            metrics_dir=config.metrics_dir,
+            metrics_interval_s=config.metrics_interval_s
+        )
 
+        return serving_config
@@ -2,4 +2,18 @@ from pathlib import Path
 
 # PROJECT CONSTANTS
 CONFIG_FILE_PATH: Path = Path("config/config.yaml")
-PARAMS_FILE_PATH: Path = Path("params.yaml")
\ No newline at end of file
+PARAMS_FILE_PATH: Path = Path("params.yaml")
+
+# MODEL EXPORT CONSTANTS
+# file suffix of the weights for every inference engine, the export and quantization stages write them next to best.pt
+ENGINE_WEIGHTS_SUFFIX: dict = {
+    'torch': '.pt',
+    'torchscript': '.torchscript',
+    'onnxruntime': '.onnx',
+    'onnxruntime-int8': '.int8.onnx'
+}
+# yolov5/export.py --include name for every exported engine
+EXPORT_FORMAT_ENGINE: dict = {
+    'torchscript': 'torchscript',
+    'onnx': 'onnxruntime'
+}
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import List
 
 
 @dataclass
@@ -83,4 +84,230 @@ class ModelPusherConfig:
     region_name: str
     # model
     weights_path: str
-    dataset_yaml_path: str
\ No newline at end of file
+    dataset_yaml_path: str
+
+@dataclass
+class ModelExportConfig:
+    # these are the inputs to the model export pipeline
+    data_root_dir: str
+    weights_path: str
+    dataset_yaml_path: str
+    sample_images_dir: str
+    report_file: str
+    model_root_path: str
+    img_size: int
+    formats: List[str]
+    # checks
+    max_score_diff: float
+    max_box_diff: float
+    sample_images: int
+    benchmark_runs: int
+
+
+@dataclass
+class ModelQuantizationConfig:
+    # these are the inputs to the model quantization pipeline
+    data_root_dir: str
+    onnx_weights_path: str
+    dataset_yaml_path: str
+    calibration_images_dir: str
+    quantized_weights_path: str
+    report_file: str
+    model_root_path: str
+    img_size: int
+    method: str
+    calibration_images: int
+    exclude_node_patterns: List[str]
+    # guardrail
+    evaluation_task: str
+    max_map_drop: float
+
+
+@dataclass
+class PredictionConfig:
+    # these are the inputs to the prediction pipeline
+    # model
+    model_root_path: str
+    weights_path: str
+    dataset_yaml_path: str
+    # outputs
+    output_dir: str
+    results_dir: str
+    save_results: bool
+    persist_uploads: bool
+    uploads_dir: str
+    # inference
+    engine: str
+    device: str
+    img_size: int
+    conf_thres: float
+    iou_thres: float
+    max_det: int
+    max_det_per_class: int
+    channels_last: bool
+
+@dataclass
+class BatchingConfig:
+    # these are the inputs to the micro-batching inference queue
+    enabled: bool
+    max_batch_size: int
+    max_wait_ms: float
+    max_concurrent_requests: int
+
+@dataclass
+class ResultCacheConfig:
+    # these are the inputs to the detection result cache
+    enabled: bool
+    memory_max_entries: int
+    disk_enabled: bool
+    disk_dir: str
+    disk_max_mb: float
+
+@dataclass
+class LiveStreamConfig:
+    # these are the inputs to the live stream (webcam / rtsp) mode
+    latency_budget_ms: float
+    stats_log_interval_s: float
+
+@dataclass
+class MotionGateConfig:
+    # these are the inputs to the motion gate of the video and stream paths
+    enabled: bool
+    method: str
+    downscale_width: int
+    blur_kernel: int
+    pixel_threshold: int
+    changed_fraction: float
+    max_skip_frames: int
+    mog2_history: int
+
+@dataclass
+class TrackingConfig:
+    # these are the inputs to the detect every n frames and track mode
+    enabled: bool
+    detect_interval: int
+    min_confidence: float
+    confidence_decay: float
+    iou_threshold: float
+    max_misses: int
+    violation_classes: List[str]
+    alert_after_s: float
+
+@dataclass
+class TilingConfig:
+    # these are the inputs to the tiled inference mode for high resolution images
+    enabled: bool
+    min_image_size: int
+    tile_size: int
+    overlap: float
+    include_full_frame: bool
+    batch_size: int
+    workers: int
+    merge_thres: float
+    merge_metric: str
+    max_det_per_tile: int
+
+@dataclass
+class ProfilingConfig:
+    # these are the inputs to the per-request profiling hook
+    sample_rate: float
+    debug_header: str
+    debug_token: str
+    profiler: str
+    dump_dir: str
+    max_dumps: int
+    recent_traces: int
+    traces_endpoint: bool
+
+@dataclass
+class DetectionLogConfig:
+    # these are the inputs to the append-only detection log
+    enabled: bool
+    log_dir: str
+    segment_max_rows: int
+    segment_max_s: float
+    batch_size: int
+    flush_interval_s: float
+    max_queue: int
+    max_sources: int
+
+@dataclass
+class ComplianceConfig:
+    # these are the inputs to the rolling per-source compliance aggregator
+    windows_s: List[float]
+    bucket_s: float
+    compliant_classes: List[str]
+    violation_classes: List[str]
+    alert_window_s: float
+    max_violation_rate: float
+    min_samples: int
+    max_sources: int
+    recent_alerts: int
+    shared_dir: str
+    publish_interval_s: float
+
+@dataclass
+class ModelReloadConfig:
+    # these are the inputs to the hot reload of the served weights
+    enabled: bool
+    source: str
+    poll_interval_s: float
+    s3_bucket_name: str
+    region_name: str
+    s3_key_prefix: str
+    versions_dir: str
+    keep_versions: int
+    keep_previous_warm: bool
+    admin_token: str
+
+@dataclass
+class ShadowConfig:
+    # these are the inputs to the shadow evaluation of a candidate model
+    enabled: bool
+    weights_path: str
+    max_rate: float
+    min_rate: float
+    target_cpu_utilization: float
+    adapt_interval_s: float
+    max_pending: int
+    iou_threshold: float
+    latency_window: int
+
+@dataclass
+class AdmissionConfig:
+    # these are the inputs to the admission control of the detection endpoints
+    enabled: bool
+    max_in_flight: int
+    latency_slo_ms: float
+    request_start_header: str
+    degrade_enabled: bool
+    degraded_img_size: int
+    img_size: int
+    threads: int
+    window_s: float
+    ewma_alpha: float
+
+@dataclass
+class RenderingConfig:
+    # these are the inputs to the annotated image renderer
+    enabled: bool
+    asynchronous: bool
+    workers: int
+    max_pending: int
+    jpeg_quality: int
+    max_dimension: int
+
+@dataclass
+class ServingConfig:
+    # these are the inputs to the pre-fork production server
+    bind: str
+    workers: int
+    threads: int
+    torch_threads: int
+    interop_threads: int
+    cpu_affinity: bool
+    tuning_path: str
+    timeout: int
+    ready_timeout_s: float
+    metrics_dir: str
+    metrics_interval_s: float
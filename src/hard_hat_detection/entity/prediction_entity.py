@@ -0,0 +1,43 @@
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class Detection:
+    # a single box returned by the detector, in original image pixel coordinates
+    class_id: int
+    class_name: str
+    confidence: float
+    xyxy: List[float]
+    # identity of the object across the frames of a video, set in the tracking mode only
+    track_id: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class PredictionResult:
+    # the output of the prediction pipeline for one image or frame
+    source: str
+    image_shape: Tuple[int, int]
+    detections: List[Detection] = field(default_factory=list)
+    output_path: Optional[str] = None
+    # position of the frame when the source is a video or a stream
+    frame_index: Optional[int] = None
+    # True when the detections of an earlier frame (static frame) or of the same image (result cache)
+    # were reused, the model did not run
+    detections_reused: bool = False
+    # alerts raised on this frame by the tracker, e.g. a head without a helmet for too long
+    alerts: List[dict] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            'source': self.source,
+            'image_shape': list(self.image_shape),
+            'detections': [detection.to_dict() for detection in self.detections],
+            'output_path': self.output_path,
+            'frame_index': self.frame_index,
+            'detections_reused': self.detections_reused,
+            'alerts': self.alerts
+        }
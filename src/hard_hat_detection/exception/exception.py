@@ -12,9 +12,10 @@ class CustomException(Exception):
         self.file_name = exc_tb.tb_frame.f_code.co_filename
 
     def __str__(self):
-         message = "Error occurred in python script name [{0}] line number [{1}] error message [{2}]".format(
+        message = "Error occurred in python script name [{0}] line number [{1}] error message [{2}]".format(
             self.file_name, self.lineno, str(self.error_message))
         logger.error(message)
+        return message
 
 if __name__ == '__main__':
     try:
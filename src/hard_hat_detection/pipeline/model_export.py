@@ -0,0 +1,31 @@
+import sys
+
+from src.hard_hat_detection.components.model_export import ModelExport
+from src.hard_hat_detection.config.configuration import ConfigurationManager
+from src.hard_hat_detection.exception.exception import CustomException
+from src.hard_hat_detection.logger.logger_config import logger
+
+STAGE_NAME: str = "Model Export Pipeline"
+class ModelExportTrainingPipeline:
+    def __init__(self):
+        self.class_name = self.__class__.__name__
+        self.stage_name = STAGE_NAME
+
+    def model_export(self) -> None:
+        tag: str = f"{self.class_name}::model_export::"
+        try:
+            config = ConfigurationManager()
+            logger.info(f"{tag}::Configuration Manager object created")
+
+            model_export_config = config.get_model_export_config()
+            logger.info(f"{tag}::Model export configuration obtained")
+
+            model_export = ModelExport(config=model_export_config)
+            logger.info(f"{tag}::Model export object created")
+
+            logger.info(f"{tag}::Running the model export pipeline")
+            model_export.export()
+            logger.info(f"{tag}::Model export pipeline completed")
+        except Exception as e:
+            logger.error(f"{tag}::Error running the model export pipeline: {e}")
+            raise CustomException(e, sys)
@@ -0,0 +1,31 @@
+import sys
+
+from src.hard_hat_detection.components.model_quantization import ModelQuantization
+from src.hard_hat_detection.config.configuration import ConfigurationManager
+from src.hard_hat_detection.exception.exception import CustomException
+from src.hard_hat_detection.logger.logger_config import logger
+
+STAGE_NAME: str = "Model Quantization Pipeline"
+class ModelQuantizationTrainingPipeline:
+    def __init__(self):
+        self.class_name = self.__class__.__name__
+        self.stage_name = STAGE_NAME
+
+    def model_quantization(self) -> None:
+        tag: str = f"{self.class_name}::model_quantization::"
+        try:
+            config = ConfigurationManager()
+            logger.info(f"{tag}::Configuration Manager object created")
+
+            model_quantization_config = config.get_model_quantization_config()
+            logger.info(f"{tag}::Model quantization configuration obtained")
+
+            model_quantization = ModelQuantization(config=model_quantization_config)
+            logger.info(f"{tag}::Model quantization object created")
+
+            logger.info(f"{tag}::Running the model quantization pipeline")
+            model_quantization.run()
+            logger.info(f"{tag}::Model quantization pipeline completed")
+        except Exception as e:
+            logger.error(f"{tag}::Error running the model quantization pipeline: {e}")
+            raise CustomException(e, sys)
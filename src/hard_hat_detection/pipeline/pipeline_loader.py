@@ -0,0 +1,105 @@
+import threading
+import time
+from typing import Optional
+
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.metrics import MODEL_LOAD_SECONDS, QUEUE_DEPTH, RENDER_QUEUE_DEPTH
+
+# the process is considered up when this module is imported
+PROCESS_STARTED_AT = time.time()
+
+
+class ModelNotReadyError(Exception):
+    # raised when a request arrives before the model finished loading
+    pass
+
+
+class PipelineLoader:
+    """
+    Creates the PredictionPipeline on first use, in the background, or up front.
+
+    Importing torch, cv2 and yolov5, loading the weights and the warmup pass make up almost all
+    of the start up time, so the web server can accept connections (process up) before the model
+    is warm (ready). The heavy modules are only imported by load().
+    """
+    COLD, LOADING, READY, FAILED = 'cold', 'loading', 'ready', 'failed'
+
+    def __init__(self):
+        self.class_name = self.__class__.__name__
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.state = self.COLD
+        self.pipeline = None
+        self.error: Optional[str] = None
+        self.import_seconds: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.thread = None
+
+    def start(self):
+        # warm the model on a background thread, requests wait for it in get()
+        if self.state != self.COLD or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.load, name=self.class_name, daemon=True)
+        self.thread.start()
+
+    def load(self):
+        tag: str = f"{self.class_name}::load::"
+        with self.lock:
+            if self.pipeline is not None:
+                return self.pipeline
+            self.state = self.LOADING
+            try:
+                started_at = time.perf_counter()
+                from src.hard_hat_detection.pipeline.prediction import PredictionPipeline
+                self.import_seconds = time.perf_counter() - started_at
+                self.pipeline = PredictionPipeline()
+                # the shadow candidate is loaded here too, under gunicorn once in the master
+                if self.pipeline.shadow is not None:
+                    self.pipeline.shadow.load_candidate()
+                self.load_seconds = time.perf_counter() - started_at
+            except Exception as e:
+                self.state = self.FAILED
+                self.error = str(e)
+                logger.error(f"{tag}::Error loading the prediction pipeline: {e}")
+                raise
+            self.state = self.READY
+            self.ready_at = time.time()
+            MODEL_LOAD_SECONDS.set(self.load_seconds)
+            if self.pipeline.batcher is not None:
+                QUEUE_DEPTH.set_function(self.pipeline.batcher.queue_depth)
+            RENDER_QUEUE_DEPTH.set_function(self.pipeline.renderer.queue_depth)
+            self.ready.set()
+            logger.info(f"{tag}::Model ready in {self.load_seconds:.2f}s "
+                        f"({self.import_seconds:.2f}s importing), "
+                        f"{self.ready_at - PROCESS_STARTED_AT:.2f}s after the process started")
+            return self.pipeline
+
+    def get(self, timeout: Optional[float] = None):
+        """
+        Return the loaded PredictionPipeline
+
+        :param timeout: Seconds to wait when the model is loading in the background
+        :return: PredictionPipeline
+        """
+        if self.pipeline is not None:
+            return self.pipeline
+        if self.thread is None and self.state == self.COLD:
+            # nothing started the load yet, load on first use
+            return self.load()
+        if self.state == self.FAILED or not self.ready.wait(timeout):
+            raise ModelNotReadyError(f"Model is {self.state}")
+        return self.pipeline
+
+    def is_ready(self) -> bool:
+        return self.state == self.READY
+
+    def get_status(self) -> dict:
+        return {
+            'state': self.state,
+            'uptime_s': round(time.time() - PROCESS_STARTED_AT, 3),
+            'import_s': round(self.import_seconds, 3) if self.import_seconds is not None else None,
+            'load_s': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            'ready_after_s': round(self.ready_at - PROCESS_STARTED_AT, 3) if self.ready_at is not None else None,
+            'error': self.error
+        }
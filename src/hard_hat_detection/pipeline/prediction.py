@@ -1,26 +1,106 @@
 import os
-import subprocess
+import sys
+import time
+from dataclasses import replace
 from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+from src.hard_hat_detection.components.annotated_renderer import AnnotatedImageRenderer
+from src.hard_hat_detection.components.batch_inference import MicroBatcher
+from src.hard_hat_detection.components.compliance import ComplianceAggregator
+from src.hard_hat_detection.components.detection_log import DetectionLog
+from src.hard_hat_detection.components.detector import Detector
+from src.hard_hat_detection.components.live_stream import LatestFrameGrabber, LiveStreamStats
+from src.hard_hat_detection.components.model_reloader import ModelReloader
+from src.hard_hat_detection.components.motion_gate import MotionGate
+from src.hard_hat_detection.components.result_cache import ResultCache
+from src.hard_hat_detection.components.shadow_evaluator import ShadowEvaluator
+from src.hard_hat_detection.components.tiled_inference import TiledDetector
+from src.hard_hat_detection.components.tracker import IouTracker
+from src.hard_hat_detection.config.configuration import ConfigurationManager
+from src.hard_hat_detection.entity.config_entity import PredictionConfig, BatchingConfig, ResultCacheConfig, \
+    LiveStreamConfig, TilingConfig, MotionGateConfig, TrackingConfig, RenderingConfig, DetectionLogConfig, \
+    ComplianceConfig, ModelReloadConfig, ShadowConfig
+from src.hard_hat_detection.entity.prediction_entity import Detection, PredictionResult
+from src.hard_hat_detection.exception.exception import CustomException
+from src.hard_hat_detection.logger.logger_config import logger
+from src.hard_hat_detection.utils.annotation import draw_detections
+from src.hard_hat_detection.utils.image_io import decode_image, content_hash, save_content_addressed
+from src.hard_hat_detection.utils.metrics import stage_timer
+from src.hard_hat_detection.utils.profiling import current_trace
+from src.hard_hat_detection.utils.topology import read_tuning
 
 
 class PredictionPipeline:
-    def __init__(self,
-                 weights=os.path.join(Path(__file__).parent.parent.parent.parent,
-                                      Path('artifacts/model_trainer/results/weights/best.pt')),
-                 source=os.path.join(Path(__file__).parent.parent.parent.parent,
-                                      Path('detections/predict.jpg')),
-                 detect_file= os.path.join(Path(__file__).parent.parent.parent.parent,
-                                      Path('yolov5/detect.py')),
-                 data_file=os.path.join(Path(__file__).parent.parent.parent.parent,
-                                      Path('artifacts/model_trainer/dataset.yaml')),
-                 output_folder=os.path.join(Path(__file__).parent.parent.parent.parent,
-                                      Path('detections'))):
-        self.weights = weights
-        self.source = source
-        self.detect_file = detect_file
-        self.data_file = data_file
-        self.output_folder = output_folder
+    """
+    Prediction pipeline backed by a resident, in-process model.
+
+    The model is loaded once when the pipeline is created, so the same object should be
+    reused for every image, video or webcam detection in the process.
+    """
+    def __init__(self, config: Optional[PredictionConfig] = None,
+                 config_manager: Optional[ConfigurationManager] = None):
+        self.class_name = self.__class__.__name__
+        config_manager = config_manager if config_manager else ConfigurationManager()
+        self.config: PredictionConfig = config if config else config_manager.get_prediction_config()
+        self.batching_config: BatchingConfig = config_manager.get_batching_config()
+        # the batch size measured best on this machine by research/tune_topology.py
+        tuning = read_tuning(config_manager.get_serving_config().tuning_path, self.config.engine, self.config.img_size)
+        if tuning and tuning.get('max_batch_size'):
+            # capped like the configured one, a batch never holds more requests than run at once
+            self.batching_config = replace(self.batching_config, max_batch_size=min(
+                tuning['max_batch_size'], self.batching_config.max_concurrent_requests))
+        self.result_cache_config: ResultCacheConfig = config_manager.get_result_cache_config()
+        self.live_stream_config: LiveStreamConfig = config_manager.get_live_stream_config()
+        self.tiling_config: TilingConfig = config_manager.get_tiling_config()
+        self.motion_gate_config: MotionGateConfig = config_manager.get_motion_gate_config()
+        self.tracking_config: TrackingConfig = config_manager.get_tracking_config()
+        self.rendering_config: RenderingConfig = config_manager.get_rendering_config()
+        self.detection_log_config: DetectionLogConfig = config_manager.get_detection_log_config()
+        self.compliance_config: ComplianceConfig = config_manager.get_compliance_config()
+        self.model_reload_config: ModelReloadConfig = config_manager.get_model_reload_config()
+        self.shadow_config: ShadowConfig = config_manager.get_shadow_config()
+        self.detector = Detector(config=self.config)
+        self.batcher = MicroBatcher(self.run_detector, self.batching_config) \
+            if self.batching_config.enabled else None
+        self.tiled_detector = TiledDetector(self.detector, self.tiling_config)
+        self.result_cache = ResultCache(self.result_cache_config) if self.result_cache_config.enabled else None
+        self.detection_log = DetectionLog(self.detection_log_config) if self.detection_log_config.enabled else None
+        self.compliance = ComplianceAggregator(self.compliance_config)
+        self.live_streams = {}
+        self.motion_gates = {}
+        self.trackers = {}
+        self.weights = self.detector.resolve_path(self.config.weights_path)
+        self.output_folder = self.detector.resolve_path(self.config.output_dir)
+        self.results_folder = self.detector.resolve_path(self.config.results_dir)
+        self.uploads_folder = self.detector.resolve_path(self.config.uploads_dir)
+        self.source = os.path.join(self.output_folder, 'predict.jpg')
         self.setup_output_folder()
+        self.renderer = AnnotatedImageRenderer(self.rendering_config, self.results_folder)
+        self.detector.load()
+        self.model_reloader = ModelReloader(self, self.model_reload_config)
+        self.shadow = ShadowEvaluator(self, self.shadow_config) if self.shadow_config.enabled else None
+
+    def run_detector(self, images: List[np.ndarray], img_size: Optional[int] = None) -> List[List[Detection]]:
+        # looks the detector up on every batch, so a hot reloaded model is picked up by the next batch
+        return self.detector.predict(images, img_size)
+
+    def swap_detector(self, detector: Detector) -> Detector:
+        """
+        Serve a loaded and warmed detector from the next request on, the requests already
+        running finish on the detector they started with
+
+        :param detector: Loaded Detector
+        :return: The detector served until now
+        """
+        previous = self.detector
+        self.tiled_detector.detector = detector
+        self.detector = detector
+        self.weights = detector.get_engine_weights_path()
+        return previous
 
     def get_weights(self):
         return self.weights
@@ -28,78 +108,400 @@ class PredictionPipeline:
     def get_source(self):
         return self.source
 
-    def get_detect_file(self):
-        return self.detect_file
-
     def setup_output_folder(self):
-        if not os.path.exists(self.output_folder):
-            os.makedirs(self.output_folder)
-
-    def run_detection(self):
-        if not self.weights:
-            raise ValueError('Weights not provided')
-
-        if not self.detect_file:
-            raise ValueError('Detect file not provided')
-
-        command = [
-            'python', self.detect_file,
-            '--weights', self.weights,
-            '--source', self.source,
-            '--data', self.data_file,
-            '--conf', '0.4',
-            '--project', self.output_folder,
-            '--name', 'results',
-            '--exist-ok'
-        ]
-        subprocess.run(command, check=True)
-        return self.output_folder
-
-    def detect_image(self, image_path=None):
-        if image_path:
-            self.source = image_path
-
-        if not self.source:
+        for folder in (self.output_folder, self.results_folder):
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+
+    def use_tiling(self, image: np.ndarray, tiled: Optional[bool] = None) -> bool:
+        # tiling applies to large images only, unless it is explicitly requested
+        if tiled is None:
+            return self.tiling_config.enabled and self.tiled_detector.should_tile(image)
+        return tiled
+
+    def get_fingerprint(self) -> str:
+        return self.tiled_detector.fingerprint() if self.tiling_config.enabled else self.detector.fingerprint()
+
+    def predict(self, image: np.ndarray, source: str = 'image', batched: bool = True,
+                tiled: Optional[bool] = None, img_size: Optional[int] = None) -> PredictionResult:
+        # single images from concurrent requests share a forward pass through the batcher,
+        # sequential frames from one capture gain nothing from waiting and run directly,
+        # profiled requests also run directly so the profiler sees the forward pass,
+        # a smaller img_size (degraded request) does not apply to tiled images
+        if self.use_tiling(image, tiled):
+            detections = self.tiled_detector.predict(image)
+        elif batched and self.batcher is not None and current_trace() is None:
+            detections = self.batcher.submit(image, img_size).result()
+        else:
+            detections = self.detector.predict([image], img_size)[0]
+        return PredictionResult(source=source, image_shape=image.shape[:2], detections=detections)
+
+    def should_render(self, save: Optional[bool] = None) -> bool:
+        return (self.config.save_results if save is None else save) and self.rendering_config.enabled
+
+    def save_result(self, image: np.ndarray, result: PredictionResult) -> str:
+        # the annotated jpeg is written in the background, output_path is where it will appear
+        result.output_path = self.renderer.submit(image, result.detections, result.source)
+        return result.output_path
+
+    def record_result(self, source: str, result: PredictionResult):
+        # queued for the background writer of the detection log, never blocks, and counted
+        # in the rolling compliance windows of the source
+        if self.detection_log is not None:
+            self.detection_log.append(source, result.detections, frame_index=result.frame_index)
+        self.compliance.record(source, result.detections)
+
+    def get_stats(self) -> dict:
+        return {
+            'batching': self.batcher.get_stats() if self.batcher is not None else None,
+            'result_cache': self.result_cache.get_stats() if self.result_cache is not None else None,
+            'live_streams': {source: stats.as_dict() for source, stats in list(self.live_streams.items())},
+            'motion_gates': {source: gate.as_dict() for source, gate in list(self.motion_gates.items())},
+            'trackers': {source: tracker.as_dict() for source, tracker in list(self.trackers.items())},
+            'rendering': self.renderer.get_stats(),
+            'detection_log': self.detection_log.get_stats() if self.detection_log is not None else None,
+            'compliance': self.compliance.get_stats(),
+            'model_reload': self.model_reloader.get_status(),
+            'shadow': self.shadow.get_stats() if self.shadow is not None else None
+        }
+
+    def create_motion_gate(self, source: str, motion_gate: Optional[bool] = None) -> Optional[MotionGate]:
+        if not (self.motion_gate_config.enabled if motion_gate is None else motion_gate):
+            return None
+        gate = MotionGate(self.motion_gate_config, source)
+        self.motion_gates[source] = gate
+        return gate
+
+    def create_tracker(self, source: str, tracking: Optional[bool] = None) -> Optional[IouTracker]:
+        if not (self.tracking_config.enabled if tracking is None else tracking):
+            return None
+        tracker = IouTracker(self.tracking_config, source)
+        self.trackers[source] = tracker
+        return tracker
+
+    def predict_frame(self, frame: np.ndarray, source: str, gate: Optional[MotionGate],
+                      previous: Optional[PredictionResult], tracker: Optional[IouTracker] = None,
+                      timestamp: float = 0.0, frame_index: Optional[int] = None) -> PredictionResult:
+        # static frames reuse the detections of the last frame the detector ran on, in the
+        # tracking mode the frames between two detector runs are filled in by the tracker
+        static = gate is not None and not gate.should_detect(frame) and previous is not None
+        if tracker is not None and (static or not tracker.needs_detection()):
+            result = PredictionResult(source=source, image_shape=frame.shape[:2],
+                                      detections=tracker.predict(), detections_reused=True)
+        elif static:
+            return PredictionResult(source=source, image_shape=frame.shape[:2],
+                                    detections=list(previous.detections), detections_reused=True)
+        else:
+            started_at = time.perf_counter()
+            result = self.predict(frame, source=source, batched=False)
+            if gate is not None:
+                gate.record_detection(time.perf_counter() - started_at)
+            if tracker is not None:
+                result.detections = tracker.update(result.detections, timestamp)
+        if tracker is not None:
+            result.alerts = tracker.check_alerts(timestamp, frame_index)
+        return result
+
+    def detect(self, image: np.ndarray, source: str = 'image', save: Optional[bool] = None,
+               tiled: Optional[bool] = None, img_size: Optional[int] = None) -> PredictionResult:
+        """
+        Detect objects in an image that is already in memory
+
+        :param image: BGR image
+        :param source: Name of the image, used for the annotated output file
+        :param save: Write the annotated image to the results folder, defaults to save_results in the config
+        :param tiled: Force tiled (True) or full frame (False) inference, by default large images are
+                      tiled when tiling is enabled in the config
+        :param img_size: Smaller input size for a faster pass, defaults to img_size in the config
+        :return: PredictionResult with the detections
+        """
+        result = self.predict(image, source=source, tiled=tiled, img_size=img_size)
+        if self.should_render(save):
+            self.save_result(image, result)
+        return result
+
+    @staticmethod
+    def decode(data: bytes) -> np.ndarray:
+        with stage_timer('decode'):
+            return decode_image(data)
+
+    def detect_encoded(self, data: bytes, source: str, digest: Optional[str] = None,
+                       save: Optional[bool] = None, img_size: Optional[int] = None) -> PredictionResult:
+        """
+        Detect objects in an encoded image, reusing the cached result when the same image
+        was already seen by the same model with the same inference parameters
+
+        :param data: Encoded image bytes
+        :param source: Name of the image, used for the annotated output file
+        :param digest: Content hash of the data when it is already known
+        :param save: Write the annotated image to the results folder, defaults to save_results in the config
+        :param img_size: Smaller input size for a faster pass, a cached full size result is still used
+        :return: PredictionResult with the detections
+        """
+        save = self.should_render(save)
+        if self.result_cache is None:
+            return self.detect(self.decode(data), source=source, save=save, img_size=img_size)
+
+        digest = digest or content_hash(data)
+        fingerprint = self.get_fingerprint()
+        cached = self.result_cache.get(digest, fingerprint)
+        if cached is not None:
+            image_shape, detections = cached
+            result = PredictionResult(source=source, image_shape=image_shape, detections=list(detections),
+                                      detections_reused=True)
+            if save:
+                self.save_result(self.decode(data), result)
+            return result
+
+        image = self.decode(data)
+        result = self.detect(image, source=source, save=save, img_size=img_size)
+        # the cache holds full size results only, a degraded result is not stored
+        if img_size is None:
+            self.result_cache.put(digest, fingerprint, result.image_shape, result.detections)
+        return result
+
+    def detect_upload(self, data: bytes, filename: str, save: Optional[bool] = None,
+                      img_size: Optional[int] = None, source: Optional[str] = None) -> PredictionResult:
+        """
+        Detect objects in an uploaded image without writing the upload to disk
+
+        :param data: Encoded image bytes from the request
+        :param filename: Name of the uploaded file, only its extension is used
+        :param save: Write the annotated image to the results folder, defaults to save_results in the config
+        :param img_size: Smaller input size for a faster pass, set by the admission control under load
+        :param source: Camera or site the upload came from, for the detection log and the compliance windows,
+                       defaults to 'upload'
+        :return: PredictionResult, its source is the content hash of the upload
+        """
+        tag: str = f"{self.class_name}::detect_upload::"
+        digest = content_hash(data)
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'jpg'
+        if self.config.persist_uploads:
+            with stage_timer('save'):
+                upload_path = save_content_addressed(data, self.uploads_folder, extension, digest=digest)
+            logger.info(f"{tag}::Upload persisted at: {upload_path}")
+        result = self.detect_encoded(data, source=f"{digest}.{extension}", digest=digest, save=save,
+                                     img_size=img_size)
+        self.record_result(source or 'upload', result)
+        # a sample of the uploads is run again through the candidate model, on its own thread
+        if self.shadow is not None and self.shadow.should_sample():
+            self.shadow.submit(data)
+        logger.info(f"{tag}::{len(result.detections)} objects detected in {filename}")
+        return result
+
+    def detect_image(self, image_path=None) -> PredictionResult:
+        tag: str = f"{self.class_name}::detect_image::"
+        # the pipeline is shared between requests, so the source is kept local instead of on self
+        source = str(image_path or self.source or '')
+        if not source:
             raise ValueError('Image path not provided')
-        return self.run_detection()
 
-    def detect_video(self, video_path=None):
-        if video_path:
-            self.source = video_path
+        if not os.path.exists(source):
+            raise ValueError(f'Image could not be read from: {source}')
+        with open(source, 'rb') as file:
+            data = file.read()
+
+        result = self.detect_encoded(data, source=source)
+        self.record_result(source, result)
+        logger.info(f"{tag}::{len(result.detections)} objects detected in {source}")
+        return result
+
+    def stream_capture(self, capture: cv2.VideoCapture, source: str, save: Optional[bool] = None,
+                       max_frames: Optional[int] = None, motion_gate: Optional[bool] = None,
+                       tracking: Optional[bool] = None) -> Iterator[PredictionResult]:
+        """
+        Decode the frames of a capture lazily and yield the detections of each frame as soon
+        as they are produced. Only the current frame is held in memory, the annotated video is
+        written frame by frame when save is set.
+
+        :param capture: Opened cv2.VideoCapture, released when the generator finishes or is closed
+        :param source: Name of the capture, used for the annotated output file
+        :param save: Write the annotated video to the results folder, defaults to save_results in the config
+        :param max_frames: Stop after this many frames
+        :param motion_gate: Reuse the previous detections on static frames, defaults to the motion_gate config
+        :param tracking: Run the detector every few frames and track in between, defaults to the tracking config
+        :return: Generator of PredictionResult, one per frame
+        """
+        tag: str = f"{self.class_name}::stream_capture::"
+        if not capture.isOpened():
+            capture.release()
+            raise ValueError(f'Video source could not be opened: {source}')
 
-        if not self.source:
+        save = self.config.save_results if save is None else save
+        output_path = os.path.join(self.results_folder, f"{Path(source).stem or 'webcam'}.mp4") if save else None
+        writer = None
+        frame_count = 0
+        gate = self.create_motion_gate(source, motion_gate)
+        tracker = self.create_tracker(source, tracking)
+        # the tracker times are in video time, so alerts do not depend on the processing speed
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30
+        result = None
+        try:
+            while max_frames is None or frame_count < max_frames:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                result = self.predict_frame(frame, f"{source}:{frame_count}", gate, result,
+                                            tracker=tracker, timestamp=frame_count / fps, frame_index=frame_count)
+                result.frame_index = frame_count
+                self.record_result(source, result)
+                if save:
+                    if writer is None:
+                        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps,
+                                                 (frame.shape[1], frame.shape[0]))
+                        logger.info(f"{tag}::Writing the detected video to: {output_path}")
+                    writer.write(draw_detections(frame, result.detections))
+                    result.output_path = output_path
+                frame_count += 1
+                yield result
+        finally:
+            capture.release()
+            if writer is not None:
+                writer.release()
+            logger.info(f"{tag}::{frame_count} frames processed from {source}")
+            if gate is not None:
+                logger.info(f"{tag}::Motion gate: {gate.as_dict()}")
+            if tracker is not None:
+                logger.info(f"{tag}::Tracker: {tracker.as_dict()}")
+
+    def stream_video(self, video_path=None, save: Optional[bool] = None, max_frames: Optional[int] = None,
+                     motion_gate: Optional[bool] = None, tracking: Optional[bool] = None) -> Iterator[PredictionResult]:
+        source = str(video_path or self.source or '')
+        if not source:
             raise ValueError('Video path not provided')
-        self.run_detection()
+        return self.stream_capture(cv2.VideoCapture(source), source, save=save, max_frames=max_frames,
+                                   motion_gate=motion_gate, tracking=tracking)
+
+    def detect_video(self, video_path=None,
+                     on_result: Optional[Callable[[PredictionResult], None]] = None,
+                     save: Optional[bool] = None, tracking: Optional[bool] = None) -> int:
+        """
+        Run detection over a whole video, memory stays constant regardless of its length
+
+        :param video_path: Path to the video
+        :param on_result: Called with the PredictionResult of every frame
+        :param save: Write the annotated video to the results folder, defaults to save_results in the config
+        :param tracking: Run the detector every few frames and track in between, defaults to the tracking config
+        :return: Number of frames processed
+        """
+        frame_count = 0
+        for result in self.stream_video(video_path, save=save, tracking=tracking):
+            if on_result:
+                on_result(result)
+            frame_count += 1
+        return frame_count
+
+    def stream_live(self, source=0, latency_budget_ms: Optional[float] = None, save: Optional[bool] = None,
+                    max_frames: Optional[int] = None, motion_gate: Optional[bool] = None,
+                    tracking: Optional[bool] = None) -> Iterator[PredictionResult]:
+        """
+        Latency bounded detection for live sources (webcam index or rtsp url).
+
+        A background thread keeps only the newest frame, so a slow model skips frames instead
+        of falling further behind real time. Frames older than the latency budget when they are
+        picked up are dropped as stale. Processed fps, dropped frames and end-to-end lag are
+        kept per stream in live_streams and returned by get_stats.
+
+        :param source: Camera index or stream url
+        :param latency_budget_ms: Maximum age of a frame to still be processed, defaults to the config
+        :param save: Write the annotated frames to the results folder, defaults to save_results in the config
+        :param max_frames: Stop after this many processed frames
+        :param motion_gate: Reuse the previous detections on static frames, defaults to the motion_gate config
+        :param tracking: Run the detector every few frames and track in between, defaults to the tracking config
+        :return: Generator of PredictionResult, one per processed frame
+        """
+        tag: str = f"{self.class_name}::stream_live::"
+        budget_s = (latency_budget_ms if latency_budget_ms is not None
+                    else self.live_stream_config.latency_budget_ms) / 1000
+        source = int(source) if str(source).isdigit() else str(source)
+        name = f"webcam{source}" if isinstance(source, int) else str(source)
+        save = self.config.save_results if save is None else save
+
+        grabber = LatestFrameGrabber(cv2.VideoCapture(source), name)
+        stats = LiveStreamStats(name)
+        self.live_streams[name] = stats
+        writer = None
+        last_sequence = 0
+        last_logged = time.perf_counter()
+        gate = self.create_motion_gate(name, motion_gate)
+        tracker = self.create_tracker(name, tracking)
+        result = None
+        grabber.start()
+        try:
+            while max_frames is None or stats.processed_frames < max_frames:
+                frame, sequence, captured_at = grabber.read_latest(last_sequence)
+                if frame is None:
+                    if not grabber.is_running():
+                        break
+                    continue
+                stats.record_dropped(sequence - last_sequence - 1)
+                last_sequence = sequence
+                if time.perf_counter() - captured_at > budget_s:
+                    stats.record_dropped(stale=True)
+                    continue
+
+                result = self.predict_frame(frame, f"{name}:{sequence}", gate, result,
+                                            tracker=tracker, timestamp=captured_at, frame_index=sequence)
+                result.frame_index = sequence
+                self.record_result(name, result)
+                if save:
+                    if writer is None:
+                        output_path = os.path.join(self.results_folder, f"{Path(name).stem or 'stream'}.mp4")
+                        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'),
+                                                 grabber.capture.get(cv2.CAP_PROP_FPS) or 30,
+                                                 (frame.shape[1], frame.shape[0]))
+                        logger.info(f"{tag}::Writing the detected stream to: {output_path}")
+                    writer.write(draw_detections(frame, result.detections))
+                    result.output_path = output_path
+                stats.record_processed(time.perf_counter() - captured_at)
+
+                if time.perf_counter() - last_logged > self.live_stream_config.stats_log_interval_s:
+                    logger.info(f"{tag}::{stats.as_dict()}")
+                    if gate is not None:
+                        logger.info(f"{tag}::Motion gate: {gate.as_dict()}")
+                    if tracker is not None:
+                        logger.info(f"{tag}::Tracker: {tracker.as_dict()}")
+                    last_logged = time.perf_counter()
+                yield result
+        finally:
+            grabber.stop()
+            if writer is not None:
+                writer.release()
+            logger.info(f"{tag}::Stream {name} stopped: {stats.as_dict()}")
+            if gate is not None:
+                logger.info(f"{tag}::Motion gate: {gate.as_dict()}")
+            if tracker is not None:
+                logger.info(f"{tag}::Tracker: {tracker.as_dict()}")
 
     # detect webcam
-    def detect_webcam(self):
-        self.source = "0"
-        self.run_detection()
+    def detect_webcam(self, camera_index: int = 0,
+                      on_result: Optional[Callable[[PredictionResult], None]] = None,
+                      max_frames: Optional[int] = None, tracking: Optional[bool] = None) -> int:
+        frame_count = 0
+        for result in self.stream_live(camera_index, max_frames=max_frames, tracking=tracking):
+            if on_result:
+                on_result(result)
+            frame_count += 1
+        return frame_count
 
 
 # Example usage:
 if __name__ == "__main__":
-    detector = PredictionPipeline()
-    weights_path = detector.get_weights()
-    if not os.path.exists(weights_path):
-        raise FileNotFoundError(f'Weights not found at: {weights_path}')
-    else:
-        print(f'Weights found at: {weights_path}')
-
-    # Image detection
-    input_source = detector.get_source()
-    if not os.path.exists(input_source):
-        raise FileNotFoundError(f'Image not found at: {input_source}')
-    else:
-        print(f'Image found at: {input_source}')
-
-    input_detection_file = detector.get_detect_file()
-    if not os.path.exists(input_detection_file):
-        raise FileNotFoundError(f'Detect file not found at: {input_detection_file}')
-    else:
-        print(f'Detect file found at: {input_detection_file}')
-    detector.detect_image(input_source)
-
-    # webcam detection
-    # detector.detect_webcam()
+    try:
+        detector = PredictionPipeline()
+        logger.info(f'Weights loaded from: {detector.get_weights()}')
+
+        # Image detection
+        input_source = detector.get_source()
+        if not os.path.exists(input_source):
+            raise FileNotFoundError(f'Image not found at: {input_source}')
+        else:
+            logger.info(f'Image found at: {input_source}')
+        prediction = detector.detect_image(input_source)
+        logger.info(f'Detections: {[detection.to_dict() for detection in prediction.detections]}')
 
+        # webcam detection
+        # detector.detect_webcam()
+    except Exception as ex:
+        logger.error(f"Error running the prediction pipeline: {ex}")
+        raise CustomException(ex, sys)
@@ -0,0 +1,33 @@
+from typing import List
+
+import cv2
+import numpy as np
+
+from src.hard_hat_detection.entity.prediction_entity import Detection
+
+# BGR colours, one per class id (wraps around for more classes)
+COLOURS = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207), (10, 249, 72)]
+
+
+def draw_detections(image: np.ndarray, detections: List[Detection], line_width: int = 2) -> np.ndarray:
+    """
+    Draw the detection boxes and labels on a copy of the image
+
+    :param image: BGR image the detections were produced for
+    :param detections: List of detections in image pixel coordinates
+    :param line_width: Width of the box lines
+    :return: Annotated copy of the image
+    """
+    annotated = image.copy()
+    for detection in detections:
+        colour = COLOURS[detection.class_id % len(COLOURS)]
+        x1, y1, x2, y2 = (int(v) for v in detection.xyxy)
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), colour, line_width, lineType=cv2.LINE_AA)
+        label = f"{detection.class_name} {detection.confidence:.2f}"
+        if detection.track_id is not None:
+            label = f"#{detection.track_id} {label}"
+        (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        cv2.rectangle(annotated, (x1, max(y1 - h - 4, 0)), (x1 + w, max(y1, h + 4)), colour, -1)
+        cv2.putText(annotated, label, (x1, max(y1 - 2, h + 2)), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                    (255, 255, 255), 1, lineType=cv2.LINE_AA)
+    return annotated
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import shutil
 import sys
@@ -121,6 +122,21 @@ def check_paths(base_directory, paths_to_check):
     return all_present
 
 
+def get_file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Get the sha256 hash of a file, read in chunks so large weights files are not loaded at once
+
+    :param file_path: Path to the file
+    :param chunk_size: Number of bytes read at a time
+    :return: sha256 hex digest
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
 def copy_folder(source_path: str, destination_path: str):
     shutil.copytree(source_path, destination_path, dirs_exist_ok=True)
 
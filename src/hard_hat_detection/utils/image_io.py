@@ -0,0 +1,54 @@
+import hashlib
+import os
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """
+    Decode an encoded image (png, jpg, ...) held in memory
+
+    :param data: Encoded image bytes, e.g. the body of an uploaded file
+    :return: BGR image, the same layout cv2.imread returns
+    """
+    if not data:
+        raise ValueError('Empty image data')
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError('Image data could not be decoded')
+    return image
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Hash of the encoded image bytes, identical uploads get the same hash
+
+    :param data: Encoded image bytes
+    :return: sha256 hex digest
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def save_content_addressed(data: bytes, directory: str, extension: str, digest: Optional[str] = None) -> str:
+    """
+    Save the bytes under their content hash, so concurrent uploads never collide on a file name
+
+    :param data: Encoded image bytes
+    :param directory: Directory to save the file in
+    :param extension: File extension without the dot
+    :param digest: Content hash of the data when it is already known
+    :return: Path of the saved file
+    """
+    digest = digest or content_hash(data)
+    file_path = os.path.join(directory, f"{digest}.{extension.lower()}")
+    if not os.path.exists(file_path):
+        os.makedirs(directory, exist_ok=True)
+        # write to a private temp file and rename, so readers never see a partial file
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, file_path)
+    return file_path
@@ -0,0 +1,331 @@
+import atexit
+import bisect
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.hard_hat_detection.utils.profiling import CURRENT_TRACE
+
+# latency buckets in seconds, from sub-millisecond stages (nms, decode) up to slow forward passes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labelnames: Sequence[str], values: Tuple[str, ...], *extra: str) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    pairs.extend(label for label in extra if label)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    # a metric family, the children are keyed by their label values
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+
+    def collect(self) -> list:
+        # a copy of the samples, [(label values, value)], taken under the lock
+        raise NotImplementedError
+
+    def render_samples(self, samples: list, const_label: str = '') -> str:
+        return ''.join(f"{self.name}{format_labels(self.labelnames, labels, const_label)} {value}\n"
+                       for labels, value in samples)
+
+    def merge(self, processes: List[list]) -> list:
+        # the samples of several processes summed per label values
+        merged: Dict[Tuple[str, ...], float] = {}
+        for samples in processes:
+            for labels, value in samples:
+                merged[tuple(labels)] = merged.get(tuple(labels), 0.0) + value
+        return list(merged.items())
+
+    def render(self, const_label: str = '') -> str:
+        return self.header() + self.render_samples(self.collect(), const_label)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def collect(self) -> list:
+        with self.lock:
+            return list(self.values.items())
+
+
+class Gauge(Metric):
+    # either set explicitly or read from a callback when the metrics are scraped
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, *labels: str):
+        with self.lock:
+            self.values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def set_function(self, function: Callable[[], float]):
+        self.function = function
+
+    def collect(self) -> list:
+        if self.function is not None:
+            try:
+                return [((), float(self.function()))]
+            except Exception:
+                return []
+        with self.lock:
+            return list(self.values.items())
+
+
+class Histogram(Metric):
+    """
+    Cumulative bucket histogram. An observation is a bisect and three additions under a lock,
+    the cumulative counts are only computed when the metrics are scraped.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: a count per bucket (the last one is +Inf), the sum and the count
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            child = self.values.get(labels)
+            if child is None:
+                child = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            child[0][index] += 1
+            child[1] += value
+            child[2] += 1
+
+    def collect(self) -> list:
+        with self.lock:
+            return [(labels, [list(counts), total, count]) for labels, (counts, total, count) in self.values.items()]
+
+    def merge(self, processes: List[list]) -> list:
+        merged: Dict[Tuple[str, ...], list] = {}
+        for samples in processes:
+            for labels, (counts, total, count) in samples:
+                child = merged.setdefault(tuple(labels), [[0] * (len(self.buckets) + 1), 0.0, 0])
+                child[0] = [summed + value for summed, value in zip(child[0], counts)]
+                child[1] += total
+                child[2] += count
+        return list(merged.items())
+
+    def render_samples(self, samples: list, const_label: str = '') -> str:
+        lines = []
+        for labels, (counts, total, count) in samples:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, const_label, le)} {cumulative}\n")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels, const_label)} {total}\n")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels, const_label)} {count}\n")
+        return self.header() + ''.join(lines)
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process, or of every gunicorn worker once share is called.
+
+    A scrape through the gunicorn port reaches any worker, so with a shared directory every worker
+    writes its samples to <shared_dir>/<host>-<pid>.json every publish_interval_s (and on exit),
+    and the worker that answers the scrape sums the counters and histograms of all the files,
+    its own samples taken live. The files of exited workers are kept, so the sums never go back;
+    the gauges are per process and only rendered for the live ones, with a pid label. The
+    directory is emptied by clear_shared when the server starts.
+    """
+    def __init__(self):
+        self.metrics = []
+        self.shared_dir: Optional[str] = None
+        self.publish_interval_s = 5.0
+        self.pid = None
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    @staticmethod
+    def clear_shared(shared_dir: str):
+        # in the gunicorn master before the first fork, the files of a previous run are not summed
+        os.makedirs(shared_dir, exist_ok=True)
+        for name in os.listdir(shared_dir):
+            if name.endswith('.json'):
+                os.remove(os.path.join(shared_dir, name))
+
+    def share(self, shared_dir: str, publish_interval_s: float):
+        """
+        Publish the samples of this process for the other workers, called in every gunicorn worker
+
+        :param shared_dir: Directory of the samples of every worker
+        :param publish_interval_s: Time between two writes of the samples
+        """
+        self.shared_dir, self.publish_interval_s = shared_dir, publish_interval_s
+        if self.pid == os.getpid():
+            return
+        os.makedirs(shared_dir, exist_ok=True)
+        threading.Thread(target=self.run, name=self.__class__.__name__, daemon=True).start()
+        atexit.register(self.publish)
+        self.pid = os.getpid()
+
+    def run(self):
+        while True:
+            time.sleep(self.publish_interval_s)
+            try:
+                self.publish()
+            except OSError:
+                pass
+
+    def publish(self):
+        # written to a temp file and renamed, the other workers never read half a file
+        file_path = os.path.join(self.shared_dir, f"{socket.gethostname()}-{os.getpid()}.json")
+        temp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({metric.name: metric.collect() for metric in self.metrics}, file)
+        os.replace(temp_path, file_path)
+
+    def read_shared(self) -> List[Tuple[str, bool, dict]]:
+        # (pid, alive, samples) of every other process that published
+        own_name = f"{socket.gethostname()}-{os.getpid()}.json"
+        processes = []
+        for name in os.listdir(self.shared_dir):
+            if not name.endswith('.json') or name == own_name:
+                continue
+            try:
+                with open(os.path.join(self.shared_dir, name)) as file:
+                    samples = json.load(file)
+            except (OSError, ValueError):
+                continue
+            host, _, pid = name[:-len('.json')].rpartition('-')
+            alive = True
+            if host == socket.gethostname():
+                try:
+                    os.kill(int(pid), 0)
+                except ProcessLookupError:
+                    alive = False
+                except (PermissionError, ValueError):
+                    pass
+            processes.append((pid, alive, samples))
+        return processes
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format (version 0.0.4)
+
+        :return: The text served by /metrics, the gauges are labelled with the pid of their process
+        """
+        const_label = f'pid="{os.getpid()}"'
+        if self.shared_dir is None:
+            return ''.join(metric.render(const_label) for metric in self.metrics)
+        others = self.read_shared()
+        parts = []
+        for metric in self.metrics:
+            own = metric.collect()
+            if metric.kind == 'gauge':
+                body = metric.render_samples(own, const_label) + ''.join(
+                    metric.render_samples(samples.get(metric.name, []), f'pid="{pid}"')
+                    for pid, alive, samples in others if alive)
+            else:
+                body = metric.render_samples(
+                    metric.merge([own] + [samples.get(metric.name, []) for _, _, samples in others]))
+            parts.append(metric.header() + body)
+        return ''.join(parts)
+
+
+def process_rss_bytes() -> float:
+    # resident set size from /proc, psutil is only used where /proc does not exist
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import psutil
+        return psutil.Process().memory_info().rss
+
+
+# metrics of this process, summed over the gunicorn workers once REGISTRY.share is called
+REGISTRY = MetricsRegistry()
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    'hardhat_stage_latency_seconds', 'Latency of each stage of the serving path', ('stage',)))
+REQUESTS = REGISTRY.register(Counter(
+    'hardhat_requests_total', 'Requests by endpoint and outcome', ('endpoint', 'outcome')))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    'hardhat_requests_in_flight', 'Requests currently being processed'))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'hardhat_batch_queue_depth', 'Images waiting in the micro-batching queue'))
+RENDER_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'hardhat_render_queue_depth', 'Annotated images waiting to be rendered'))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    'hardhat_model_load_seconds', 'Time taken to import, load and warm up the model'))
+MODEL_RELOADS = REGISTRY.register(Counter(
+    'hardhat_model_reloads_total', 'Model swaps by kind (reload, rollback) and outcome', ('kind', 'outcome')))
+MODEL_RELOAD_SECONDS = REGISTRY.register(Gauge(
+    'hardhat_model_reload_seconds', 'Time taken to load and warm the model of the last swap'))
+MODEL_VERSION = REGISTRY.register(Gauge(
+    'hardhat_model_version', 'Version of the model being served, always 1', ('version',)))
+SHADOW_SAMPLES = REGISTRY.register(Counter(
+    'hardhat_shadow_samples_total', 'Requests sampled for the shadow model by outcome', ('outcome',)))
+SHADOW_LATENCY = REGISTRY.register(Histogram(
+    'hardhat_shadow_latency_seconds', 'Unbatched inference latency of the shadowed images by model', ('model',)))
+SHADOW_RATE = REGISTRY.register(Gauge(
+    'hardhat_shadow_sample_rate', 'Current fraction of the requests sampled for the shadow model'))
+ADMISSIONS = REGISTRY.register(Counter(
+    'hardhat_admission_total', 'Admission decisions (admitted, degraded, shed_in_flight, shed_slo)', ('decision',)))
+PROCESS_RSS = REGISTRY.register(Gauge(
+    'hardhat_process_resident_memory_bytes', 'Resident memory of the serving process'))
+PROCESS_RSS.set_function(process_rss_bytes)
+
+
+# set on threads whose work is not serving (the shadow model), their stages are not observed
+STAGES_MUTED: ContextVar[bool] = ContextVar('stages_muted', default=False)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    # adds two perf_counter calls and one histogram observation to the timed block,
+    # the timing is also added to the trace of the request when it is profiled
+    if STAGES_MUTED.get():
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_s = time.perf_counter() - started_at
+        STAGE_LATENCY.observe(duration_s, stage)
+        trace = CURRENT_TRACE.get()
+        if trace is not None:
+            trace.record(stage, started_at, duration_s)
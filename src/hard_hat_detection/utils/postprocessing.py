@@ -0,0 +1,112 @@
+from typing import List
+
+import torch
+import torchvision
+
+from src.hard_hat_detection.utils.preprocessing import LetterboxMeta
+
+
+def rank_within_groups(groups: torch.Tensor) -> torch.Tensor:
+    """
+    Position of every element inside its group, keeping the current order of the elements
+
+    :param groups: (N,) integer group id of every element
+    :return: (N,) 0 for the first element of each group, 1 for the second and so on
+    """
+    if not len(groups):
+        return groups
+    sorted_groups, order = torch.sort(groups, stable=True)
+    _, counts = torch.unique_consecutive(sorted_groups, return_counts=True)
+    starts = torch.cumsum(counts, 0) - counts
+    ranks = torch.empty_like(order)
+    ranks[order] = torch.arange(len(groups), device=groups.device) - torch.repeat_interleave(starts, counts)
+    return ranks
+
+
+class BatchedPostprocessor:
+    """
+    Confidence filtering, class aware NMS and rescaling to the original image sizes for a whole
+    batch in a handful of tensor operations.
+
+    It follows yolov5 non_max_suppression (single label, not agnostic) step by step, but instead of
+    looping over the images it offsets every box by its image and its class so a single NMS call
+    suppresses only boxes of the same class in the same image. The class offset is added in float32
+    exactly like yolov5 does, the image offset is added in float64 so it does not cost precision.
+    """
+    def __init__(self, conf_thres: float, iou_thres: float, max_det: int, max_det_per_class: int = 0,
+                 max_nms: int = 30000, max_wh: int = 7680):
+        self.conf_thres = conf_thres
+        self.iou_thres = iou_thres
+        # per image cap and per class (within an image) cap, 0 disables the per class cap
+        self.max_det = max_det
+        self.max_det_per_class = max_det_per_class
+        # the same limits as yolov5: boxes going into NMS per image and the class offset
+        self.max_nms = max_nms
+        self.max_wh = max_wh
+
+    @staticmethod
+    def xywh2xyxy(boxes: torch.Tensor) -> torch.Tensor:
+        xyxy = torch.empty_like(boxes)
+        half_w, half_h = boxes[:, 2] / 2, boxes[:, 3] / 2
+        xyxy[:, 0] = boxes[:, 0] - half_w
+        xyxy[:, 1] = boxes[:, 1] - half_h
+        xyxy[:, 2] = boxes[:, 0] + half_w
+        xyxy[:, 3] = boxes[:, 1] + half_h
+        return xyxy
+
+    @staticmethod
+    def keep_top(keep: torch.Tensor, groups: torch.Tensor, limit: int) -> torch.Tensor:
+        # keep is ordered by descending score, so the first `limit` of every group are its best boxes
+        if limit <= 0 or not len(keep):
+            return keep
+        return keep[rank_within_groups(groups[keep]) < limit]
+
+    def __call__(self, prediction: torch.Tensor, metas: List[LetterboxMeta]) -> List[torch.Tensor]:
+        """
+        Post-process the raw output of a batch
+
+        :param prediction: (B, N, 5 + nc) raw model output in letterboxed input pixels
+        :param metas: Letterbox metadata of every image in the batch
+        :return: For every image a (n, 6) tensor of x1, y1, x2, y2, confidence, class in original
+                 image pixels (rounded), sorted by descending confidence
+        """
+        if isinstance(prediction, (list, tuple)):
+            prediction = prediction[0]
+        batch_size, num_classes = prediction.shape[0], prediction.shape[2] - 5
+        device = prediction.device
+
+        # candidates of the whole batch, first on the objectness then on obj_conf * cls_conf
+        image_index, anchor_index = torch.nonzero(prediction[..., 4] > self.conf_thres, as_tuple=True)
+        x = prediction[image_index, anchor_index].float()
+        scores, classes = (x[:, 5:] * x[:, 4:5]).max(1)
+        candidates = scores > self.conf_thres
+        image_index, boxes = image_index[candidates], self.xywh2xyxy(x[candidates, :4])
+        scores, classes = scores[candidates], classes[candidates]
+
+        # descending confidence, at most max_nms boxes per image go into NMS
+        order = torch.argsort(scores, descending=True)
+        order = self.keep_top(order, image_index, self.max_nms)
+
+        class_offset = classes[order, None].float() * self.max_wh
+        image_offset = image_index[order, None].double() * (num_classes * self.max_wh)
+        shifted = (boxes[order] + class_offset).double() + image_offset
+        keep = order[torchvision.ops.nms(shifted, scores[order].double(), self.iou_thres)]
+
+        # caps, applied in descending confidence order like yolov5 i[:max_det]
+        keep = self.keep_top(keep, image_index * num_classes + classes, self.max_det_per_class)
+        keep = self.keep_top(keep, image_index, self.max_det)
+        # group by image, the stable sort keeps the descending confidence order inside each image
+        keep = keep[torch.sort(image_index[keep], stable=True)[1]]
+
+        # back to the original image pixels, one gather of the letterbox parameters per box
+        image_index = image_index[keep]
+        ratio = torch.tensor([meta.ratio for meta in metas], device=device)[image_index, None]
+        pad = torch.tensor([[meta.pad_w, meta.pad_h] * 2 for meta in metas], device=device)[image_index]
+        limit = torch.tensor([[meta.shape[1], meta.shape[0]] * 2 for meta in metas],
+                             dtype=torch.float32, device=device)[image_index]
+        boxes = ((boxes[keep] - pad) / ratio).clamp(min=0)
+        boxes = torch.minimum(boxes, limit).round()
+
+        detections = torch.cat((boxes, scores[keep, None], classes[keep, None].float()), 1)
+        counts = torch.bincount(image_index, minlength=batch_size).tolist()
+        return list(detections.split(counts))
@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+
+@dataclass
+class LetterboxMeta:
+    # what is needed to map boxes from the letterboxed input back to the original image
+    ratio: float
+    pad_w: float
+    pad_h: float
+    shape: Tuple[int, int]
+
+
+class LetterboxPreprocessor:
+    """
+    Letterbox, BGR to RGB, HWC to CHW and uint8 to float for a batch of images, written into
+    preallocated buffers that are reused between calls.
+
+    Every image is resized straight into its slot of a uint8 staging buffer (only the border
+    is re-filled with the pad value), then a single pass per channel swaps the channel order,
+    changes the layout and scales to [0, 1] into the float batch tensor. Nothing full size is
+    allocated per call. The returned tensor is a view into the reused buffer, it is only valid
+    until the next call, and an instance must not be shared between threads.
+    """
+    def __init__(self, img_size: int, device: torch.device = torch.device('cpu'), fp16: bool = False,
+                 channels_last: bool = False, pad_value: int = 114):
+        self.img_size = img_size
+        self.device = device
+        self.dtype = torch.float16 if fp16 else torch.float32
+        self.channels_last = channels_last
+        self.pad_value = pad_value
+        self.capacity = 0
+        self.staging = None
+        self.output = None
+
+    def ensure_capacity(self, batch_size: int):
+        # grow only, the buffers are sized for the largest batch seen so far
+        if batch_size <= self.capacity:
+            return
+        size = self.img_size
+        self.staging = np.full((batch_size, size, size, 3), self.pad_value, dtype=np.uint8)
+        output = torch.empty((batch_size, 3, size, size), dtype=self.dtype, device=self.device)
+        self.output = output.contiguous(memory_format=torch.channels_last) if self.channels_last else output
+        self.capacity = batch_size
+
+    def letterbox_into(self, image: np.ndarray, slot: np.ndarray) -> LetterboxMeta:
+        size = self.img_size
+        h, w = image.shape[:2]
+        ratio = min(size / h, size / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        dw, dh = (size - new_w) / 2, (size - new_h) / 2
+        top, left = int(round(dh - 0.1)), int(round(dw - 0.1))
+        bottom, right = top + new_h, left + new_w
+
+        slot[:top] = self.pad_value
+        slot[bottom:] = self.pad_value
+        slot[top:bottom, :left] = self.pad_value
+        slot[top:bottom, right:] = self.pad_value
+        region = slot[top:bottom, left:right]
+        if (new_h, new_w) == (h, w):
+            region[...] = image
+        else:
+            resized = cv2.resize(image, (new_w, new_h), dst=region, interpolation=cv2.INTER_LINEAR)
+            if resized is not region:
+                region[...] = resized
+        # same offsets as yolov5 scale_boxes, so mapped boxes match detect.py
+        return LetterboxMeta(ratio=ratio, pad_w=(size - w * ratio) / 2, pad_h=(size - h * ratio) / 2, shape=(h, w))
+
+    def __call__(self, images: List[np.ndarray]) -> Tuple[torch.Tensor, List[LetterboxMeta]]:
+        """
+        Pre-process a batch of BGR images
+
+        :param images: List of BGR uint8 images of any size
+        :return: (N, 3, img_size, img_size) RGB tensor in [0, 1] and the letterbox metadata of every image
+        """
+        batch_size = len(images)
+        self.ensure_capacity(batch_size)
+        metas = [self.letterbox_into(image, self.staging[i]) for i, image in enumerate(images)]
+
+        staging = torch.from_numpy(self.staging[:batch_size]).to(self.device, non_blocking=True)
+        bgr = staging.permute(0, 3, 1, 2)
+        output = self.output[:batch_size]
+        for channel in range(3):
+            # reading channel 2 - c swaps BGR to RGB, the multiply converts to float in the same pass
+            torch.mul(bgr[:, 2 - channel], 1 / 255, out=output[:, channel])
+        return output, metas
+
+
+def scale_boxes_to_original(boxes: torch.Tensor, meta: LetterboxMeta) -> torch.Tensor:
+    """
+    Map xyxy boxes from the letterboxed input back to the original image, in place
+
+    :param boxes: (N, 4) xyxy boxes in letterboxed input pixels
+    :param meta: Letterbox metadata of the image
+    :return: The same tensor, in original image pixels and clipped to the image
+    """
+    boxes[:, [0, 2]] -= meta.pad_w
+    boxes[:, [1, 3]] -= meta.pad_h
+    boxes[:, :4] /= meta.ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clamp(0, meta.shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clamp(0, meta.shape[0])
+    return boxes
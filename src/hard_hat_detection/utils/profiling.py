@@ -0,0 +1,46 @@
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+
+class RequestTrace:
+    # stage timings of a single profiled request, offsets are relative to the start of the request
+    def __init__(self, request_id: str, reason: str):
+        self.request_id = request_id
+        self.reason = reason
+        self.started_at = time.perf_counter()
+        self.wall_time = time.time()
+        self.stages: List[dict] = []
+        self.duration_s: Optional[float] = None
+
+    def record(self, stage: str, started_at: float, duration_s: float):
+        self.stages.append({'stage': stage,
+                            'offset_ms': round(1000 * (started_at - self.started_at), 3),
+                            'duration_ms': round(1000 * duration_s, 3)})
+
+    def finish(self):
+        self.duration_s = time.perf_counter() - self.started_at
+
+    def server_timing(self) -> str:
+        # Server-Timing response header, shown per request in the browser network panel
+        totals = {}
+        for stage in self.stages:
+            totals[stage['stage']] = totals.get(stage['stage'], 0.0) + stage['duration_ms']
+        return ', '.join(f"{stage};dur={duration:.3f}" for stage, duration in totals.items())
+
+    def to_dict(self) -> dict:
+        return {
+            'request_id': self.request_id,
+            'reason': self.reason,
+            'started_at': self.wall_time,
+            'duration_ms': round(1000 * self.duration_s, 3) if self.duration_s is not None else None,
+            'stages': self.stages
+        }
+
+
+# the trace of the request being handled by the current thread, None when it is not profiled
+CURRENT_TRACE: ContextVar[Optional[RequestTrace]] = ContextVar('current_trace', default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return CURRENT_TRACE.get()
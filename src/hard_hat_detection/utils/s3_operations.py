@@ -58,6 +58,17 @@ class S3Operations:
             logger.error(f"An error occurred: {e}")
             raise CustomException(e, sys)
 
+    def list_objects(self, prefix=''):
+        # every object under the prefix, oldest first
+        try:
+            objects = []
+            for page in self.s3.get_paginator('list_objects_v2').paginate(Bucket=self.bucket_name, Prefix=prefix):
+                objects.extend(page.get('Contents', []))
+            return sorted(objects, key=lambda item: item['LastModified'])
+        except (ClientError, NoCredentialsError, PartialCredentialsError) as e:
+            logger.error(f"An error occurred listing {self.bucket_name}/{prefix}: {e}")
+            raise CustomException(e, sys)
+
     def download_file(self, object_name, file_name=None):
         if file_name is None:
             file_name = object_name
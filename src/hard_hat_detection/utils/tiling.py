@@ -0,0 +1,90 @@
+from typing import List, Tuple
+
+import torch
+import torchvision
+
+
+def tile_starts(length: int, tile_size: int, stride: int) -> List[int]:
+    # evenly strided starts, the last tile is aligned to the far edge so nothing is left uncovered
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def tile_grid(height: int, width: int, tile_size: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+    """
+    Cut an image into overlapping square tiles
+
+    :param height: Image height
+    :param width: Image width
+    :param tile_size: Side of a tile in pixels, tiles are smaller along a side shorter than this
+    :param overlap: Fraction of a tile shared with its neighbour, in [0, 1)
+    :return: x1, y1, x2, y2 of every tile, row by row
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError(f"Tile overlap must be in [0, 1), got {overlap}")
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in tile_starts(height, tile_size, stride)
+            for x in tile_starts(width, tile_size, stride)]
+
+
+def pairwise_overlap(boxes: torch.Tensor, metric: str = 'ios') -> torch.Tensor:
+    """
+    Overlap between every pair of xyxy boxes
+
+    :param boxes: (N, 4) xyxy boxes
+    :param metric: iou (intersection over union) or ios (intersection over the smaller box), ios
+                   also merges a box cut at a tile border into the full box of the neighbouring tile
+    :return: (N, N) overlap matrix
+    """
+    area = (boxes[:, 2] - boxes[:, 0]).clamp(min=0) * (boxes[:, 3] - boxes[:, 1]).clamp(min=0)
+    top_left = torch.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    bottom_right = torch.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+    intersection = (bottom_right - top_left).clamp(min=0).prod(2)
+    if metric == 'iou':
+        denominator = area[:, None] + area[None, :] - intersection
+    elif metric == 'ios':
+        denominator = torch.minimum(area[:, None], area[None, :])
+    else:
+        raise ValueError(f"Unknown overlap metric: {metric}, use iou or ios")
+    return intersection / denominator.clamp(min=1e-9)
+
+
+def merge_tile_detections(boxes: torch.Tensor, scores: torch.Tensor, classes: torch.Tensor, thres: float,
+                          metric: str = 'ios', max_det: int = 1000) -> torch.Tensor:
+    """
+    Class aware greedy NMS over the detections of all tiles, already shifted to image pixels
+
+    The IoU of two boxes is never above their IoS, so torchvision's batched NMS first drops the
+    duplicates of both metrics without building an N x N matrix; with ios, only its survivors go
+    through the greedy pass, one class at a time.
+
+    :param boxes: (N, 4) xyxy boxes in image pixels
+    :param scores: (N,) confidences
+    :param classes: (N,) class ids
+    :param thres: Boxes of the same class overlapping a better box by more than this are dropped
+    :param metric: Overlap metric, iou or ios
+    :param max_det: Maximum number of detections kept
+    :return: Indices of the kept detections, by descending confidence
+    """
+    if metric not in ('iou', 'ios'):
+        raise ValueError(f"Unknown overlap metric: {metric}, use iou or ios")
+    keep = torchvision.ops.batched_nms(boxes.float(), scores.float(), classes, thres)
+    if metric == 'iou' or len(keep) < 2:
+        return keep[:max_det]
+
+    kept = []
+    for class_id in classes[keep].unique():
+        # still by descending confidence, a kept box suppresses the worse ones it overlaps
+        indices = keep[classes[keep] == class_id]
+        suppressed = torch.triu(pairwise_overlap(boxes[indices], metric) > thres, diagonal=1)
+        mask = torch.ones(len(indices), dtype=torch.bool)
+        for i in torch.nonzero(suppressed.any(1)).flatten().tolist():
+            if mask[i]:
+                mask &= ~suppressed[i]
+        kept.append(indices[mask])
+    keep = torch.cat(kept)
+    return keep[torch.argsort(scores[keep], descending=True)][:max_det]
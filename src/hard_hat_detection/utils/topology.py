@@ -0,0 +1,114 @@
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import yaml
+
+from src.hard_hat_detection.entity.config_entity import PredictionConfig, ServingConfig
+from src.hard_hat_detection.logger.logger_config import logger
+
+project_root_path = Path(__file__).parent.parent.parent.parent
+
+# keys of the tuning file that override the serving and batching configuration
+TUNED_KEYS = ('workers', 'torch_threads', 'interop_threads', 'max_batch_size', 'cpu_affinity')
+
+
+def resolve_tuning_path(file_path: str) -> str:
+    return file_path if os.path.isabs(file_path) else os.path.join(project_root_path, file_path)
+
+
+def read_tuning(file_path: str, engine: Optional[str] = None, img_size: Optional[int] = None) -> Optional[dict]:
+    """
+    Read the topology written by research/tune_topology.py
+
+    :param file_path: Tuning file, relative to the project root, '' for none
+    :param engine: Engine of the prediction section, the tuning of another engine is ignored
+    :param img_size: Input size of the prediction section, the tuning of another size is ignored
+    :return: The tuned values, None when there is no file or it was tuned on a machine with another core count
+             or for another model setup
+    """
+    if not file_path:
+        return None
+    file_path = resolve_tuning_path(file_path)
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path) as file:
+        tuning = yaml.safe_load(file) or {}
+    cpu_count = os.cpu_count() or 1
+    if tuning.get('cpu_count') != cpu_count:
+        logger.warning(f"The tuning in {file_path} was measured on {tuning.get('cpu_count')} cores, this machine "
+                       f"has {cpu_count}, it is ignored, run research/tune_topology.py again")
+        return None
+    # the best batch size and thread counts depend on the engine and the input size
+    for key, value in (('engine', engine), ('img_size', img_size)):
+        if value is not None and tuning.get(key) != value:
+            logger.warning(f"The tuning in {file_path} was measured with {key} {tuning.get(key)}, the prediction "
+                           f"section uses {value}, it is ignored, run research/tune_topology.py again")
+            return None
+    return {key: tuning[key] for key in TUNED_KEYS if key in tuning}
+
+
+def write_tuning(file_path: str, tuning: dict):
+    # written to a temp file and renamed, a server starting meanwhile never reads half a file
+    file_path = resolve_tuning_path(file_path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    temp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as file:
+        yaml.safe_dump(tuning, file, sort_keys=False)
+    os.replace(temp_path, file_path)
+
+
+def resolve_topology(serving_config: ServingConfig, prediction_config: PredictionConfig) -> dict:
+    """
+    Worker and thread layout of the server, the tuning file overrides the serving section
+
+    :param serving_config: Serving configuration
+    :param prediction_config: Prediction configuration, the tuning only applies to its engine and input size
+    :return: workers, torch_threads, interop_threads, cpu_affinity and max_batch_size (None when not tuned)
+    """
+    cpu_count = os.cpu_count() or 1
+    workers = serving_config.workers or cpu_count
+    topology = {'workers': workers,
+                'torch_threads': serving_config.torch_threads or max(1, cpu_count // workers),
+                'interop_threads': serving_config.interop_threads,
+                'cpu_affinity': serving_config.cpu_affinity,
+                'max_batch_size': None,
+                'source': 'config'}
+    tuning = read_tuning(serving_config.tuning_path, prediction_config.engine, prediction_config.img_size)
+    if tuning is not None:
+        topology.update(tuning, source=serving_config.tuning_path)
+    return topology
+
+
+def worker_cpus(slot: int, torch_threads: int) -> List[int]:
+    """
+    Cores of one worker when the workers are pinned, consecutive slices of the cores the
+    process may run on, wrapping around when there are more threads than cores
+
+    :param slot: Index of the worker, 0 to workers - 1
+    :param torch_threads: Intra-op threads of the worker
+    :return: Core ids
+    """
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    return [cpus[(slot * torch_threads + i) % len(cpus)] for i in range(min(torch_threads, len(cpus)))]
+
+
+def apply_topology(torch_threads: int, interop_threads: int = 0, cpus: Optional[List[int]] = None):
+    """
+    Set the torch thread pools of this process and optionally pin it to cores
+
+    :param torch_threads: Intra-op threads
+    :param interop_threads: Inter-op threads, 0 keeps the torch default
+    :param cpus: Cores to pin the process to, None leaves the affinity unchanged
+    """
+    import torch
+
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(torch_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # only possible before the first inter-op parallel work of the process
+            logger.warning(f"The inter-op threads could not be set to {interop_threads}: {e}")
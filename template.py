@@ -48,6 +48,22 @@ def create_project_structure(project_name: str) -> bool:
             f"src/{project_name}/components/model_trainer.py",
             f"src/{project_name}/components/model_evaluation.py",
             f"src/{project_name}/components/model_pusher.py",
+            f"src/{project_name}/components/model_export.py",
+            f"src/{project_name}/components/model_quantization.py",
+            f"src/{project_name}/components/detector.py",
+            f"src/{project_name}/components/batch_inference.py",
+            f"src/{project_name}/components/result_cache.py",
+            f"src/{project_name}/components/live_stream.py",
+            f"src/{project_name}/components/motion_gate.py",
+            f"src/{project_name}/components/tiled_inference.py",
+            f"src/{project_name}/components/request_profiler.py",
+            f"src/{project_name}/components/tracker.py",
+            f"src/{project_name}/components/annotated_renderer.py",
+            f"src/{project_name}/components/detection_log.py",
+            f"src/{project_name}/components/compliance.py",
+            f"src/{project_name}/components/model_reloader.py",
+            f"src/{project_name}/components/shadow_evaluator.py",
+            f"src/{project_name}/components/admission_control.py",
             # logger
             f"src/{project_name}/logger/__init__.py",
             f"src/{project_name}/logger/logger_config.py",
@@ -57,6 +73,14 @@ def create_project_structure(project_name: str) -> bool:
             f"src/{project_name}/utils/delete_directories.py",
             f"src/{project_name}/utils/dataset_yaml_generator.py",
             f"src/{project_name}/utils/s3_operations.py",
+            f"src/{project_name}/utils/annotation.py",
+            f"src/{project_name}/utils/image_io.py",
+            f"src/{project_name}/utils/preprocessing.py",
+            f"src/{project_name}/utils/postprocessing.py",
+            f"src/{project_name}/utils/tiling.py",
+            f"src/{project_name}/utils/metrics.py",
+            f"src/{project_name}/utils/profiling.py",
+            f"src/{project_name}/utils/topology.py",
             # config
             f"src/{project_name}/config/__init__.py",
             f"src/{project_name}/config/configuration.py",
@@ -68,10 +92,14 @@ def create_project_structure(project_name: str) -> bool:
             f"src/{project_name}/pipeline/model_trainer.py",
             f"src/{project_name}/pipeline/model_evaluation.py",
             f"src/{project_name}/pipeline/model_pusher.py",
+            f"src/{project_name}/pipeline/model_export.py",
+            f"src/{project_name}/pipeline/model_quantization.py",
             f"src/{project_name}/pipeline/prediction.py",
+            f"src/{project_name}/pipeline/pipeline_loader.py",
             # entity
             f"src/{project_name}/entity/__init__.py",
             f"src/{project_name}/entity/config_entity.py",
+            f"src/{project_name}/entity/prediction_entity.py",
             # constants
             f"src/{project_name}/constants/__init__.py",
             f"src/{project_name}/constants/constants.py",
@@ -80,6 +108,12 @@ def create_project_structure(project_name: str) -> bool:
             "params.yaml",
             # research
             "research/research.py",
+            "research/benchmark_preprocessing.py",
+            "research/benchmark_postprocessing.py",
+            "research/benchmark_tiling.py",
+            "research/benchmark_startup.py",
+            "research/export_detections.py",
+            "research/tune_topology.py",
             # other files
             "main.py",
             "setup.py",
@@ -87,6 +121,7 @@ def create_project_structure(project_name: str) -> bool:
             "templates/upload.html",
             "templates/error.html",
             "app.py",
+            "gunicorn.conf.py",
             # clean
             "clean.py",
             # prediction files